@@ -0,0 +1,398 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from .engine import (VERSION, AdjacencyIndex, LanguageParams, SubsetParams, _filter_for_subset,
+                     _restore_membership, _save_membership, generate_json,
+                     get_sources_and_language, map_it, write_file)
+
+FILES_PER_PACKAGE = 100
+SUBSET_BATCH_SIZE = 100
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'benchmark_baseline.json')
+COMPARED_METRICS = ('min_seconds', 'peak_memory_bytes', 'retained_memory_bytes')
+SIZES = {
+    'tiny': 10,
+    'small': 100,
+    'medium': 1000,
+    'large': 10000,
+    'huge': 100000,
+}
+
+
+class CodebaseParams():
+
+    def __init__(self, num_files=100, functions_per_file=10, classes_per_file=2,
+                 methods_per_class=4, inheritance_depth=2, imports_per_file=3,
+                 fan_out=3, seed=0):
+        self.num_files = num_files
+        self.functions_per_file = functions_per_file
+        self.classes_per_file = classes_per_file
+        self.methods_per_class = methods_per_class
+        self.inheritance_depth = inheritance_depth
+        self.imports_per_file = imports_per_file
+        self.fan_out = fan_out
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def _module_path(file_index):
+    return 'pkg_%d' % (file_index // FILES_PER_PACKAGE), 'mod_%d' % file_index
+
+
+def _class_name(file_index, class_index):
+    return 'Class_%d_%d' % (file_index, class_index)
+
+
+def _method_name(file_index, class_index, method_index):
+    return 'method_%d_%d_%d' % (file_index, class_index, method_index)
+
+
+def _function_name(file_index, function_index):
+    return 'func_%d_%d' % (file_index, function_index)
+
+
+def _parent_class(params, class_index):
+    if not params.inheritance_depth or class_index % (params.inheritance_depth + 1) == 0:
+        return None
+    return class_index - 1
+
+
+def _module_names(params, file_index):
+    return ([_function_name(file_index, i) for i in range(params.functions_per_file)]
+            + [_class_name(file_index, i) for i in range(params.classes_per_file)])
+
+
+def _generate_package_init(params, package_index):
+    # packages re-export their modules with relative imports, which resolve to the defining file
+    first_file = package_index * FILES_PER_PACKAGE
+    file_indexes = range(first_file, min(first_file + FILES_PER_PACKAGE, params.num_files))
+    lines = []
+    for file_index in file_indexes:
+        names = _module_names(params, file_index)
+        if names:
+            lines.append('from .%s import %s' % (_module_path(file_index)[1], ', '.join(names)))
+    lines.append('')
+    lines.append('')
+    lines.append('def run_package_%d(arg=None):' % package_index)
+    for file_index in file_indexes:
+        if params.functions_per_file:
+            lines.append('    %s(arg)' % _function_name(file_index, 0))
+    lines.append('    return arg')
+    return '\n'.join(lines) + '\n'
+
+
+def _generate_module(params, file_index, rng):
+    lines = []
+    imported_functions = []
+    imported_classes = []
+    imported_modules = []
+    if params.num_files > 1:
+        for _ in range(params.imports_per_file):
+            other = rng.randrange(params.num_files - 1)
+            if other >= file_index:
+                other += 1
+            package, module = _module_path(other)
+            same_package = package == _module_path(file_index)[0]
+            if same_package and params.functions_per_file and rng.random() < 0.3:
+                # calls through the module go through its import as an attribute
+                imported_modules.append('%s.%s' % (
+                    module, _function_name(other, rng.randrange(params.functions_per_file))))
+                lines.append('from . import %s' % module)
+                continue
+            names = []
+            if params.functions_per_file:
+                function = _function_name(other, rng.randrange(params.functions_per_file))
+                imported_functions.append(function)
+                names.append(function)
+            if params.classes_per_file:
+                class_name = _class_name(other, rng.randrange(params.classes_per_file))
+                imported_classes.append(class_name)
+                names.append(class_name)
+            if names:
+                # other packages are reached through the names their __init__ re-exports
+                lines.append('from %s import %s' % ('.' + module if same_package else package,
+                                                    ', '.join(names)))
+    lines.append('')
+
+    local_functions = [_function_name(file_index, i) for i in range(params.functions_per_file)]
+    local_classes = [_class_name(file_index, i) for i in range(params.classes_per_file)]
+    callables = local_functions + imported_functions + imported_modules
+    constructors = local_classes + imported_classes
+
+    def call_lines(indent, own_methods=()):
+        body = []
+        for i in range(params.fan_out):
+            choice = rng.random()
+            if own_methods and choice < 0.3:
+                body.append('%sself.%s()' % (indent, rng.choice(own_methods)))
+            elif constructors and choice < 0.5:
+                body.append('%sobj_%d = %s()' % (indent, i, rng.choice(constructors)))
+            elif callables:
+                body.append('%s%s(arg)' % (indent, rng.choice(callables)))
+        body.append('%sreturn arg' % indent)
+        return body
+
+    for class_index in range(params.classes_per_file):
+        parent = _parent_class(params, class_index)
+        methods = [_method_name(file_index, class_index, m) for m in range(params.methods_per_class)]
+        inherited_methods = []
+        ancestor = parent
+        while ancestor is not None:
+            inherited_methods += [_method_name(file_index, ancestor, m)
+                                  for m in range(params.methods_per_class)]
+            ancestor = _parent_class(params, ancestor)
+        if parent is None:
+            lines.append('class %s():' % _class_name(file_index, class_index))
+        else:
+            lines.append('class %s(%s):' % (_class_name(file_index, class_index),
+                                            _class_name(file_index, parent)))
+        lines.append('    def __init__(self):')
+        lines.append('        self.value = 0')
+        lines.append('')
+        for method in methods:
+            lines.append('    def %s(self, arg=None):' % method)
+            lines += call_lines('        ', methods + inherited_methods)
+            lines.append('')
+        if not methods:
+            lines.append('    pass')
+            lines.append('')
+
+    for function in local_functions:
+        lines.append('def %s(arg=None):' % function)
+        lines += call_lines('    ')
+        lines.append('')
+
+    return '\n'.join(lines) + '\n'
+
+
+def generate_codebase(root, params):
+    rng = random.Random(params.seed)
+    for file_index in range(params.num_files):
+        package, module = _module_path(file_index)
+        package_dir = os.path.join(root, package)
+        if file_index % FILES_PER_PACKAGE == 0:
+            os.makedirs(package_dir, exist_ok=True)
+            with open(os.path.join(package_dir, '__init__.py'), 'w') as f:
+                f.write(_generate_package_init(params, file_index // FILES_PER_PACKAGE))
+        with open(os.path.join(package_dir, module + '.py'), 'w') as f:
+            f.write(_generate_module(params, file_index, rng))
+    return root
+
+
+def _time_it(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, {
+        'repeat': repeat,
+        'min_seconds': min(timings),
+        'mean_seconds': statistics.mean(timings),
+        'max_seconds': max(timings),
+    }
+
+
+def _measure_memory(func):
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    result = func()
+    current_memory, peak_memory = tracemalloc.get_traced_memory()
+    if not was_tracing:
+        tracemalloc.stop()
+    return result, {
+        'peak_memory_bytes': peak_memory - start_memory,
+        'retained_memory_bytes': current_memory - start_memory,
+    }
+
+
+def run_benchmarks(root, params, repeat=3, jobs=1, subset_depth=3, memory=True):
+    sources, extension = get_sources_and_language([root], 'py')
+    lang_params = LanguageParams()
+
+    def run_map_it():
+        return map_it(sources, extension, no_trimming=False,
+                      exclude_namespaces=[], exclude_functions=[],
+                      include_only_namespaces=[], include_only_functions=[],
+                      skip_parse_errors=False, lang_params=lang_params, jobs=jobs)
+
+    benchmarks = {}
+    (file_groups, all_nodes, edges), benchmarks['map_it'] = _time_it(run_map_it, repeat)
+    benchmarks['map_it'].update(files=len(sources), nodes=len(all_nodes), edges=len(edges))
+
+    if memory:
+        del file_groups, all_nodes, edges
+        (file_groups, all_nodes, edges), benchmarks['map_it_memory'] = _measure_memory(run_map_it)
+
+    _, benchmarks['generate_json'] = _time_it(lambda: generate_json(all_nodes, edges), repeat)
+
+    def run_write_file():
+        outfile = io.StringIO()
+        write_file(outfile, all_nodes, edges, file_groups)
+        return outfile
+
+    _, benchmarks['write_file'] = _time_it(run_write_file, repeat)
+
+    # trimming can drop any given function, so the target comes from the graph that was built
+    targets = [SubsetParams(node.token, subset_depth, subset_depth) for node in all_nodes
+               if node.token.startswith('func_')][:SUBSET_BATCH_SIZE]
+    if targets:
+        subset_params = targets[0]
+        saved_membership = _save_membership(file_groups)
+
+        def run_filter_for_subset():
+            try:
+                return _filter_for_subset(subset_params, all_nodes, edges, file_groups)
+            finally:
+                _restore_membership(saved_membership)
+
+        (_, subset_nodes, subset_edges), benchmarks['filter_for_subset'] = _time_it(
+            run_filter_for_subset, repeat)
+        benchmarks['filter_for_subset'].update(target=subset_params.target_function,
+                                               nodes=len(subset_nodes), edges=len(subset_edges))
+
+        def run_subset_batch():
+            adjacency_index = AdjacencyIndex(all_nodes, edges)
+            return [adjacency_index.subset(target) for target in targets]
+
+        _, benchmarks['subset_batch'] = _time_it(run_subset_batch, repeat)
+        benchmarks['subset_batch'].update(targets=len(targets))
+
+    return {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'jobs': jobs,
+        'codebase': params.to_dict(),
+        'benchmarks': benchmarks,
+    }
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    if results['codebase'] != baseline['codebase']:
+        logging.warning("Baseline was recorded on a different codebase %r. "
+                        "Comparison is not meaningful.", baseline['codebase'])
+
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            logging.info("No baseline for %r.", name)
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in result or metric not in baseline['benchmarks'][name]:
+                continue
+            baseline_value = baseline['benchmarks'][name][metric]
+            ratio = result[metric] / baseline_value if baseline_value else 1.0
+            logging.info("%-20s %-20s %14.4f  baseline %14.4f  (%+.1f%%)", name, metric,
+                         result[metric], baseline_value, (ratio - 1) * 100)
+            if ratio > 1 + threshold:
+                regressions.append((name, metric, baseline_value, result[metric]))
+    return regressions
+
+
+def main(sys_argv=None):
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark map_it, output generation and subsetting on a "
+                    "synthetic Python codebase.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--size', choices=list(SIZES),
+        help='preset number of files. Overrides --files.')
+    parser.add_argument('--files', type=int, default=SIZES['small'],
+                        help='number of files to generate.')
+    parser.add_argument('--functions-per-file', type=int, default=10)
+    parser.add_argument('--classes-per-file', type=int, default=2)
+    parser.add_argument('--methods-per-class', type=int, default=4)
+    parser.add_argument('--inheritance-depth', type=int, default=2)
+    parser.add_argument('--imports-per-file', type=int, default=3)
+    parser.add_argument('--fan-out', type=int, default=3,
+                        help='number of calls made by every function and method.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--codebase-dir',
+        help='generate the codebase here and keep it. Defaults to a temporary directory.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='run each benchmark this many times and keep the fastest.')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='parse source files with this many processes.')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the traced memory run of map_it.')
+    parser.add_argument('--output', '-o', help='write the results to this json file.')
+    parser.add_argument(
+        '--baseline', default=DEFAULT_BASELINE,
+        help='compare the results to this json file. The default baseline was recorded '
+             'on the default codebase and is skipped for any other codebase. Its timings '
+             'come from the machine named in its platform field.')
+    parser.add_argument('--no-baseline', action='store_true',
+                        help='do not compare the results to a baseline.')
+    parser.add_argument(
+        '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='fail when a benchmark is this fraction slower than the baseline.')
+
+    args = parser.parse_args(sys_argv or sys.argv[1:])
+    logging.basicConfig(format="CodeToSchemas: %(message)s", level=logging.INFO)
+    logging.getLogger().handlers[0].setLevel(logging.INFO)
+
+    params = CodebaseParams(
+        num_files=SIZES[args.size] if args.size else args.files,
+        functions_per_file=args.functions_per_file,
+        classes_per_file=args.classes_per_file,
+        methods_per_class=args.methods_per_class,
+        inheritance_depth=args.inheritance_depth,
+        imports_per_file=args.imports_per_file,
+        fan_out=args.fan_out,
+        seed=args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = args.codebase_dir or tmp_dir
+        logging.info("Generating %d file(s) in %r.", params.num_files, root)
+        generate_codebase(root, params)
+
+        logging.getLogger().setLevel(logging.WARNING)
+        results = run_benchmarks(root, params, repeat=args.repeat, jobs=args.jobs,
+                                 memory=not args.no_memory)
+        logging.getLogger().setLevel(logging.INFO)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+
+    if args.no_baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.baseline == DEFAULT_BASELINE and results['codebase'] != baseline['codebase']:
+        logging.info("The default baseline only covers the default codebase. "
+                     "Pass --baseline to compare against another run.")
+        return 0
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    for name, metric, baseline_value, value in regressions:
+        logging.error("Regression in %r %s: %.4f vs %.4f in the baseline.",
+                      name, metric, value, baseline_value)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
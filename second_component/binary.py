@@ -0,0 +1,276 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from .model import Group, Node, WeightedEdge
+
+MAGIC = b'C2SGRAPH'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<8sIIIIIII')
+NONE = 0xFFFFFFFF
+
+GROUP_FIELDS = 10
+NODE_FIELDS = 7
+EDGE_FIELDS = 3
+
+IS_ROOT = 1
+IS_CONSTRUCTOR = 2
+IS_LEAF = 4
+IS_TRUNK = 8
+
+assert array('I').itemsize == 4, "The binary graph format needs 4 byte unsigned ints."
+
+
+def _optional(value):
+    return NONE if value is None else value
+
+
+def _from_optional(value):
+    return None if value == NONE else value
+
+
+def _write_array(outfile, values):
+    if sys.byteorder != 'little':
+        values = array('I', values)
+        values.byteswap()
+    values.tofile(outfile)
+
+
+class LabeledNode(Node):
+    __slots__ = ('_name', '_label')
+
+    def __init__(self, token, parent, name, label, line_number=None, is_constructor=False):
+        super().__init__(token, [], [], parent, line_number=line_number,
+                         is_constructor=is_constructor)
+        self._name = name
+        self._label = label
+
+    def name(self):
+        return self._name
+
+    def label(self):
+        return self._label
+
+
+class _StringTable():
+
+    def __init__(self):
+        self.index = {}
+        self.blob = bytearray()
+        self.offsets = array('I', [0])
+
+    def add(self, string):
+        if string is None:
+            return NONE
+        if string not in self.index:
+            self.index[string] = len(self.offsets) - 1
+            self.blob += string.encode('utf-8')
+            self.offsets.append(len(self.blob))
+        return self.index[string]
+
+
+def _ordered_groups(file_groups):
+    groups = list(file_groups)
+    i = 0
+    while i < len(groups):
+        groups += groups[i].subgroups
+        i += 1
+    return groups
+
+
+def write_graph(outfile, groups, nodes, edges, line_numbers=True):
+    strings = _StringTable()
+    kept_nodes = set(nodes)
+    ordered_groups = _ordered_groups(groups)
+    group_index = {group: i for i, group in enumerate(ordered_groups)}
+
+    ordered_nodes = []
+    node_parents = []
+    group_table = array('I')
+    next_subgroup = len(groups)
+    for group in ordered_groups:
+        group_nodes = [node for node in group.nodes if node in kept_nodes]
+        group_table.extend([
+            strings.add(group.uid), strings.add(group.token), strings.add(group.group_type),
+            strings.add(group.display_type), _optional(group.line_number),
+            group_index.get(group.parent, NONE),
+            len(ordered_nodes), len(group_nodes), next_subgroup, len(group.subgroups)])
+        ordered_nodes += group_nodes
+        node_parents += [group_index[group]] * len(group_nodes)
+        next_subgroup += len(group.subgroups)
+    placed = set(ordered_nodes)
+    detached_nodes = [node for node in nodes if node not in placed]
+    ordered_nodes += detached_nodes
+    node_parents += [NONE] * len(detached_nodes)
+    node_index = {node: i for i, node in enumerate(ordered_nodes)}
+
+    node_table = array('I')
+    for node, parent in zip(ordered_nodes, node_parents):
+        flags = ((IS_ROOT if parent != NONE and ordered_groups[parent].root_node is node else 0) |
+                 (IS_CONSTRUCTOR if node.is_constructor else 0) |
+                 (IS_LEAF if node.is_leaf else 0) |
+                 (IS_TRUNK if node.is_trunk else 0))
+        name = label = NONE
+        if parent == NONE or type(node) is not Node:
+            name, label = strings.add(node.name()), strings.add(node.label())
+        node_table.extend([strings.add(node.uid), strings.add(node.token), parent,
+                           _optional(node.line_number), flags, name, label])
+
+    edge_table = array('I')
+    line_offsets = array('I', [0])
+    line_table = array('I')
+    for edge in edges:
+        weight = 1
+        if isinstance(edge, WeightedEdge):
+            weight = edge.count()
+            if line_numbers:
+                line_table.extend(_optional(number) for number in edge.line_numbers)
+        edge_table.extend([node_index[edge.node0], node_index[edge.node1], weight])
+        line_offsets.append(len(line_table))
+
+    outfile.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(strings.offsets) - 1,
+                              len(strings.blob), len(ordered_groups), len(ordered_nodes),
+                              len(edges), len(line_table)))
+    tables = [strings.offsets, group_table, node_table, edge_table]
+    if line_table:
+        tables += [line_offsets, line_table]
+    for table in tables:
+        _write_array(outfile, table)
+    outfile.write(strings.blob)
+
+
+class GraphReader():
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise AssertionError("%r is not a binary graph file." % path)
+
+        if len(self._mmap) < HEADER.size or self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise AssertionError("%r is not a binary graph file." % path)
+        (_, version, num_strings, strings_size, self.num_groups, self.num_nodes,
+         self.num_edges, num_line_numbers) = HEADER.unpack_from(self._mmap)
+        if version != FORMAT_VERSION:
+            self.close()
+            raise AssertionError("%r is a version %d binary graph file. Expected version %d." %
+                                 (path, version, FORMAT_VERSION))
+
+        self._views = []
+        offset = HEADER.size
+        self._string_offsets, offset = self._table(offset, num_strings + 1)
+        self._group_table, offset = self._table(offset, self.num_groups * GROUP_FIELDS)
+        self._node_table, offset = self._table(offset, self.num_nodes * NODE_FIELDS)
+        self.edge_array, offset = self._table(offset, self.num_edges * EDGE_FIELDS)
+        self._line_offsets = self._line_table = None
+        if num_line_numbers:
+            self._line_offsets, offset = self._table(offset, self.num_edges + 1)
+            self._line_table, offset = self._table(offset, num_line_numbers)
+        self._strings = memoryview(self._mmap)[offset:offset + strings_size]
+        self._views.append(self._strings)
+
+        self._groups = {}
+        self._nodes = {}
+
+    def _table(self, offset, length):
+        end = offset + 4 * length
+        raw = memoryview(self._mmap)[offset:end]
+        self._views.append(raw)
+        if sys.byteorder == 'little':
+            table = raw.cast('I')
+            self._views.append(table)
+        else:
+            table = array('I', raw)
+            table.byteswap()
+        return table, end
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        self._mmap.close()
+        self._file.close()
+
+    def string(self, i):
+        if i == NONE:
+            return None
+        return bytes(self._strings[self._string_offsets[i]:self._string_offsets[i + 1]]) \
+            .decode('utf-8')
+
+    def group(self, i):
+        if i in self._groups:
+            return self._groups[i]
+        (uid, token, group_type, display_type, line_number, parent,
+         first_node, num_nodes, first_subgroup, num_subgroups) = \
+            self._group_table[i * GROUP_FIELDS:(i + 1) * GROUP_FIELDS]
+        parent_group = self.group(parent) if parent != NONE else None
+        if i in self._groups:
+            return self._groups[i]
+
+        group = Group(self.string(token), self.string(group_type), self.string(display_type),
+                      line_number=_from_optional(line_number), parent=parent_group)
+        group.uid = self.string(uid)
+        self._groups[i] = group
+        for j in range(first_subgroup, first_subgroup + num_subgroups):
+            group.add_subgroup(self.group(j))
+        for j in range(first_node, first_node + num_nodes):
+            self.node(j)
+        return group
+
+    def node(self, i):
+        if i in self._nodes:
+            return self._nodes[i]
+        uid, token, parent, line_number, flags, name, label = \
+            self._node_table[i * NODE_FIELDS:(i + 1) * NODE_FIELDS]
+        parent_group = self.group(parent) if parent != NONE else None
+        if i in self._nodes:
+            return self._nodes[i]
+
+        if name == NONE:
+            node = Node(self.string(token), [], [], parent_group,
+                        line_number=_from_optional(line_number),
+                        is_constructor=bool(flags & IS_CONSTRUCTOR))
+        else:
+            node = LabeledNode(self.string(token), parent_group, self.string(name),
+                               self.string(label), line_number=_from_optional(line_number),
+                               is_constructor=bool(flags & IS_CONSTRUCTOR))
+        node.uid = self.string(uid)
+        node.is_leaf = bool(flags & IS_LEAF)
+        node.is_trunk = bool(flags & IS_TRUNK)
+        self._nodes[i] = node
+        if parent_group:
+            parent_group.add_node(node, is_root=bool(flags & IS_ROOT))
+        return node
+
+    def edge(self, i):
+        node0, node1, weight = self.edge_array[i * EDGE_FIELDS:(i + 1) * EDGE_FIELDS]
+        edge = WeightedEdge(self.node(node0), self.node(node1))
+        if self._line_table is not None:
+            lines = self._line_table[self._line_offsets[i]:self._line_offsets[i + 1]]
+            edge.line_numbers = [_from_optional(line_number) for line_number in lines]
+        elif weight > 1:
+            edge.line_numbers = [None] * weight
+        return edge
+
+    def file_groups(self):
+        for i in range(self.num_groups):
+            if self._group_table[i * GROUP_FIELDS + 5] == NONE:
+                yield self.group(i)
+
+    def nodes(self):
+        for i in range(self.num_nodes):
+            yield self.node(i)
+
+    def edges(self):
+        for i in range(self.num_edges):
+            yield self.edge(i)
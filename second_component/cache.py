@@ -0,0 +1,158 @@
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import secrets
+import stat
+import tempfile
+import time
+
+CACHE_FORMAT = '1'
+CACHE_SUFFIX = '.pickle'
+KEY_FILE = 'hmac.key'
+KEY_BYTES = 32
+DIGEST_BYTES = hashlib.sha256().digest_size
+TEMP_SUFFIX = '.tmp'
+STALE_TEMP_SECONDS = 3600
+DEFAULT_CACHE_SIZE_MB = 256
+
+
+def _is_private(st):
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+class FileGroupCache():
+    # entries are unpickled, and unpickling runs arbitrary code. Only a directory that
+    # nobody else can write to is used, and every entry is signed with a key kept in it.
+
+    def __init__(self, cache_dir, version, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if not _is_private(os.stat(cache_dir)):
+            raise AssertionError("Cache directory %r must be owned by the current user and "
+                                 "not writable by group or others." % cache_dir)
+        self.secret = self._load_secret()
+
+    def _load_secret(self):
+        path = os.path.join(self.cache_dir, KEY_FILE)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(secrets.token_bytes(KEY_BYTES))
+
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            secret = f.read()
+        if not _is_private(st) or st.st_mode & (stat.S_IRGRP | stat.S_IROTH):
+            raise AssertionError("Cache key %r must be owned by the current user and "
+                                 "not accessible to group or others." % path)
+        if len(secret) != KEY_BYTES:
+            raise AssertionError("Cache key %r is corrupt. Delete it to reset the cache." % path)
+        return secret
+
+    def _sign(self, payload):
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()
+
+    def key(self, source, raw, *params):
+        digest = hashlib.sha256()
+        for part in (self.version, CACHE_FORMAT, source) + params:
+            digest.update(str(part).encode('utf-8') + b'\0')
+        digest.update(raw)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                private = _is_private(os.fstat(f.fileno()))
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as ex:
+            logging.debug("Ignoring unreadable cache entry %r. (%r)", path, ex)
+            return None
+
+        digest, payload = data[:DIGEST_BYTES], data[DIGEST_BYTES:]
+        if not private or not hmac.compare_digest(digest, self._sign(payload)):
+            logging.warning("Ignoring cache entry %r that was not written by this cache.", path)
+            return None
+        try:
+            file_group = pickle.loads(payload)
+        except Exception as ex:
+            logging.debug("Ignoring unreadable cache entry %r. (%r)", path, ex)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return file_group
+
+    def put(self, key, file_group):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=TEMP_SUFFIX)
+        except OSError as ex:
+            logging.warning("Could not write to cache directory %r. (%r)", self.cache_dir, ex)
+            return
+        try:
+            payload = pickle.dumps(file_group, protocol=pickle.HIGHEST_PROTOCOL)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._sign(payload))
+                f.write(payload)
+            os.replace(tmp_path, self._path(key))
+        except Exception as ex:
+            logging.warning("Could not write cache entry for %r. (%r)", key, ex)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        now = time.time()
+        for entry in os.scandir(self.cache_dir):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(TEMP_SUFFIX):
+                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    _remove_quietly(entry.path)
+                continue
+            if not entry.name.endswith(CACHE_SUFFIX):
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        if total_size <= self.max_size:
+            return 0
+
+        entries.sort()
+        num_removed = 0
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            _remove_quietly(path)
+            total_size -= size
+            num_removed += 1
+        logging.info("Evicted %d cache entries from %r.", num_removed, self.cache_dir)
+        return num_removed
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+from .model import Call, Group, Node
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    digest TEXT NOT NULL,
+    run TEXT
+);
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    parent_id INTEGER REFERENCES groups(id) ON DELETE CASCADE,
+    uid TEXT NOT NULL,
+    token TEXT NOT NULL,
+    group_type TEXT NOT NULL,
+    display_type TEXT,
+    line_number INTEGER
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    group_id INTEGER REFERENCES groups(id) ON DELETE CASCADE,
+    uid TEXT NOT NULL,
+    token TEXT NOT NULL,
+    name TEXT NOT NULL,
+    line_number INTEGER,
+    is_constructor INTEGER NOT NULL,
+    UNIQUE (file_id, uid)
+);
+CREATE TABLE IF NOT EXISTS calls (
+    node_id INTEGER NOT NULL REFERENCES nodes(id) ON DELETE CASCADE,
+    token TEXT NOT NULL,
+    owner_token TEXT,
+    line_number INTEGER,
+    definite_constructor INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS variables (
+    node_id INTEGER NOT NULL REFERENCES nodes(id) ON DELETE CASCADE,
+    token TEXT NOT NULL,
+    points_to TEXT,
+    points_to_uid TEXT,
+    line_number INTEGER
+);
+CREATE TABLE IF NOT EXISTS edges (
+    source_id INTEGER NOT NULL REFERENCES nodes(id) ON DELETE CASCADE,
+    target_id INTEGER NOT NULL REFERENCES nodes(id) ON DELETE CASCADE,
+    line_numbers TEXT,
+    PRIMARY KEY (source_id, target_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_run ON files (run);
+CREATE INDEX IF NOT EXISTS groups_file_id ON groups (file_id);
+CREATE INDEX IF NOT EXISTS groups_parent_id ON groups (parent_id);
+CREATE INDEX IF NOT EXISTS nodes_group_id ON nodes (group_id);
+CREATE INDEX IF NOT EXISTS nodes_token ON nodes (token);
+CREATE INDEX IF NOT EXISTS nodes_name ON nodes (name);
+CREATE INDEX IF NOT EXISTS calls_node_id ON calls (node_id);
+CREATE INDEX IF NOT EXISTS calls_token ON calls (token);
+CREATE INDEX IF NOT EXISTS variables_node_id ON variables (node_id);
+CREATE INDEX IF NOT EXISTS edges_target_id ON edges (target_id);
+"""
+
+
+def _points_to(points_to):
+    if isinstance(points_to, Node):
+        return points_to.name(), points_to.uid
+    if isinstance(points_to, Group):
+        return points_to.token, points_to.uid
+    if isinstance(points_to, Call):
+        return points_to.to_string(), None
+    return str(points_to), None
+
+
+def _file_rows(file_group, kept_nodes):
+    groups = [(group.uid, group.parent.uid if group.parent else None, group.token,
+               group.group_type, group.display_type, group.line_number)
+              for group in file_group.all_groups()]
+    nodes = [node for node in file_group.all_nodes() if node in kept_nodes]
+    node_rows = [(node.uid, node.parent.uid, node.token, node.name(), node.line_number,
+                  int(bool(node.is_constructor))) for node in nodes]
+    calls = [(node.uid, call.token, call.owner_token, call.line_number,
+              int(bool(call.definite_constructor)))
+             for node in nodes for call in node.calls]
+    variables = [(node.uid, variable.token) + _points_to(variable.points_to) +
+                 (variable.line_number,)
+                 for node in nodes for variable in node.variables]
+    rows = (groups, node_rows, calls, variables)
+    digest = hashlib.sha1(repr(rows).encode('utf-8')).hexdigest()
+    return rows, digest
+
+
+def _next_id(connection, table):
+    return connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM %s' % table).fetchone()[0]
+
+
+def _insert_file(connection, path, digest, run, rows, next_ids):
+    groups, nodes, calls, variables = rows
+    file_id = next_ids['files']
+    next_ids['files'] += 1
+    connection.execute('INSERT INTO files (id, path, digest, run) VALUES (?, ?, ?, ?)',
+                       (file_id, path, digest, run))
+
+    group_ids = {}
+    for uid, *_ in groups:
+        group_ids[uid] = next_ids['groups']
+        next_ids['groups'] += 1
+    connection.executemany(
+        'INSERT INTO groups VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        [(group_ids[uid], file_id, group_ids.get(parent_uid), uid, token, group_type,
+          display_type, line_number)
+         for uid, parent_uid, token, group_type, display_type, line_number in groups])
+
+    node_ids = {}
+    for uid, *_ in nodes:
+        node_ids[uid] = next_ids['nodes']
+        next_ids['nodes'] += 1
+    connection.executemany(
+        'INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        [(node_ids[uid], file_id, group_ids.get(group_uid), uid, token, name, line_number,
+          is_constructor)
+         for uid, group_uid, token, name, line_number, is_constructor in nodes])
+    connection.executemany('INSERT INTO calls VALUES (?, ?, ?, ?, ?)',
+                           [(node_ids[uid],) + tuple(rest) for uid, *rest in calls])
+    connection.executemany('INSERT INTO variables VALUES (?, ?, ?, ?, ?)',
+                           [(node_ids[uid],) + tuple(rest) for uid, *rest in variables])
+    return file_id, node_ids
+
+
+def _edge_line_numbers(edge):
+    line_numbers = getattr(edge, 'line_numbers', None)
+    if not line_numbers:
+        return None
+    return json.dumps(sorted(n for n in line_numbers if n is not None))
+
+
+def run_key(raw_source_paths):
+    return '\n'.join(sorted(os.path.abspath(p) for p in raw_source_paths))
+
+
+def write_database(path, file_groups, all_nodes, edges, run=None):
+    connection = sqlite3.connect(path, isolation_level=None)
+    try:
+        connection.execute('PRAGMA foreign_keys = ON')
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise AssertionError("%r was written with schema version %d. Expected version %d." %
+                                 (path, version, SCHEMA_VERSION))
+        connection.executescript(SCHEMA)
+        connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            stats = _sync(connection, file_groups, all_nodes, edges, run)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+    return stats
+
+
+def _sync(connection, file_groups, all_nodes, edges, run):
+    kept_nodes = set(all_nodes)
+    existing_files = {path: (file_id, digest, file_run) for file_id, path, digest, file_run
+                      in connection.execute('SELECT id, path, digest, run FROM files')}
+    next_ids = {table: _next_id(connection, table) for table in ('files', 'groups', 'nodes')}
+
+    stats = {'changed_files': 0, 'unchanged_files': 0, 'removed_files': 0}
+    run_file_ids = {}
+    node_ids_by_file = {}
+    for file_group in file_groups:
+        path = os.path.abspath(file_group.source)
+        rows, digest = _file_rows(file_group, kept_nodes)
+        file_id, existing_digest, existing_run = existing_files.pop(path, (None, None, None))
+        if existing_digest == digest:
+            if existing_run != run:
+                connection.execute('UPDATE files SET run = ? WHERE id = ?', (run, file_id))
+            run_file_ids[file_group] = file_id
+            stats['unchanged_files'] += 1
+            continue
+        if file_id is not None:
+            connection.execute('DELETE FROM files WHERE id = ?', (file_id,))
+        file_id, node_ids_by_file[file_group] = _insert_file(connection, path, digest, run,
+                                                             rows, next_ids)
+        run_file_ids[file_group] = file_id
+        stats['changed_files'] += 1
+
+    # files of this run that were not emitted again were deleted, trimmed or excluded
+    removed = [(file_id,) for path, (file_id, _, file_run) in existing_files.items()
+               if (run is not None and file_run == run) or not os.path.exists(path)]
+    connection.executemany('DELETE FROM files WHERE id = ?', removed)
+    stats['removed_files'] = len(removed)
+
+    connection.execute('CREATE TEMP TABLE IF NOT EXISTS run_files (id INTEGER PRIMARY KEY)')
+    connection.execute('DELETE FROM run_files')
+    connection.executemany('INSERT INTO run_files VALUES (?)',
+                           [(file_id,) for file_id in run_file_ids.values()])
+    unchanged_ids = {}
+    for file_id, uid, node_id in connection.execute(
+            'SELECT file_id, uid, id FROM nodes WHERE file_id IN (SELECT id FROM run_files)'):
+        unchanged_ids[(file_id, uid)] = node_id
+
+    def node_id(node):
+        file_group = node.file_group()
+        if file_group in node_ids_by_file:
+            return node_ids_by_file[file_group][node.uid]
+        return unchanged_ids[(run_file_ids[file_group], node.uid)]
+
+    current_edges = {(node_id(edge.node0), node_id(edge.node1)): _edge_line_numbers(edge)
+                     for edge in edges}
+    existing_edges = {(source_id, target_id): line_numbers
+                      for source_id, target_id, line_numbers in connection.execute(
+                          'SELECT source_id, target_id, line_numbers FROM edges '
+                          'WHERE source_id IN (SELECT id FROM nodes WHERE file_id IN '
+                          '(SELECT id FROM run_files)) '
+                          'OR target_id IN (SELECT id FROM nodes WHERE file_id IN '
+                          '(SELECT id FROM run_files))')}
+    connection.executemany('DELETE FROM edges WHERE source_id = ? AND target_id = ?',
+                           [key for key in existing_edges if key not in current_edges])
+    connection.executemany('INSERT OR REPLACE INTO edges VALUES (?, ?, ?)',
+                           [key + (line_numbers,) for key, line_numbers in current_edges.items()
+                            if existing_edges.get(key, False) != line_numbers])
+    stats['edges'] = len(current_edges)
+    logging.info("Updated %d changed file(s), kept %d unchanged and removed %d stale file(s).",
+                 stats['changed_files'], stats['unchanged_files'], stats['removed_files'])
+    return stats
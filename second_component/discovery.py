@@ -0,0 +1,207 @@
+import logging
+import os
+import re
+import sys
+
+GITIGNORE = '.gitignore'
+VIRTUALENV_MARKER = 'pyvenv.cfg'
+PRUNED_DIRS = frozenset([
+    '.git', '.hg', '.svn', '.bzr',
+    '__pycache__', 'node_modules',
+    '.tox', '.nox', '.eggs',
+    '.mypy_cache', '.pytest_cache', '.ruff_cache',
+])
+
+
+def _class_end(pattern, start):
+    i = start + 1
+    if pattern[i:i + 1] == '!':
+        i += 1
+    if pattern[i:i + 1] == ']':
+        i += 1
+    return pattern.find(']', i)
+
+
+def _translate(pattern):
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+            continue
+        if char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '[' and _class_end(pattern, i) != -1:
+            end = _class_end(pattern, i)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            regex += '[' + body.replace('\\', '\\\\').replace('[', '\\[') + ']'
+            i = end
+        elif char == '\\' and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+def _parse_pattern(line):
+    line = line.rstrip('\n').rstrip('\r')
+    if not line.endswith('\\ '):
+        line = line.rstrip(' ')
+    if not line or line.startswith('#'):
+        return None
+
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    elif line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    if '/' in line:
+        regex = _translate(line.lstrip('/'))
+    else:
+        regex = '(?:.*/)?' + _translate(line)
+    return re.compile(regex + '$'), negate, dir_only
+
+
+class IgnoreRules():
+
+    def __init__(self, rules=()):
+        self.rules = tuple(rules)
+
+    def extended(self, base_dir, lines):
+        rules = list(self.rules)
+        for line in lines:
+            parsed = _parse_pattern(line)
+            if parsed:
+                rules.append((base_dir,) + parsed)
+        if len(rules) == len(self.rules):
+            return self
+        return IgnoreRules(rules)
+
+    def ignored(self, path, is_dir):
+        ignored = False
+        for base_dir, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base_dir:
+                if not path.startswith(base_dir + os.sep):
+                    continue
+                relative_path = path[len(base_dir) + 1:]
+            else:
+                relative_path = path
+            if os.sep != '/':
+                relative_path = relative_path.replace(os.sep, '/')
+            if regex.match(relative_path):
+                ignored = not negate
+        return ignored
+
+
+def _read_gitignore(path):
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.readlines()
+    except OSError as ex:
+        logging.debug("Could not read %r. (%r)", path, ex)
+        return []
+
+
+def _is_virtualenv(path):
+    return os.path.isfile(os.path.join(path, VIRTUALENV_MARKER))
+
+
+def read_file_list(file_list):
+    if file_list == '-':
+        raw = sys.stdin.buffer.read()
+    else:
+        with open(file_list, 'rb') as f:
+            raw = f.read()
+
+    if b'\0' in raw:
+        paths = raw.split(b'\0')
+    else:
+        paths = [p.rstrip(b'\r') for p in raw.split(b'\n')]
+    return [os.fsdecode(p) for p in paths if p]
+
+
+class SourceFinder():
+
+    def __init__(self, exclude_paths=None, file_list=None, use_gitignore=True):
+        self.exclude_paths = exclude_paths or []
+        self.file_list = file_list
+        self.use_gitignore = use_gitignore
+        self.listed_files = None
+
+    def find(self, raw_source_paths):
+        individual_files = []
+        for source in sorted(raw_source_paths):
+            if os.path.isfile(source):
+                individual_files.append((source, True))
+                continue
+            self._scan(source, individual_files)
+
+        if self.file_list:
+            if self.listed_files is None:
+                self.listed_files = read_file_list(self.file_list)
+            individual_files += self._filter_listed(self.listed_files)
+        return individual_files
+
+    def _scan(self, root, individual_files):
+        root = root.rstrip(os.sep) or os.sep
+        todo = [(root, IgnoreRules().extended(root, self.exclude_paths))]
+        while todo:
+            directory, rules = todo.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError as ex:
+                logging.debug("Could not read directory %r. (%r)", directory, ex)
+                continue
+
+            if self.use_gitignore and any(entry.name == GITIGNORE for entry in entries):
+                rules = rules.extended(directory,
+                                       _read_gitignore(os.path.join(directory, GITIGNORE)))
+
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if is_dir:
+                    if entry.name in PRUNED_DIRS or entry.is_symlink() or \
+                       rules.ignored(entry.path, True) or _is_virtualenv(entry.path):
+                        logging.debug("Pruning %r.", entry.path)
+                        continue
+                    todo.append((entry.path, rules))
+                elif not rules.ignored(entry.path, False):
+                    individual_files.append((entry.path, False))
+
+    def _filter_listed(self, listed_files):
+        rules = IgnoreRules().extended(None, self.exclude_paths)
+        individual_files = []
+        for path in listed_files:
+            path = os.path.normpath(path)
+            parts = path.split(os.sep)
+            if any(part in PRUNED_DIRS for part in parts[:-1]):
+                continue
+            ancestors = [os.sep.join(parts[:i]) for i in range(1, len(parts))]
+            if rules.ignored(path, False) or any(rules.ignored(a, True) for a in ancestors):
+                continue
+            individual_files.append((path, False))
+        return individual_files
@@ -1,21 +1,50 @@
 import argparse
+import bisect
 import collections
+import concurrent.futures
+import functools
+import hashlib
+import html
+import itertools
 import json
 import logging
 import os
+import re
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+from array import array
 
+from .cache import DEFAULT_CACHE_SIZE_MB, FileGroupCache
+from . import binary, database, layout
+from .discovery import SourceFinder
+from .profiling import Profiler
 from .python import Python
+from .server import serve
 from .model import (TRUNK_COLOR, LEAF_COLOR, NODE_COLOR, GROUP_TYPE, OWNER_CONST,
-                    Edge, Group, Node, Variable, is_installed, flatten)
+                    Call, Edge, Group, Node, Variable, WeightedEdge, dot_attributes, is_installed,
+                    flatten)
 
 VERSION = '2.5.1'
 
+DESCRIPTION = "Generate logical schemas from your source code."
+
 IMAGE_EXTENSIONS = ('png', 'svg')
-TEXT_EXTENSIONS = ('dot', 'gv', 'json')
-VALID_EXTENSIONS = IMAGE_EXTENSIONS + TEXT_EXTENSIONS
+TEXT_EXTENSIONS = ('dot', 'gv', 'json', 'ndjson')
+BINARY_EXTENSIONS = ('cgb',)
+DATABASE_EXTENSIONS = ('sqlite',)
+VALID_EXTENSIONS = (IMAGE_EXTENSIONS + TEXT_EXTENSIONS + BINARY_EXTENSIONS +
+                    DATABASE_EXTENSIONS)
+
+WRITE_BUFFER_SIZE = 64 * 1024
+TEMP_SUFFIX = '.tmp'
+UID_LENGTH = 12
+
+COLLAPSE_LEVELS = ('file', 'class', 'auto')
+COLLAPSE_MAX_NODES = 1000
+COLLAPSE_MAX_EDGES = 2500
 
 
 LEGEND = """subgraph legend{
@@ -33,11 +62,67 @@ LEGEND = """subgraph legend{
 }""" % (NODE_COLOR, TRUNK_COLOR, LEAF_COLOR)
 
 
+SHARD_INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>CodeToSchemas shards</title></head>
+<body>
+<table>
+<tr><th>shard</th><th>files</th><th>functions</th><th>edges</th><th>calls into</th></tr>
+%s
+</table>
+</body>
+</html>
+"""
+
+
 LANGUAGES = {
     'py': Python
 }
 
 
+class LanguageParams():
+
+    def __init__(self, source_type='script'):
+        self.source_type = source_type
+
+
+class LimitParams():
+
+    def __init__(self, exclude_namespaces=None, exclude_functions=None,
+                 include_only_namespaces=None, include_only_functions=None):
+        self.exclude_namespaces = set(exclude_namespaces or [])
+        self.exclude_functions = set(exclude_functions or [])
+        self.include_only_namespaces = set(include_only_namespaces or [])
+        self.include_only_functions = set(include_only_functions or [])
+
+    def __bool__(self):
+        return bool(self.exclude_namespaces or self.exclude_functions or
+                    self.include_only_namespaces or self.include_only_functions)
+
+    def cache_key(self):
+        return repr(tuple(sorted(limit) for limit in (
+            self.exclude_namespaces, self.exclude_functions,
+            self.include_only_namespaces, self.include_only_functions)))
+
+    def excludes_file(self, file_token):
+        return file_token in self.exclude_namespaces
+
+    def keeps_namespace(self, namespace_tokens):
+        if any(t in self.exclude_namespaces for t in namespace_tokens):
+            return False
+        if self.include_only_namespaces and \
+           not any(t in self.include_only_namespaces for t in namespace_tokens):
+            return False
+        return True
+
+    def keeps_function(self, token):
+        if token in self.exclude_functions:
+            return False
+        return not self.include_only_functions or token in self.include_only_functions
+
+    def keeps_node(self, token, namespace_tokens):
+        return self.keeps_namespace(namespace_tokens) and self.keeps_function(token)
+
 
 class SubsetParams():
 
@@ -69,129 +154,232 @@ class SubsetParams():
 
         return SubsetParams(target_function, upstream_depth, downstream_depth)
 
+    @staticmethod
+    def generate_many(target_functions, upstream_depth, downstream_depth, targets_file=None):
 
+        targets = [(t, upstream_depth, downstream_depth) for t in target_functions]
+        if targets_file:
+            targets += _read_targets_file(targets_file, upstream_depth, downstream_depth)
 
-def _find_target_node(subset_params, all_nodes):
-
-    target_nodes = []
-    for node in all_nodes:
-        if node.token == subset_params.target_function or \
-           node.token_with_ownership() == subset_params.target_function or \
-           node.name() == subset_params.target_function:
-            target_nodes.append(node)
-    if not target_nodes:
-        raise AssertionError("Could not find node %r to build a subset." % subset_params.target_function)
-    if len(target_nodes) > 1:
-        raise AssertionError("Found multiple nodes for %r: %r. Try either a `class.func` or "
-                             "`filename::class.func`." % (subset_params.target_function, target_nodes))
-    return target_nodes[0]
-
-
-def _filter_nodes_for_subset(subset_params, all_nodes, edges):
-
-    target_node = _find_target_node(subset_params, all_nodes)
-    downstream_dict = collections.defaultdict(set)
-    upstream_dict = collections.defaultdict(set)
-    for edge in edges:
-        upstream_dict[edge.node1].add(edge.node0)
-        downstream_dict[edge.node0].add(edge.node1)
+        if not targets:
+            return SubsetParams.generate(None, upstream_depth, downstream_depth)
 
-    include_nodes = {target_node}
-    step_nodes = {target_node}
-    next_step_nodes = set()
+        return [SubsetParams.generate(*target) for target in targets]
 
-    for _ in range(subset_params.downstream_depth):
-        for node in step_nodes:
-            next_step_nodes.update(downstream_dict[node])
-        include_nodes.update(next_step_nodes)
-        step_nodes = next_step_nodes
-        next_step_nodes = set()
 
-    step_nodes = {target_node}
-    next_step_nodes = set()
+def _read_targets_file(targets_file, upstream_depth, downstream_depth):
 
-    for _ in range(subset_params.upstream_depth):
-        for node in step_nodes:
-            next_step_nodes.update(upstream_dict[node])
-        include_nodes.update(next_step_nodes)
-        step_nodes = next_step_nodes
-        next_step_nodes = set()
+    targets = []
+    with open(targets_file) as f:
+        for line_number, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) > 3:
+                raise AssertionError("%s:%d: expected `target [upstream_depth [downstream_depth]]`."
+                                     % (targets_file, line_number))
+            try:
+                depths = [int(field) for field in fields[1:]]
+            except ValueError:
+                raise AssertionError("%s:%d: depths must be integers." % (targets_file, line_number))
+            depths += [upstream_depth, downstream_depth][len(depths):]
+            targets.append((fields[0], depths[0], depths[1]))
+    return targets
 
-    return include_nodes
 
 
-def _filter_edges_for_subset(new_nodes, edges):
+def _csr(num_nodes, sources, targets):
 
-    new_edges = []
-    for edge in edges:
-        if edge.node0 in new_nodes and edge.node1 in new_nodes:
-            new_edges.append(edge)
-    return new_edges
+    counts = [0] * (num_nodes + 1)
+    for source in sources:
+        counts[source + 1] += 1
+    offsets = array('l', itertools.accumulate(counts))
+    neighbors = array('l', [0]) * len(sources)
+    edge_ids = array('l', [0]) * len(sources)
+    positions = list(offsets[:-1])
+    for edge_id, (source, target) in enumerate(zip(sources, targets)):
+        position = positions[source]
+        neighbors[position] = target
+        edge_ids[position] = edge_id
+        positions[source] = position + 1
+    return offsets, neighbors, edge_ids
+
+
+class AdjacencyIndex():
+
+    def __init__(self, all_nodes, edges):
+        self.nodes = list(all_nodes)
+        self.edges = list(edges)
+        self.node_ids = {node: i for i, node in enumerate(self.nodes)}
+
+        self.nodes_by_name = collections.defaultdict(list)
+        for node in self.nodes:
+            for name in {node.token, node.token_with_ownership(), node.name()}:
+                self.nodes_by_name[name].append(node)
+
+        sources = [self.node_ids[edge.node0] for edge in self.edges]
+        targets = [self.node_ids[edge.node1] for edge in self.edges]
+        self.downstream = _csr(len(self.nodes), sources, targets)
+        self.upstream = _csr(len(self.nodes), targets, sources)
+
+    def find_target_node(self, target_function):
+        target_nodes = self.nodes_by_name.get(target_function, [])
+        if not target_nodes:
+            raise AssertionError("Could not find node %r to build a subset." % target_function)
+        if len(target_nodes) > 1:
+            raise AssertionError("Found multiple nodes for %r: %r. Try either a `class.func` or "
+                                 "`filename::class.func`." % (target_function, target_nodes))
+        return target_nodes[0]
+
+    def _reachable(self, node_id, depth, adjacency):
+        offsets, neighbors, _ = adjacency
+        reached = {node_id}
+        step_ids = [node_id]
+        for _ in range(depth):
+            next_step_ids = []
+            for i in step_ids:
+                for j in neighbors[offsets[i]:offsets[i + 1]]:
+                    if j not in reached:
+                        reached.add(j)
+                        next_step_ids.append(j)
+            if not next_step_ids:
+                break
+            step_ids = next_step_ids
+        return reached
+
+    def subset(self, subset_params):
+        target_id = self.node_ids[self.find_target_node(subset_params.target_function)]
+        node_ids = self._reachable(target_id, subset_params.downstream_depth, self.downstream)
+        node_ids |= self._reachable(target_id, subset_params.upstream_depth, self.upstream)
+
+        offsets, neighbors, edge_ids = self.downstream
+        subset_edge_ids = []
+        for i in node_ids:
+            for position in range(offsets[i], offsets[i + 1]):
+                if neighbors[position] in node_ids:
+                    subset_edge_ids.append(edge_ids[position])
+        subset_edge_ids.sort()
+
+        return ({self.nodes[i] for i in node_ids},
+                [self.edges[edge_id] for edge_id in subset_edge_ids])
+
+
+def _retain_nodes(file_groups, kept_nodes, prune_groups=True):
+
+    def retain(group):
+        group.nodes = {n: None for n in group.nodes if n in kept_nodes}
+        subgroups = {sg: None for sg in group.subgroups if retain(sg)}
+        if prune_groups:
+            group.subgroups = subgroups
+        return bool(group.nodes or subgroups)
+
+    return [g for g in file_groups if retain(g)]
 
 
 def _filter_groups_for_subset(new_nodes, file_groups):
 
-    for file_group in file_groups:
-        for node in file_group.all_nodes():
-            if node not in new_nodes:
-                node.remove_from_parent()
+    return _retain_nodes(file_groups, new_nodes)
 
-    new_file_groups = [g for g in file_groups if g.all_nodes()]
 
-    for file_group in new_file_groups:
-        for group in file_group.all_groups():
-            if not group.all_nodes():
-                group.remove_from_parent()
+def _filter_for_subset(subset_params, all_nodes, edges, file_groups, adjacency_index=None):
 
-    return new_file_groups
+    adjacency_index = adjacency_index or AdjacencyIndex(all_nodes, edges)
+    new_nodes, new_edges = adjacency_index.subset(subset_params)
+    new_file_groups = _filter_groups_for_subset(new_nodes, file_groups)
+    return new_file_groups, list(new_nodes), new_edges
 
 
-def _filter_for_subset(subset_params, all_nodes, edges, file_groups):
+def _save_membership(file_groups):
 
-    new_nodes = _filter_nodes_for_subset(subset_params, all_nodes, edges)
-    new_edges = _filter_edges_for_subset(new_nodes, edges)
-    new_file_groups = _filter_groups_for_subset(new_nodes, file_groups)
-    return new_file_groups, list(new_nodes), new_edges
+    return [(group, dict(group.nodes), dict(group.subgroups))
+            for file_group in file_groups
+            for group in file_group.all_groups()]
 
 
-def generate_json(nodes, edges):
+def _restore_membership(saved_membership):
 
-    nodes = [n.to_dict() for n in nodes]
-    nodes = {n['uid']: n for n in nodes}
-    edges = [e.to_dict() for e in edges]
+    for group, nodes, subgroups in saved_membership:
+        group.nodes = dict(nodes)
+        group.subgroups = dict(subgroups)
 
-    return json.dumps({"graph": {
-        "directed": True,
-        "nodes": nodes,
-        "edges": edges,
-    }})
 
+def generate_json_chunks(nodes, edges):
 
-def write_file(outfile, nodes, edges, groups, hide_legend=False,
-               no_grouping=False, as_json=False):
+    yield '{"graph": {"directed": true, "nodes": {'
+    separator = ''
+    for node in nodes:
+        node_dict = node.to_dict()
+        yield separator + json.dumps(node_dict['uid']) + ': ' + json.dumps(node_dict)
+        separator = ', '
+    yield '}, "edges": ['
+    separator = ''
+    for edge in edges:
+        yield separator + json.dumps(edge.to_dict())
+        separator = ', '
+    yield ']}}'
 
-    if as_json:
-        content = generate_json(nodes, edges)
-        outfile.write(content)
-        return
+
+def generate_ndjson_chunks(nodes, edges):
+
+    for node in nodes:
+        yield json.dumps(dict(type='node', **node.to_dict())) + '\n'
+    for edge in edges:
+        yield json.dumps(dict(type='edge', **edge.to_dict())) + '\n'
+
+
+def generate_json(nodes, edges):
+
+    return ''.join(generate_json_chunks(nodes, edges))
+
+
+def generate_dot(nodes, edges, groups, hide_legend=False, no_grouping=False):
 
     splines = "polyline" if len(edges) >= 500 else "ortho"
 
-    content = "digraph G {\n"
-    content += "concentrate=true;\n"
-    content += f'splines="{splines}";\n'
-    content += 'rankdir="LR";\n'
+    yield "digraph G {\n"
+    yield "concentrate=true;\n"
+    yield f'splines="{splines}";\n'
+    yield 'rankdir="LR";\n'
     if not hide_legend:
-        content += LEGEND
+        yield LEGEND
     for node in nodes:
-        content += node.to_dot() + ';\n'
+        yield node.to_dot() + ';\n'
     for edge in edges:
-        content += edge.to_dot() + ';\n'
+        yield edge.to_dot() + ';\n'
     if not no_grouping:
         for group in groups:
-            content += group.to_dot()
-    content += '}\n'
-    outfile.write(content)
+            yield group.to_dot()
+    yield '}\n'
+
+
+def write_chunks(outfile, chunks, buffer_size=WRITE_BUFFER_SIZE):
+
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= buffer_size:
+            outfile.write(''.join(buffer))
+            buffer = []
+            buffered = 0
+    if buffer:
+        outfile.write(''.join(buffer))
+
+
+def write_file(outfile, nodes, edges, groups, hide_legend=False,
+               no_grouping=False, as_json=False, as_ndjson=False):
+
+    if as_json:
+        write_chunks(outfile, generate_json_chunks(nodes, edges))
+        return
+
+    if as_ndjson:
+        write_chunks(outfile, generate_ndjson_chunks(nodes, edges))
+        return
+
+    write_chunks(outfile, generate_dot(nodes, edges, groups, hide_legend=hide_legend,
+                                       no_grouping=no_grouping))
 
 
 def determine_language(individual_files):
@@ -204,15 +392,9 @@ def determine_language(individual_files):
                          "Try explicitly passing the language flag.")
 
 
-def get_sources_and_language(raw_source_paths, language):
-    individual_files = []
-    for source in sorted(raw_source_paths):
-        if os.path.isfile(source):
-            individual_files.append((source, True))
-            continue
-        for root, _, files in os.walk(source):
-            for f in files:
-                individual_files.append((os.path.join(root, f), False))
+def get_sources_and_language(raw_source_paths, language, source_finder=None):
+    source_finder = source_finder or SourceFinder()
+    individual_files = source_finder.find(raw_source_paths)
 
     if not individual_files:
         raise AssertionError("No source files found from %r" % raw_source_paths)
@@ -222,13 +404,17 @@ def get_sources_and_language(raw_source_paths, language):
         language = determine_language(individual_files)
 
     sources = set()
+    num_skipped = 0
     for source, explicity_added in individual_files:
         if explicity_added or source.endswith('.' + language):
             sources.add(source)
         else:
-            logging.info("Skipping %r which is not a %s file. "
-                         "If this is incorrect, include it explicitly.",
-                         source, language)
+            logging.debug("Skipping %r which is not a %s file.", source, language)
+            num_skipped += 1
+    if num_skipped:
+        logging.info("Skipping %d file(s) which are not %s files. "
+                     "If this is incorrect, include them explicitly.",
+                     num_skipped, language)
 
     if not sources:
         raise AssertionError("Could not find any source files given {raw_source_paths} "
@@ -237,17 +423,35 @@ def get_sources_and_language(raw_source_paths, language):
     sources = sorted(list(sources))
     logging.info("Processing %d source file(s)." % (len(sources)))
     for source in sources:
-        logging.info("  " + source)
+        logging.debug("  " + source)
 
     return sources, language
 
 
-def make_file_group(tree, filename, extension):
+def _poll_sources(raw_source_paths, language, source_finder):
+    return sorted(source for source, explicity_added in source_finder.find(raw_source_paths)
+                  if explicity_added or source.endswith('.' + language))
+
+
+def _file_stat(source):
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_token(filename, extension):
+    return os.path.split(filename)[-1].rsplit('.' + extension, 1)[0]
+
+
+def make_file_group(tree, filename, extension, limit_params=None):
     language = LANGUAGES[extension]
 
-    subgroup_trees, node_trees, body_trees = language.separate_namespaces(tree)
+    token = _file_token(filename, extension)
+    subgroup_trees, node_trees, body_trees = language.separate_namespaces(
+        tree, limit_params=limit_params, namespace_tokens=(token,))
     group_type = GROUP_TYPE.FILE
-    token = os.path.split(filename)[-1].rsplit('.' + extension, 1)[0]
     line_number = 0
     display_name = 'File'
     import_tokens = language.file_import_tokens(filename)
@@ -258,15 +462,209 @@ def make_file_group(tree, filename, extension):
         for new_node in language.make_nodes(node_tree, parent=file_group):
             file_group.add_node(new_node)
 
-    file_group.add_node(language.make_root_node(body_trees, parent=file_group), is_root=True)
+    root_node = language.make_root_node(body_trees, parent=file_group)
+    if not limit_params or limit_params.keeps_node(root_node.token, (token,)):
+        file_group.add_node(root_node, is_root=True)
+    else:
+        # nodes in kept classes still resolve module level imports through the root node
+        file_group.root_node = root_node
+        body_trees.skipped_functions.add(root_node.token)
 
     for subgroup_tree in subgroup_trees:
         file_group.add_subgroup(language.make_class_group(subgroup_tree, parent=file_group))
+    file_group.skipped_functions = body_trees.skipped_functions
+    file_group.source = filename
+    _assign_stable_uids(file_group, filename)
     return file_group
 
 
-def _find_link_for_call(call, node_a, all_nodes):
-    all_vars = node_a.get_variables(call.line_number)
+def _assign_stable_uids(file_group, filename):
+    # uids are derived from the source so unchanged code renders to identical output
+    used_uids = set()
+
+    def stable_uid(prefix, *parts):
+        for attempt in itertools.count():
+            key = '\0'.join(str(p) for p in (filename, attempt) + parts)
+            uid = prefix + hashlib.sha1(key.encode('utf-8')).hexdigest()[:UID_LENGTH]
+            if uid not in used_uids:
+                used_uids.add(uid)
+                return uid
+
+    for group in file_group.all_groups():
+        group.uid = stable_uid('cluster_', group.token, group.line_number)
+    for node in file_group.all_nodes():
+        node.uid = stable_uid('node_', node.parent.token, node.token, node.line_number)
+
+
+class ImportIndex():
+
+    def __init__(self, file_groups):
+        self.by_import_token = {}
+        self.groups_by_token = {}
+        for file_group in file_groups:
+            for node in file_group.all_nodes():
+                for import_token in node.import_tokens:
+                    self.by_import_token.setdefault(import_token, node)
+            for group in file_group.all_groups():
+                for import_token in group.import_tokens:
+                    self.by_import_token.setdefault(import_token, group)
+                self.groups_by_token[group.token] = group
+
+    def resolve_variables(self, node):
+        for variable in node.variables:
+            if isinstance(variable.points_to, str):
+                variable.points_to = self.by_import_token.get(variable.points_to,
+                                                              OWNER_CONST.UNKNOWN_MODULE)
+            elif isinstance(variable.points_to, Call):
+                call = variable.points_to
+                if call.is_attr() and not call.definite_constructor:
+                    continue
+                if call.token in self.groups_by_token:
+                    variable.points_to = self.groups_by_token[call.token]
+
+
+class SymbolIndex():
+
+    def __init__(self, all_nodes):
+        self.nodes_by_token = collections.defaultdict(list)
+        self.file_nodes_by_token = collections.defaultdict(list)
+        self.file_nodes_by_group = collections.defaultdict(list)
+        self.constructors_by_group_token = collections.defaultdict(list)
+
+        for node in all_nodes:
+            self.nodes_by_token[node.token].append(node)
+            if isinstance(node.parent, Group) and node.parent.group_type == GROUP_TYPE.FILE:
+                self.file_nodes_by_token[node.token].append(node)
+                self.file_nodes_by_group[(node.token, node.parent)].append(node)
+            if node.is_constructor:
+                self.constructors_by_group_token[node.parent.token].append(node)
+
+    def possible_nodes(self, call, node_a):
+        if call.is_attr():
+            candidates = self.nodes_by_token.get(call.token, [])
+            same_file = self.file_nodes_by_group.get((call.token, node_a.file_group()), [])
+            if len(candidates) - len(same_file) > 1:
+                return candidates
+            return [n for n in candidates if n not in same_file]
+
+        possible_nodes = list(self.file_nodes_by_token.get(call.token, []))
+        for node in self.constructors_by_group_token.get(call.token, []):
+            if node not in possible_nodes:
+                possible_nodes.append(node)
+        return possible_nodes
+
+
+def _inheritance_chain(base_tokens, base_tokens_by_token):
+    chain = []
+    seen = set()
+    todo = list(reversed(base_tokens))
+    while todo:
+        token = todo.pop()
+        if token in seen:
+            continue
+        seen.add(token)
+        chain.append(token)
+        todo += reversed(base_tokens_by_token.get(token, []))
+    return chain
+
+
+def _link_inheritance(subgroups, inherit_tokens, warn_duplicates=False):
+
+    nodes_by_subgroup_token = collections.defaultdict(list)
+    base_tokens_by_subgroup_token = collections.defaultdict(list)
+    for subgroup in subgroups:
+        if warn_duplicates and subgroup.token in nodes_by_subgroup_token:
+            logging.warning("Duplicate group name %r. Naming collision possible.",
+                            subgroup.token)
+        nodes_by_subgroup_token[subgroup.token] += subgroup.nodes
+        base_tokens_by_subgroup_token[subgroup.token] += inherit_tokens[subgroup]
+
+    chains = {}
+    for subgroup in subgroups:
+        base_tokens = tuple(inherit_tokens[subgroup])
+        if base_tokens not in chains:
+            inherits = [nodes_by_subgroup_token.get(t) for t in
+                        _inheritance_chain(base_tokens, base_tokens_by_subgroup_token)]
+            chains[base_tokens] = list(filter(None, inherits))
+        subgroup.inherits = chains[base_tokens]
+
+
+def _variable_tokens(call):
+    if call.is_attr():
+        return {call.owner_token, call.owner_token.split('.')[0]}
+    return {call.token}
+
+
+def _line_scope(variables):
+    entries_by_token = collections.defaultdict(list)
+    for position, var in enumerate(variables):
+        entries_by_token[var.token].append((var.line_number, position, var))
+
+    scope = {}
+    for token, entries in entries_by_token.items():
+        entries.sort(key=lambda e: (e[0], -e[1]))
+        scope[token] = ([e[0] for e in entries], entries)
+    return scope
+
+
+class VariableIndex():
+
+    def __init__(self):
+        self.group_scopes = {}
+        self.inherited_scopes = {}
+
+    def _group_scope(self, group):
+        scope = self.group_scopes.get(group)
+        if scope is None:
+            scope = collections.defaultdict(list)
+            for position, var in enumerate(group.get_variables()):
+                scope[var.token].append((position, var))
+            self.group_scopes[group] = scope
+        return scope
+
+    def _inherited_scope(self, inherit_nodes):
+        key = id(inherit_nodes)
+        if key not in self.inherited_scopes:
+            variables = [Variable(n.token, n, n.line_number) for n in inherit_nodes]
+            self.inherited_scopes[key] = (inherit_nodes, _line_scope(variables))
+        return self.inherited_scopes[key][1]
+
+    def node_scope(self, node):
+        node_scope = [(_line_scope(node.variables), 0)]
+        offset = len(node.variables)
+        for inherit_nodes in node.parent.inherits:
+            node_scope.append((self._inherited_scope(inherit_nodes), offset))
+            offset += len(inherit_nodes)
+        return node_scope
+
+    def get_variables(self, node, node_scope, call):
+        tokens = _variable_tokens(call)
+
+        own_entries = []
+        for scope, offset in node_scope:
+            for token in tokens:
+                if token not in scope:
+                    continue
+                lines, entries = scope[token]
+                if call.line_number is not None:
+                    entries = entries[:bisect.bisect_right(lines, call.line_number)]
+                own_entries += [(line, offset + position, var) for line, position, var in entries]
+        own_entries.sort(key=lambda e: (e[0], -e[1]), reverse=True)
+        for _, _, var in own_entries:
+            yield var
+
+        parent = node.parent
+        while parent:
+            scope = self._group_scope(parent)
+            group_entries = flatten(scope.get(token, []) for token in tokens)
+            group_entries.sort(key=lambda e: e[0])
+            for _, var in group_entries:
+                yield var
+            parent = parent.parent
+
+
+def _find_link_for_call(call, node_a, symbol_index, variable_index, node_scope):
+    all_vars = variable_index.get_variables(node_a, node_scope, call)
 
     for var in all_vars:
         var_match = call.matches_variable(var)
@@ -276,20 +674,7 @@ def _find_link_for_call(call, node_a, all_nodes):
             assert isinstance(var_match, Node)
             return var_match, None
 
-    possible_nodes = []
-    if call.is_attr():
-        for node in all_nodes:
-            if call.token == node.token and node.parent != node_a.file_group():
-                possible_nodes.append(node)
-    else:
-        for node in all_nodes:
-            if call.token == node.token \
-               and isinstance(node.parent, Group)  \
-               and node.parent.group_type == GROUP_TYPE.FILE:
-                possible_nodes.append(node)
-            elif call.token == node.parent.token and node.is_constructor:
-                possible_nodes.append(node)
-
+    possible_nodes = symbol_index.possible_nodes(call, node_a)
     if len(possible_nodes) == 1:
         return possible_nodes[0], None
     if len(possible_nodes) > 1:
@@ -297,65 +682,331 @@ def _find_link_for_call(call, node_a, all_nodes):
     return None, None
 
 
-def _find_links(node_a, all_nodes):
+def _find_links(node_a, symbol_index, variable_index):
 
+    node_scope = variable_index.node_scope(node_a)
     links = []
     for call in node_a.calls:
-        lfc = _find_link_for_call(call, node_a, all_nodes)
+        lfc = _find_link_for_call(call, node_a, symbol_index, variable_index, node_scope)
         assert not isinstance(lfc, Group)
-        links.append(lfc)
+        links.append(lfc + (call.line_number,))
     return list(filter(None, links))
 
 
+def _make_edges(links_by_node, keep_duplicate_edges=False):
+
+    edges = []
+    edges_by_nodes = {}
+    for node_a, links in links_by_node:
+        for node_b, _, line_number in links:
+            if not node_b:
+                continue
+            if keep_duplicate_edges:
+                edges.append(Edge(node_a, node_b))
+                continue
+            edge = edges_by_nodes.get((node_a, node_b))
+            if not edge:
+                edge = edges_by_nodes[(node_a, node_b)] = WeightedEdge(node_a, node_b)
+                edges.append(edge)
+            edge.add_call(line_number)
+    return edges
+
+
+def _top_group(group):
+    while group.parent:
+        group = group.parent
+    return group
+
+
+class GroupNode(Node):
+    __slots__ = ('group', 'num_functions')
+
+    def __init__(self, group):
+        super().__init__(group.token, [], [], group, line_number=group.line_number)
+        self.group = group
+        self.uid = group.uid.replace('cluster_', 'node_', 1)
+        self.num_functions = 0
+
+    def __repr__(self):
+        return f"<GroupNode {self.group}>"
+
+    def name(self):
+        tokens = []
+        group = self.group
+        while group.parent:
+            tokens.insert(0, group.token)
+            group = group.parent
+        if not tokens:
+            return group.filename()
+        return f"{group.filename()}::{'.'.join(tokens)}"
+
+    def label(self):
+        plural = '' if self.num_functions == 1 else 's'
+        return f"{self.group.label()} ({self.num_functions} function{plural})"
+
+    def to_dict(self):
+        ret = super().to_dict()
+        ret['functions'] = self.num_functions
+        return ret
+
+
+def _collapse_counts(all_nodes, edges, group_of):
+    node_groups = {node: group_of(node) for node in all_nodes}
+    pairs = {(node_groups[e.node0], node_groups[e.node1]) for e in edges}
+    return len(set(node_groups.values())), sum(1 for a, b in pairs if a is not b)
+
+
+def _auto_collapse_level(all_nodes, edges):
+    if len(all_nodes) <= COLLAPSE_MAX_NODES and len(edges) <= COLLAPSE_MAX_EDGES:
+        return None
+    num_nodes, num_edges = _collapse_counts(all_nodes, edges, Node.first_group)
+    if num_nodes <= COLLAPSE_MAX_NODES and num_edges <= COLLAPSE_MAX_EDGES:
+        return 'class'
+    return 'file'
+
+
+def _collapse_graph(file_groups, all_nodes, edges, collapse):
+
+    if collapse == 'auto':
+        collapse = _auto_collapse_level(all_nodes, edges)
+        if collapse:
+            logging.info("Collapsing the graph to %s level to stay within %d nodes and %d edges.",
+                         collapse, COLLAPSE_MAX_NODES, COLLAPSE_MAX_EDGES)
+    if not collapse:
+        return file_groups, all_nodes, edges
+
+    group_of = Node.file_group if collapse == 'file' else Node.first_group
+    group_nodes = {}
+    node_map = {}
+    for node in all_nodes:
+        group = group_of(node)
+        if group not in group_nodes:
+            group_nodes[group] = GroupNode(group)
+        group_nodes[group].num_functions += 1
+        node_map[node] = group_nodes[group]
+
+    collapsed_edges = {}
+    for edge in edges:
+        node_a, node_b = node_map[edge.node0], node_map[edge.node1]
+        if node_a is node_b:
+            continue
+        if (node_a, node_b) not in collapsed_edges:
+            collapsed_edges[(node_a, node_b)] = WeightedEdge(node_a, node_b)
+        collapsed_edges[(node_a, node_b)].line_numbers += getattr(edge, 'line_numbers', [None])
+
+    collapsed_groups = []
+    if collapse == 'class':
+        clusters = {}
+        for group, group_node in group_nodes.items():
+            file_group = _top_group(group)
+            if file_group not in clusters:
+                clusters[file_group] = Group(file_group.token, file_group.group_type,
+                                             file_group.display_type,
+                                             line_number=file_group.line_number)
+                clusters[file_group].uid = file_group.uid
+                collapsed_groups.append(clusters[file_group])
+            clusters[file_group].add_node(group_node)
+
+    return collapsed_groups, list(group_nodes.values()), list(collapsed_edges.values())
+
+
+class StubNode(Node):
+    __slots__ = ('node', 'shard', 'url')
+
+    def __init__(self, node, shard, url):
+        super().__init__(node.token, [], [], node.parent, line_number=node.line_number)
+        self.node = node
+        self.uid = node.uid
+        self.shard = shard
+        self.url = url
+
+    def __repr__(self):
+        return f"<StubNode {self.node} shard={self.shard}>"
+
+    def name(self):
+        return self.node.name()
+
+    def label(self):
+        return f"{self.shard}: {self.node.name()}"
+
+    def to_dot(self):
+        return self.uid + ' [' + dot_attributes({
+            'label': self.label(),
+            'name': self.name(),
+            'shape': 'rect',
+            'style': 'rounded,dashed',
+            'URL': self.url,
+        }) + ']'
+
+    def to_dict(self):
+        ret = super().to_dict()
+        ret['shard'] = self.shard
+        ret['stub'] = True
+        return ret
+
+
+def _stub_edge(edge, node0, node1):
+    if isinstance(edge, WeightedEdge):
+        stub_edge = WeightedEdge(node0, node1)
+        stub_edge.line_numbers = list(edge.line_numbers)
+        return stub_edge
+    return Edge(node0, node1)
+
+
+def _shard_name(source, root):
+    parts = os.path.relpath(source, root).split(os.sep)
+    if len(parts) > 1:
+        return parts[0]
+    return parts[0].rsplit('.', 1)[0]
+
+
+def _shard_file_groups(file_groups):
+    if not file_groups:
+        return collections.OrderedDict()
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(g.source)) for g in file_groups])
+    shards = collections.defaultdict(list)
+    for file_group in file_groups:
+        shards[_shard_name(os.path.abspath(file_group.source), root)].append(file_group)
+    return collections.OrderedDict(sorted(shards.items()))
+
+
+def _make_file_group_for_source(source, extension, lang_params, skip_parse_errors, cache=None,
+                                limit_params=None):
+    language = LANGUAGES[extension]
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+
+    if limit_params and limit_params.excludes_file(_file_token(source, extension)):
+        return None, (0.0, 0.0), (0.0, 0.0)
+
+    cache_key = None
+    try:
+        with open(source, 'rb') as f:
+            raw = f.read()
+        if cache:
+            cache_key = cache.key(source, raw, extension,
+                                  getattr(lang_params, 'source_type', None),
+                                  limit_params.cache_key() if limit_params else None)
+            file_group = cache.get(cache_key)
+            if file_group:
+                parse_time = (time.perf_counter() - start_wall, time.process_time() - start_cpu)
+                return file_group, parse_time, (0.0, 0.0)
+        file_ast_tree = language.get_tree(source, lang_params, raw)
+    except Exception as ex:
+        if skip_parse_errors:
+            logging.warning("Could not parse %r. (%r) Skipping...", source, ex)
+            return None, (0.0, 0.0), (0.0, 0.0)
+        raise ex
+    parse_wall, parse_cpu = time.perf_counter(), time.process_time()
+    file_group = make_file_group(file_ast_tree, source, extension, limit_params)
+
+    if cache:
+        cache.put(cache_key, file_group)
+    return (file_group,
+            (parse_wall - start_wall, parse_cpu - start_cpu),
+            (time.perf_counter() - parse_wall, time.process_time() - parse_cpu))
+
+
+def _intern_call(call, tokens):
+    call.token = tokens.setdefault(call.token, call.token)
+    if call.owner_token:
+        call.owner_token = tokens.setdefault(call.owner_token, call.owner_token)
+
+
+def _intern_tokens(file_group, tokens):
+    for group in file_group.all_groups():
+        group.token = tokens.setdefault(group.token, group.token)
+        group.import_tokens = [tokens.setdefault(t, t) for t in group.import_tokens]
+        group.inherits = [tokens.setdefault(t, t) for t in group.inherits]
+    for node in file_group.all_nodes():
+        node.token = tokens.setdefault(node.token, node.token)
+        node.import_tokens = [tokens.setdefault(t, t) for t in node.import_tokens]
+        for call in node.calls:
+            _intern_call(call, tokens)
+        for variable in node.variables:
+            variable.token = tokens.setdefault(variable.token, variable.token)
+            if isinstance(variable.points_to, str):
+                variable.points_to = tokens.setdefault(variable.points_to, variable.points_to)
+            elif isinstance(variable.points_to, Call):
+                _intern_call(variable.points_to, tokens)
+
+
+def _run_in_worker(func, arg):
+    return 'pid %d' % os.getpid(), func(arg)
+
+
+def _make_file_groups(sources, extension, lang_params, skip_parse_errors, jobs, cache=None,
+                      profiler=None, limit_params=None):
+
+    make_one = functools.partial(_make_file_group_for_source, extension=extension,
+                                 lang_params=lang_params, skip_parse_errors=skip_parse_errors,
+                                 cache=cache, limit_params=limit_params)
+
+    if jobs <= 1 or len(sources) <= 1:
+        results = list(map(make_one, sources))
+        workers = None
+    else:
+        jobs = min(jobs, len(sources))
+        chunksize = max(1, len(sources) // (jobs * 4))
+        logging.info("Parsing %d file(s) with %d processes.", len(sources), jobs)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            workers, results = zip(*executor.map(functools.partial(_run_in_worker, make_one),
+                                                 sources, chunksize=chunksize))
+
+    if profiler and workers is None:
+        for _, parse_time, build_time in results:
+            profiler.add('parsing', *parse_time)
+            profiler.add('group_building', *build_time)
+    elif profiler:
+        # summed worker times exceed the wall time of the pool, so they are kept apart
+        for worker, (_, parse_time, build_time) in zip(workers, results):
+            profiler.add_worker(worker, 'parsing', parse_time[1])
+            profiler.add_worker(worker, 'group_building', build_time[1])
+
+    file_groups = [file_group for file_group, _, _ in results]
+    if cache or jobs > 1:
+        # unpickled groups no longer share the token strings of other files
+        tokens = {}
+        for file_group in filter(None, file_groups):
+            _intern_tokens(file_group, tokens)
+    return file_groups
+
+
 def map_it(sources, extension, no_trimming, exclude_namespaces, exclude_functions,
            include_only_namespaces, include_only_functions,
-           skip_parse_errors, lang_params):
+           skip_parse_errors, lang_params, jobs=1, cache=None, profiler=None,
+           keep_duplicate_edges=False):
     language = LANGUAGES[extension]
+    profiler = profiler or Profiler(enabled=False)
 
 
     language.assert_dependencies()
 
 
-    file_ast_trees = []
-    for source in sources:
-        try:
-            file_ast_trees.append((source, language.get_tree(source, lang_params)))
-        except Exception as ex:
-            if skip_parse_errors:
-                logging.warning("Could not parse %r. (%r) Skipping...", source, ex)
-            else:
-                raise ex
-
-    file_groups = []
-    for source, file_ast_tree in file_ast_trees:
-        file_group = make_file_group(file_ast_tree, source, extension)
-        file_groups.append(file_group)
+    limit_params = LimitParams(exclude_namespaces, exclude_functions,
+                               include_only_namespaces, include_only_functions)
 
-    if exclude_namespaces or include_only_namespaces:
-        file_groups = _limit_namespaces(file_groups, exclude_namespaces, include_only_namespaces)
-    if exclude_functions or include_only_functions:
-        file_groups = _limit_functions(file_groups, exclude_functions, include_only_functions)
+    with profiler.stage('parsing_and_group_building'):
+        file_groups = _make_file_groups(sources, extension, lang_params, skip_parse_errors,
+                                        jobs, cache=cache, profiler=profiler,
+                                        limit_params=limit_params)
+        file_groups = list(filter(None, file_groups))
+    profiler.count('files', len(file_groups))
+    _warn_missing_limits(sources, extension, file_groups, limit_params)
 
     all_subgroups = flatten(g.all_groups() for g in file_groups)
     all_nodes = flatten(g.all_nodes() for g in file_groups)
+    profiler.count('nodes', len(all_nodes))
+    profiler.count('calls', sum(len(n.calls) for n in all_nodes))
+    profiler.count('variables', sum(len(n.variables) for n in all_nodes))
 
-    nodes_by_subgroup_token = collections.defaultdict(list)
-    for subgroup in all_subgroups:
-        if subgroup.token in nodes_by_subgroup_token:
-            logging.warning("Duplicate group name %r. Naming collision possible.",
-                            subgroup.token)
-        nodes_by_subgroup_token[subgroup.token] += subgroup.nodes
-
-    for group in file_groups:
-        for subgroup in group.all_groups():
-            subgroup.inherits = [nodes_by_subgroup_token.get(g) for g in subgroup.inherits]
-            subgroup.inherits = list(filter(None, subgroup.inherits))
-            for inherit_nodes in subgroup.inherits:
-                for node in subgroup.nodes:
-                    node.variables += [Variable(n.token, n, n.line_number) for n in inherit_nodes]
+    with profiler.stage('inheritance'):
+        _link_inheritance(all_subgroups, {g: g.inherits for g in all_subgroups},
+                          warn_duplicates=True)
 
-    for node in all_nodes:
-        node.resolve_variables(file_groups)
+    with profiler.stage('resolve_variables'):
+        import_index = ImportIndex(file_groups)
+        for node in all_nodes:
+            import_index.resolve_variables(node)
 
     logging.info("Found groups %r." % [g.label() for g in all_subgroups])
     logging.info("Found nodes %r." % sorted(n.token_with_ownership() for n in all_nodes))
@@ -364,16 +1015,21 @@ def map_it(sources, extension, no_trimming, exclude_namespaces, exclude_function
     logging.info("Found variables %r." % sorted(list(set(v.to_string() for v in
                                                          flatten(n.variables for n in all_nodes)))))
 
-    bad_calls = []
-    edges = []
-    for node_a in list(all_nodes):
-        links = _find_links(node_a, all_nodes)
-        for node_b, bad_call in links:
-            if bad_call:
-                bad_calls.append(bad_call)
-            if not node_b:
-                continue
-            edges.append(Edge(node_a, node_b))
+    with profiler.stage('link_finding'):
+        symbol_index = SymbolIndex(all_nodes)
+        variable_index = VariableIndex()
+
+        bad_calls = []
+        links_by_node = []
+        for node_a in list(all_nodes):
+            links = _find_links(node_a, symbol_index, variable_index)
+            for _, bad_call, _ in links:
+                if bad_call:
+                    bad_calls.append(bad_call)
+            links_by_node.append((node_a, links))
+        edges = _make_edges(links_by_node, keep_duplicate_edges)
+    profiler.count('edges', len(edges))
+    profiler.count('bad_calls', len(bad_calls))
 
     bad_calls_strings = set()
     for bad_call in bad_calls:
@@ -386,22 +1042,20 @@ def map_it(sources, extension, no_trimming, exclude_namespaces, exclude_function
     if no_trimming:
         return file_groups, all_nodes, edges
 
+    with profiler.stage('trimming'):
+        file_groups, all_nodes = _trim_unconnected(file_groups, all_nodes, edges)
+    return file_groups, all_nodes, edges
+
+
+def _trim_unconnected(file_groups, all_nodes, edges):
+
     nodes_with_edges = set()
     for edge in edges:
         nodes_with_edges.add(edge.node0)
         nodes_with_edges.add(edge.node1)
 
-    for node in all_nodes:
-        if node not in nodes_with_edges:
-            node.remove_from_parent()
-
-    for file_group in file_groups:
-        for group in file_group.all_groups():
-            if not group.all_nodes():
-                group.remove_from_parent()
-
-    file_groups = [g for g in file_groups if g.all_nodes()]
-    all_nodes = list(nodes_with_edges)
+    file_groups = _retain_nodes(file_groups, nodes_with_edges)
+    all_nodes = [n for n in all_nodes if n in nodes_with_edges]
 
     if not all_nodes:
         logging.warning("No functions found! Most likely, your file(s) do not have "
@@ -411,89 +1065,796 @@ def map_it(sources, extension, no_trimming, exclude_namespaces, exclude_function
                         "with --exclude-* / --include-* / --target-function arguments. ")
         logging.warning("Program will generate an empty output file.")
 
-    return file_groups, all_nodes, edges
+    return file_groups, all_nodes
 
 
-def _limit_namespaces(file_groups, exclude_namespaces, include_only_namespaces):
+def _limit_namespaces(file_groups, exclude_namespaces, include_only_namespaces, warn_missing=True):
 
     removed_namespaces = set()
+    removed_nodes = set()
 
     for group in list(file_groups):
         if group.token in exclude_namespaces:
-            for node in group.all_nodes():
-                node.remove_from_parent()
+            removed_nodes.update(group.all_nodes())
             removed_namespaces.add(group.token)
         if include_only_namespaces and group.token not in include_only_namespaces:
-            for node in group.nodes:
-                node.remove_from_parent()
+            removed_nodes.update(group.nodes)
             removed_namespaces.add(group.token)
 
         for subgroup in group.all_groups():
-            print(subgroup, subgroup.all_parents())
             if subgroup.token in exclude_namespaces:
-                for node in subgroup.all_nodes():
-                    node.remove_from_parent()
+                removed_nodes.update(subgroup.all_nodes())
                 removed_namespaces.add(subgroup.token)
             if include_only_namespaces and \
                subgroup.token not in include_only_namespaces and \
                all(p.token not in include_only_namespaces for p in subgroup.all_parents()):
-                for node in subgroup.nodes:
-                    node.remove_from_parent()
+                removed_nodes.update(subgroup.nodes)
                 removed_namespaces.add(group.token)
 
+    if removed_nodes:
+        kept_nodes = {n for g in file_groups for n in g.all_nodes() if n not in removed_nodes}
+        _retain_nodes(file_groups, kept_nodes, prune_groups=False)
+
     for namespace in exclude_namespaces:
-        if namespace not in removed_namespaces:
+        if warn_missing and namespace not in removed_namespaces:
             logging.warning(f"Could not exclude namespace '{namespace}' "
                              "because it was not found.")
     return file_groups
 
 
-def _limit_functions(file_groups, exclude_functions, include_only_functions):
+def _limit_functions(file_groups, exclude_functions, include_only_functions, warn_missing=True):
 
     removed_functions = set()
+    kept_nodes = set()
 
     for group in list(file_groups):
         for node in group.all_nodes():
             if node.token in exclude_functions or \
                (include_only_functions and node.token not in include_only_functions):
-                node.remove_from_parent()
                 removed_functions.add(node.token)
+            else:
+                kept_nodes.add(node)
+
+    if removed_functions:
+        _retain_nodes(file_groups, kept_nodes, prune_groups=False)
 
     for function_name in exclude_functions:
-        if function_name not in removed_functions:
+        if warn_missing and function_name not in removed_functions:
             logging.warning(f"Could not exclude function '{function_name}' "
                              "because it was not found.")
     return file_groups
 
 
-def _generate_graphviz(output_file, extension, final_img_filename):
+def _warn_missing_limits(sources, extension, file_groups, limit_params):
+
+    if limit_params.exclude_namespaces:
+        found_namespaces = {_file_token(source, extension) for source in sources}
+        for file_group in file_groups:
+            found_namespaces.update(g.token for g in file_group.all_groups())
+        for namespace in sorted(limit_params.exclude_namespaces - found_namespaces):
+            logging.warning(f"Could not exclude namespace '{namespace}' "
+                             "because it was not found.")
+
+    if limit_params.exclude_functions:
+        found_functions = set()
+        for file_group in file_groups:
+            found_functions.update(n.token for n in file_group.all_nodes())
+            found_functions.update(file_group.skipped_functions)
+        for function_name in sorted(limit_params.exclude_functions - found_functions):
+            logging.warning(f"Could not exclude function '{function_name}' "
+                             "because it was not found.")
+
+
+def _defined_tokens(file_group):
+
+    tokens = collections.Counter()
+    for group in file_group.all_groups():
+        tokens[(group.token,)] += 1
+        for import_token in group.import_tokens:
+            tokens[(import_token,)] += 1
+        for node in group.nodes:
+            if node.is_constructor:
+                tokens[(node.token, group.token, ('inherits', group.token))] += 1
+            else:
+                tokens[(node.token, ('inherits', group.token))] += 1
+    for node in file_group.all_nodes():
+        tokens[(node.token,)] += 1
+        for import_token in node.import_tokens:
+            tokens[(import_token,)] += 1
+    return tokens
+
+
+def _file_group_of(group_or_node):
+    while group_or_node.parent:
+        group_or_node = group_or_node.parent
+    return group_or_node
+
+
+def _referenced_tokens(file_group):
+
+    tokens = set()
+    for group in file_group.all_groups():
+        tokens.update(('inherits', base) for base in group.inherits)
+    for node in file_group.all_nodes():
+        tokens.update(call.token for call in node.calls)
+        for variable in node.variables:
+            if isinstance(variable.points_to, str):
+                tokens.add(variable.points_to)
+            elif isinstance(variable.points_to, Call):
+                tokens.add(variable.points_to.token)
+    return tokens
+
+
+class IncrementalMap():
+
+    def __init__(self, extension, exclude_namespaces, exclude_functions,
+                 include_only_namespaces, include_only_functions,
+                 skip_parse_errors, lang_params, cache=None):
+        self.extension = extension
+        self.limit_params = LimitParams(exclude_namespaces, exclude_functions,
+                                        include_only_namespaces, include_only_functions)
+        self.skip_parse_errors = skip_parse_errors
+        self.lang_params = lang_params
+        self.cache = cache
+
+        self.file_groups = {}
+        self.file_stats = {}
+        self.sources_by_file_group = {}
+        self.references = {}
+        self.sources_by_reference = collections.defaultdict(set)
+        self.dependencies = {}
+        self.dependents = collections.defaultdict(set)
+        self.original_variables = {}
+        self.original_inherits = {}
+        self.links = {}
+        self.saved_membership = []
+
+    def ordered_file_groups(self):
+        return [self.file_groups[source] for source in sorted(self.file_groups)]
+
+    def update(self, sources, jobs=1):
+        first_run = not self.file_stats
+        file_stats = {source: _file_stat(source) for source in sources}
+        file_stats = {source: stat for source, stat in file_stats.items() if stat}
+        changed = sorted(source for source, stat in file_stats.items()
+                         if self.file_stats.get(source) != stat)
+        removed = sorted(source for source in self.file_groups if source not in file_stats)
+        self.file_stats = file_stats
+        if not changed and not removed:
+            return False
+
+        skip_parse_errors = self.skip_parse_errors or not first_run
+        new_groups = _make_file_groups(changed, self.extension, self.lang_params,
+                                       skip_parse_errors, jobs, cache=self.cache,
+                                       limit_params=self.limit_params)
+        if first_run:
+            _warn_missing_limits(changed, self.extension, list(filter(None, new_groups)),
+                                 self.limit_params)
+
+        old_tokens = collections.Counter()
+        new_tokens = collections.Counter()
+        dirty_sources = set()
+        for source in removed:
+            old_tokens += self._forget(source, dirty_sources)
+        for source, file_group in zip(changed, new_groups):
+            if not file_group:
+                continue
+            if source in self.file_groups:
+                old_tokens += self._forget(source, dirty_sources)
+            new_tokens += self._remember(source, file_group)
+            dirty_sources.add(source)
+
+        for key in set(old_tokens) | set(new_tokens):
+            if old_tokens[key] != new_tokens[key]:
+                for token in key:
+                    dirty_sources |= self.sources_by_reference.get(token, set())
+        dirty_sources &= set(self.file_groups)
+
+        self._link(dirty_sources)
+        logging.info("Re-linked %d of %d file(s).", len(dirty_sources), len(self.file_groups))
+        return True
+
+    def _remember(self, source, file_group):
+        self.file_groups[source] = file_group
+        self.sources_by_file_group[file_group] = source
+        for group in file_group.all_groups():
+            self.original_inherits[group] = list(group.inherits)
+        for node in file_group.all_nodes():
+            self.original_variables[node] = [(v.token, v.points_to, v.line_number)
+                                             for v in node.variables]
+        self.references[source] = _referenced_tokens(file_group)
+        for token in self.references[source]:
+            self.sources_by_reference[token].add(source)
+        return _defined_tokens(file_group)
+
+    def _forget(self, source, dirty_sources):
+        file_group = self.file_groups.pop(source)
+        del self.sources_by_file_group[file_group]
+        for group in file_group.all_groups():
+            self.original_inherits.pop(group, None)
+        for node in file_group.all_nodes():
+            self.original_variables.pop(node, None)
+            self.links.pop(node, None)
+        for token in self.references.pop(source):
+            self.sources_by_reference[token].discard(source)
+        for dependency in self.dependencies.pop(source, set()):
+            self.dependents[dependency].discard(source)
+        dirty_sources |= self.dependents.pop(source, set())
+        return _defined_tokens(file_group)
+
+    def _record_dependencies(self, source):
+        dependencies = set()
+        for node in self.file_groups[source].all_nodes():
+            for node_b, _, _ in self.links[node]:
+                if node_b:
+                    dependencies.add(_file_group_of(node_b))
+            for variable in node.variables:
+                if isinstance(variable.points_to, (Node, Group)):
+                    dependencies.add(_file_group_of(variable.points_to))
+        for group in self.file_groups[source].all_groups():
+            for inherit_nodes in group.inherits:
+                dependencies.update(_file_group_of(n) for n in inherit_nodes)
+        dependencies = {self.sources_by_file_group[g] for g in dependencies} - {source}
+
+        for dependency in self.dependencies.get(source, set()):
+            self.dependents[dependency].discard(source)
+        self.dependencies[source] = dependencies
+        for dependency in dependencies:
+            self.dependents[dependency].add(source)
+
+    def _link(self, dirty_sources):
+        file_groups = self.ordered_file_groups()
+        all_nodes = flatten(g.all_nodes() for g in file_groups)
+
+        _link_inheritance(flatten(g.all_groups() for g in file_groups), self.original_inherits)
+
+        dirty_nodes = []
+        for source in sorted(dirty_sources):
+            for node in self.file_groups[source].all_nodes():
+                node.variables = [Variable(*v) for v in self.original_variables[node]]
+                dirty_nodes.append(node)
+
+        import_index = ImportIndex(file_groups)
+        for node in dirty_nodes:
+            import_index.resolve_variables(node)
+
+        symbol_index = SymbolIndex(all_nodes)
+        variable_index = VariableIndex()
+        for node in dirty_nodes:
+            self.links[node] = _find_links(node, symbol_index, variable_index)
+
+        for source in dirty_sources:
+            self._record_dependencies(source)
+
+    def graph(self, no_trimming, keep_duplicate_edges=False):
+        file_groups = self.ordered_file_groups()
+        all_nodes = flatten(g.all_nodes() for g in file_groups)
+        self.saved_membership = _save_membership(file_groups)
+
+        for node in all_nodes:
+            node.is_leaf = True
+            node.is_trunk = True
+
+        edges = _make_edges(((node_a, self.links[node_a]) for node_a in all_nodes),
+                            keep_duplicate_edges)
+
+        if no_trimming:
+            return file_groups, all_nodes, edges
+
+        file_groups, all_nodes = _trim_unconnected(file_groups, all_nodes, edges)
+        return file_groups, all_nodes, edges
+
+    def restore(self):
+        _restore_membership(self.saved_membership)
+        self.saved_membership = []
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(functools.partial(f.read, WRITE_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _new_file_mode():
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# read once, before graphviz threads start, because os.umask can only be read by setting it
+NEW_FILE_MODE = _new_file_mode()
+
+
+def _write_temp_file(path, write, mode='wb'):
+    tmp = tempfile.NamedTemporaryFile(mode, dir=os.path.dirname(path) or '.',
+                                      prefix=os.path.basename(path) + '.', suffix=TEMP_SUFFIX,
+                                      delete=False)
+    try:
+        with tmp as fh:
+            # NamedTemporaryFile creates files that only the owner can read
+            os.chmod(tmp.name, NEW_FILE_MODE)
+            write(fh)
+    except BaseException:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            pass
+        raise
+    return tmp.name
+
+
+def _replace_if_changed(tmp_path, path):
+    if os.path.isfile(path) and _file_digest(tmp_path) == _file_digest(path):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+def _is_up_to_date(path, source_path):
+    return os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(source_path)
+
+
+def _run_graphviz(output_file, dot_source, final_img_filename, command=("dot",)):
+    extension = final_img_filename.rsplit('.', 1)[1]
+    command = list(command) + ["-T" + extension]
+    try:
+        tmp_path = _write_temp_file(final_img_filename, lambda f: subprocess.run(
+            command, input=dot_source, stdout=f, check=True))
+    except subprocess.CalledProcessError:
+        logging.warning("*** Graphviz returned non-zero exit code! Try running %r "
+                        "for more detail ***", ' '.join(command + [output_file, '-v', '-O']))
+        return False
+    os.replace(tmp_path, final_img_filename)
+    return True
+
+
+def _generate_graphviz(output_file, final_img_filenames, dot_source=None, command=("dot",)):
 
     start_time = time.time()
-    logging.info("Running graphviz to make the image...")
-    command = ["dot", "-T" + extension, output_file]
-    with open(final_img_filename, 'w') as f:
+    logging.info("Running graphviz to make %d image(s)...", len(final_img_filenames))
+    if dot_source is None:
+        with open(output_file, 'rb') as f:
+            dot_source = f.read()
+    with concurrent.futures.ThreadPoolExecutor(len(final_img_filenames)) as executor:
+        results = list(executor.map(functools.partial(_run_graphviz, output_file, dot_source,
+                                                      command=command),
+                                    final_img_filenames))
+    if all(results):
+        logging.info("Graphviz finished in %.2f seconds." % (time.time() - start_time))
+
+
+def _split_layout(file_groups, all_nodes, edges, hide_legend, no_grouping, jobs):
+
+    # collapsed graphs draw their own clusters instead of the parsed file groups
+    file_group_of = {node: file_group for file_group in file_groups
+                     for node in file_group.all_nodes()}
+    pieces = layout.split_graph(all_nodes, edges, file_group_of.get)
+    if len(pieces) < 2:
+        return None
+
+    piece_of_node = {node: i for i, piece in enumerate(pieces) for node in piece}
+    edges_by_piece = [[] for _ in pieces]
+    cross_edges = []
+    for edge in edges:
+        piece_index = piece_of_node[edge.node0]
+        if piece_of_node[edge.node1] == piece_index:
+            edges_by_piece[piece_index].append(edge)
+        else:
+            cross_edges.append(edge)
+
+    piece_sources = []
+    for piece, piece_edges in zip(pieces, edges_by_piece):
+        piece_groups = {file_group_of.get(node) for node in piece}
+        piece_file_groups = [g for g in file_groups if g in piece_groups]
+        saved_membership = _save_membership(piece_file_groups)
         try:
-            subprocess.run(command, stdout=f, check=True)
-            logging.info("Graphviz finished in %.2f seconds." % (time.time() - start_time))
-        except subprocess.CalledProcessError:
-            logging.warning("*** Graphviz returned non-zero exit code! "
-                            "Try running %r for more detail ***", ' '.join(command + ['-v', '-O']))
+            piece_file_groups = _retain_nodes(piece_file_groups, set(piece))
+            piece_sources.append(''.join(generate_dot(piece, piece_edges, piece_file_groups,
+                                                      hide_legend=True,
+                                                      no_grouping=no_grouping)).encode('utf-8'))
+        finally:
+            _restore_membership(saved_membership)
+    if not hide_legend:
+        piece_sources.append(''.join(generate_dot([], [], [])).encode('utf-8'))
+
+    logging.info("Laying out %d pieces of the graph with %d dot process(es)...",
+                 len(piece_sources), jobs)
+    cross_source = ''.join(edge.to_dot() + ';\n' for edge in cross_edges).encode('utf-8')
+    try:
+        return layout.pack(layout.layout_pieces(piece_sources, jobs), cross_source)
+    except (OSError, subprocess.CalledProcessError) as ex:
+        logging.warning("Could not lay out the graph in pieces. Falling back to a single "
+                        "dot run. (%r)", ex)
+        return None
+
+
+def _generate_final_imgs(output_file, final_img_filenames, changed, split_layout=None):
+
+    stale_img_filenames = [f for f in final_img_filenames
+                           if changed or not _is_up_to_date(f, output_file)]
+    if stale_img_filenames:
+        packed_source = split_layout() if split_layout else None
+        if packed_source:
+            _generate_graphviz(output_file, stale_img_filenames, packed_source,
+                               command=layout.RENDER_COMMAND)
+        else:
+            _generate_graphviz(output_file, stale_img_filenames)
+    else:
+        logging.info("%r is unchanged. Skipping graphviz.", output_file)
+    for final_img_filename in final_img_filenames:
+        logging.info("Completed your flowchart! To see it, open %r.", final_img_filename)
+
+
+def _write_output(output_file, output_ext, file_groups, all_nodes, edges,
+                  hide_legend, no_grouping, subset_params, profiler=None, adjacency_index=None,
+                  final_img_filenames=(), split_layout=False, jobs=1, collapse=None,
+                  database_run=None):
+    profiler = profiler or Profiler(enabled=False)
+
+    if subset_params:
+        logging.info("Filtering into subset...")
+        with profiler.stage('subset_filtering'):
+            file_groups, all_nodes, edges = _filter_for_subset(subset_params, all_nodes, edges,
+                                                               file_groups, adjacency_index)
+
+    if collapse:
+        with profiler.stage('collapsing'):
+            file_groups, all_nodes, edges = _collapse_graph(file_groups, all_nodes, edges,
+                                                            collapse)
+
+    with profiler.stage('sorting'):
+        file_groups.sort()
+        all_nodes.sort()
+        edges.sort()
 
+    logging.info("Generating output file...")
+
+    changed = True
+    with profiler.stage('writing'):
+        if output_ext in DATABASE_EXTENSIONS:
+            database.write_database(output_file, file_groups, all_nodes, edges,
+                                    run=database_run)
+        elif output_ext in BINARY_EXTENSIONS:
+            tmp_path = _write_temp_file(output_file, lambda fh: binary.write_graph(
+                fh, file_groups, all_nodes, edges))
+            changed = _replace_if_changed(tmp_path, output_file)
+        elif isinstance(output_file, str):
+            as_json = output_ext == 'json'
+            as_ndjson = output_ext == 'ndjson'
+            tmp_path = _write_temp_file(output_file, lambda fh: write_file(
+                fh, nodes=all_nodes, edges=edges, groups=file_groups, hide_legend=hide_legend,
+                no_grouping=no_grouping, as_json=as_json, as_ndjson=as_ndjson), mode='w')
+            changed = _replace_if_changed(tmp_path, output_file)
+        else:
+            write_file(output_file, nodes=all_nodes, edges=edges,
+                       groups=file_groups, hide_legend=hide_legend,
+                       no_grouping=no_grouping)
+    profiler.count('output_nodes', len(all_nodes))
+    profiler.count('output_edges', len(edges))
+
+    if changed:
+        logging.info("Wrote output file %r with %d nodes and %d edges.",
+                     output_file, len(all_nodes), len(edges))
+    else:
+        logging.info("Output file %r with %d nodes and %d edges is unchanged.",
+                     output_file, len(all_nodes), len(edges))
+    if output_ext not in ('json', 'ndjson') + BINARY_EXTENSIONS + DATABASE_EXTENSIONS:
+        logging.info("For better machine readability, you can also try outputting in a json format.")
+
+    # translate to an image if that was requested
+    if final_img_filenames:
+        split_layout_func = None
+        if split_layout:
+            split_layout_func = functools.partial(_split_layout, file_groups, all_nodes, edges,
+                                                  hide_legend, no_grouping, jobs)
+        with profiler.stage('graphviz'):
+            _generate_final_imgs(output_file, final_img_filenames, changed, split_layout_func)
+
+
+def _target_output_path(path, target_function):
+
+    base, extension = path.rsplit('.', 1)
+    return '%s.%s.%s' % (base, re.sub(r'[^\w.-]+', '_', target_function), extension)
+
+
+def _write_outputs(output_file, output_ext, final_img_filenames, file_groups, all_nodes, edges,
+                   hide_legend, no_grouping, subset_params, profiler=None, split_layout=False,
+                   jobs=1, collapse=None, shard=False, database_run=None):
+    profiler = profiler or Profiler(enabled=False)
+
+    if shard:
+        _write_shards(output_file, output_ext, final_img_filenames, file_groups, all_nodes, edges,
+                      hide_legend, no_grouping, profiler=profiler, split_layout=split_layout,
+                      jobs=jobs, collapse=collapse, database_run=database_run)
+        return
+
+    if not isinstance(subset_params, list) or len(subset_params) == 1:
+        if isinstance(subset_params, list):
+            subset_params = subset_params[0]
+        _write_output(output_file, output_ext, file_groups, all_nodes, edges,
+                      hide_legend, no_grouping, subset_params, profiler=profiler,
+                      final_img_filenames=final_img_filenames, split_layout=split_layout,
+                      jobs=jobs, collapse=collapse, database_run=database_run)
+        return
+
+    with profiler.stage('adjacency_index'):
+        adjacency_index = AdjacencyIndex(all_nodes, edges)
+    saved_membership = _save_membership(file_groups)
 
-def _generate_final_img(output_file, extension, final_img_filename, num_edges):
+    logging.info("Writing %d subsets...", len(subset_params))
+    for target_params in subset_params:
+        target_output_file = _target_output_path(output_file, target_params.target_function)
+        target_img_filenames = [_target_output_path(f, target_params.target_function)
+                                for f in final_img_filenames]
+        try:
+            _write_output(target_output_file, output_ext, file_groups, all_nodes, edges,
+                          hide_legend, no_grouping, target_params, profiler=profiler,
+                          adjacency_index=adjacency_index,
+                          final_img_filenames=target_img_filenames, split_layout=split_layout,
+                          jobs=jobs, collapse=collapse, database_run=database_run)
+        except AssertionError as ex:
+            logging.warning("Skipping subset for %r. (%s)", target_params.target_function, ex)
+        finally:
+            _restore_membership(saved_membership)
+
+
+def _write_shard_index(index_file, shards):
+    if index_file.endswith('.json'):
+        with open(index_file, 'w') as f:
+            json.dump({'shards': shards}, f, indent=2)
+        return
 
-    _generate_graphviz(output_file, extension, final_img_filename)
-    logging.info("Completed your flowchart! To see it, open %r.",
-                 final_img_filename)
+    rows = []
+    for shard in shards:
+        calls = ', '.join('%s (%d)' % (html.escape(other), count)
+                          for other, count in shard['calls_into'].items())
+        rows.append('<tr><td><a href="%s">%s</a></td><td>%d</td><td>%d</td><td>%d</td>'
+                    '<td>%s</td></tr>' % (html.escape(shard['path']), html.escape(shard['name']),
+                                          shard['files'], shard['nodes'], shard['edges'],
+                                          calls or '-'))
+    with open(index_file, 'w') as f:
+        f.write(SHARD_INDEX_HTML % '\n'.join(rows))
+
+
+def _write_shards(output_file, output_ext, final_img_filenames, file_groups, all_nodes, edges,
+                  hide_legend, no_grouping, profiler=None, split_layout=False, jobs=1,
+                  collapse=None, database_run=None):
+    profiler = profiler or Profiler(enabled=False)
+
+    with profiler.stage('sharding'):
+        shards = _shard_file_groups(file_groups)
+        shard_of_file_group = {file_group: name for name, shard_groups in shards.items()
+                               for file_group in shard_groups}
+
+        # stubs have to point at the nodes that are drawn, so collapse before splitting
+        groups_by_shard = shards
+        if collapse:
+            collapsed_groups, all_nodes, edges = _collapse_graph(file_groups, all_nodes, edges,
+                                                                 collapse)
+            if collapsed_groups is not file_groups:
+                groups_by_shard = collections.defaultdict(list)
+                for cluster in collapsed_groups:
+                    first_node = next(iter(cluster.nodes))
+                    groups_by_shard[shard_of_file_group[first_node.file_group()]].append(cluster)
+        shard_of_node = {node: shard_of_file_group[node.file_group()] for node in all_nodes}
+
+        output_files = {name: _target_output_path(output_file, name) for name in shards}
+        img_filenames = {name: [_target_output_path(f, name) for f in final_img_filenames]
+                         for name in shards}
+        urls = {name: os.path.basename((img_filenames[name] or [output_files[name]])[0])
+                for name in shards}
+
+        nodes_by_shard = collections.defaultdict(list)
+        for node in all_nodes:
+            nodes_by_shard[shard_of_node[node]].append(node)
+        edges_by_shard = collections.defaultdict(list)
+        calls_into = collections.defaultdict(collections.Counter)
+        stubs = {}
+
+        def stub(shard, node):
+            if (shard, node) not in stubs:
+                other_shard = shard_of_node[node]
+                stubs[(shard, node)] = StubNode(node, other_shard, urls[other_shard])
+                nodes_by_shard[shard].append(stubs[(shard, node)])
+            return stubs[(shard, node)]
+
+        for edge in edges:
+            shard0, shard1 = shard_of_node[edge.node0], shard_of_node[edge.node1]
+            if shard0 == shard1:
+                edges_by_shard[shard0].append(edge)
+                continue
+            calls_into[shard0][shard1] += 1
+            edges_by_shard[shard0].append(_stub_edge(edge, edge.node0, stub(shard0, edge.node1)))
+            edges_by_shard[shard1].append(_stub_edge(edge, stub(shard1, edge.node0), edge.node1))
+
+    def write_shard(name):
+        _write_output(output_files[name], output_ext, list(groups_by_shard[name]),
+                      nodes_by_shard[name], edges_by_shard[name], hide_legend, no_grouping, None,
+                      final_img_filenames=img_filenames[name], split_layout=split_layout,
+                      database_run=database_run)
+
+    logging.info("Writing %d shards...", len(shards))
+    with profiler.stage('writing_shards'):
+        # shards mostly wait on graphviz, so they get the thread pool's default size
+        # unless --jobs asks for a specific number
+        with concurrent.futures.ThreadPoolExecutor(jobs if jobs > 1 else None) as executor:
+            list(executor.map(write_shard, shards))
+
+    index_ext = 'json' if output_ext in ('json', 'ndjson') + BINARY_EXTENSIONS else 'html'
+    index_file = (final_img_filenames or [output_file])[0].rsplit('.', 1)[0] + '.index.' + index_ext
+    _write_shard_index(index_file, [{
+        'name': name,
+        'path': urls[name],
+        'files': len(shards[name]),
+        'nodes': sum(1 for n in nodes_by_shard[name] if not isinstance(n, StubNode)),
+        'edges': len(edges_by_shard[name]),
+        'calls_into': dict(sorted(calls_into[name].items())),
+    } for name in shards])
+    logging.info("Wrote the shard index %r.", index_file)
+
+
+def _query_list(query, name):
+    return list(filter(None, ','.join(query.get(name, [])).split(',')))
+
+
+def _query_int(query, name):
+    value = query.get(name, ['0'])[-1]
+    try:
+        return int(value)
+    except ValueError:
+        raise AssertionError("%s must be an integer. Got %r." % (name, value))
+
+
+def _query_flag(query, name, default):
+    if name not in query:
+        return default
+    return query[name][-1].lower() in ('', '1', 'true', 'yes')
+
+
+class GraphQuery():
+
+    def __init__(self, file_groups, all_nodes, edges, no_trimming=False, hide_legend=False,
+                 no_grouping=False):
+        self.file_groups = file_groups
+        self.all_nodes = all_nodes
+        self.edges = edges
+        self.no_trimming = no_trimming
+        self.hide_legend = hide_legend
+        self.no_grouping = no_grouping
+        self.adjacency_index = AdjacencyIndex(all_nodes, edges)
+        self.saved_membership = _save_membership(file_groups)
+        self.lock = threading.Lock()
+
+    def handle_request(self, path, query):
+        if path == '/status':
+            return 200, 'application/json', json.dumps({
+                'version': VERSION,
+                'files': len(self.file_groups),
+                'nodes': len(self.all_nodes),
+                'edges': len(self.edges),
+            })
+        if path != '/graph':
+            return 404, 'text/plain', "Unknown path %r. Try /graph or /status.\n" % path
+        try:
+            return (200,) + self.render(query)
+        except AssertionError as ex:
+            return 400, 'text/plain', "%s\n" % ex
+
+    def _limit(self, exclude_namespaces, exclude_functions,
+               include_only_namespaces, include_only_functions):
+        file_groups = list(self.file_groups)
+        if exclude_namespaces or include_only_namespaces:
+            _limit_namespaces(file_groups, exclude_namespaces, include_only_namespaces,
+                              warn_missing=False)
+        if exclude_functions or include_only_functions:
+            _limit_functions(file_groups, exclude_functions, include_only_functions,
+                             warn_missing=False)
+
+        kept_nodes = set(flatten(g.all_nodes() for g in file_groups))
+        all_nodes = [n for n in self.all_nodes if n in kept_nodes]
+        edges = [e for e in self.edges if e.node0 in kept_nodes and e.node1 in kept_nodes]
+        if self.no_trimming:
+            file_groups = [g for g in file_groups if g.all_nodes()]
+        else:
+            file_groups, all_nodes = _trim_unconnected(file_groups, all_nodes, edges)
+        return file_groups, all_nodes, edges, AdjacencyIndex(all_nodes, edges)
+
+    def render(self, query):
+        output_format = query.get('format', ['dot'])[-1]
+        assert output_format in TEXT_EXTENSIONS, \
+            "format must be one of: %r." % set(TEXT_EXTENSIONS)
+        subset_params = SubsetParams.generate(query.get('target_function', [None])[-1],
+                                              _query_int(query, 'upstream_depth'),
+                                              _query_int(query, 'downstream_depth'))
+        limits = [_query_list(query, name) for name in ('exclude_namespaces', 'exclude_functions',
+                                                        'include_only_namespaces',
+                                                        'include_only_functions')]
+        hide_legend = _query_flag(query, 'hide_legend', self.hide_legend)
+        no_grouping = _query_flag(query, 'no_grouping', self.no_grouping)
+        collapse = query.get('collapse', [None])[-1] or None
+        assert collapse in COLLAPSE_LEVELS + (None,), \
+            "collapse must be one of: %r." % set(COLLAPSE_LEVELS)
+
+        with self.lock:
+            try:
+                file_groups, all_nodes, edges = self.file_groups, self.all_nodes, self.edges
+                adjacency_index = self.adjacency_index
+                if any(limits):
+                    file_groups, all_nodes, edges, adjacency_index = self._limit(*limits)
+                if subset_params:
+                    file_groups, all_nodes, edges = _filter_for_subset(
+                        subset_params, all_nodes, edges, file_groups, adjacency_index)
+                if collapse:
+                    file_groups, all_nodes, edges = _collapse_graph(file_groups, all_nodes, edges,
+                                                                    collapse)
+                file_groups, all_nodes, edges = sorted(file_groups), sorted(all_nodes), sorted(edges)
+
+                if output_format == 'json':
+                    return 'application/json', generate_json(all_nodes, edges)
+                if output_format == 'ndjson':
+                    return ('application/x-ndjson',
+                            ''.join(generate_ndjson_chunks(all_nodes, edges)))
+                return 'text/vnd.graphviz', ''.join(generate_dot(
+                    all_nodes, edges, file_groups, hide_legend=hide_legend,
+                    no_grouping=no_grouping))
+            finally:
+                _restore_membership(self.saved_membership)
+
+
+def _watch(raw_source_paths, sources, language, output_file, output_ext, final_img_filenames,
+           exclude_namespaces, exclude_functions,
+           include_only_namespaces, include_only_functions,
+           hide_legend, no_grouping, no_trimming, skip_parse_errors,
+           lang_params, subset_params, jobs, cache, interval, keep_duplicate_edges=False,
+           source_finder=None, split_layout=False, collapse=None, shard=False):
+    source_finder = source_finder or SourceFinder()
+
+    incremental_map = IncrementalMap(language, exclude_namespaces, exclude_functions,
+                                     include_only_namespaces, include_only_functions,
+                                     skip_parse_errors, lang_params, cache=cache)
+
+    logging.info("Watching %d source file(s). Press Ctrl+C to stop.", len(sources))
+    try:
+        while True:
+            start_time = time.time()
+            if incremental_map.update(sources, jobs=jobs):
+                file_groups, all_nodes, edges = incremental_map.graph(no_trimming,
+                                                                      keep_duplicate_edges)
+                try:
+                    _write_outputs(output_file, output_ext, final_img_filenames, file_groups,
+                                   all_nodes, edges, hide_legend, no_grouping, subset_params,
+                                   split_layout=split_layout, jobs=jobs, collapse=collapse,
+                                   shard=shard, database_run=database.run_key(raw_source_paths))
+                except AssertionError as ex:
+                    logging.warning("Could not write output. (%s) Waiting for changes...", ex)
+                finally:
+                    incremental_map.restore()
+                logging.info("Updated in %.2f seconds." % (time.time() - start_time))
+
+                if cache:
+                    cache.evict()
+
+            time.sleep(interval)
+            sources = _poll_sources(raw_source_paths, language, source_finder)
+    except KeyboardInterrupt:
+        logging.info("Stopped watching.")
 
 
 def CodeToSchemas(raw_source_paths, output_file, language=None, hide_legend=True,
               exclude_namespaces=None, exclude_functions=None,
               include_only_namespaces=None, include_only_functions=None,
               no_grouping=False, no_trimming=False, skip_parse_errors=False,
-              lang_params=None, subset_params=None, level=logging.INFO):
+              lang_params=None, subset_params=None, jobs=1, cache_dir=None,
+              cache_size_mb=DEFAULT_CACHE_SIZE_MB, watch=False, watch_interval=1.0,
+              keep_duplicate_edges=False, serve_address=None, exclude_paths=None,
+              file_list=None, use_gitignore=True, split_layout=False, collapse=None,
+              shard=False, profiler=None, level=logging.INFO):
 
     start_time = time.time()
+    profiler = profiler or Profiler(enabled=False)
 
     if not isinstance(raw_source_paths, list):
         raw_source_paths = [raw_source_paths]
@@ -507,10 +1868,52 @@ def CodeToSchemas(raw_source_paths, output_file, language=None, hide_legend=True
     assert isinstance(include_only_namespaces, list)
     include_only_functions = include_only_functions or []
     assert isinstance(include_only_functions, list)
+    assert isinstance(jobs, int) and jobs >= 1, "jobs must be a positive integer."
+    assert collapse in COLLAPSE_LEVELS + (None,), \
+        "collapse must be one of: %r." % set(COLLAPSE_LEVELS)
 
     logging.basicConfig(format="CodeToSchemas: %(message)s", level=level)
 
-    sources, language = get_sources_and_language(raw_source_paths, language)
+    with profiler.stage('discovery'):
+        source_finder = SourceFinder(exclude_paths=exclude_paths, file_list=file_list,
+                                     use_gitignore=use_gitignore)
+        sources, language = get_sources_and_language(raw_source_paths, language, source_finder)
+
+    cache = None
+    if cache_dir:
+        cache = FileGroupCache(cache_dir, VERSION, max_size_mb=cache_size_mb)
+
+    if serve_address:
+        assert not watch, "--serve and --watch cannot be combined."
+        file_groups, all_nodes, edges = map_it(sources, language, no_trimming,
+                                               exclude_namespaces, exclude_functions,
+                                               include_only_namespaces, include_only_functions,
+                                               skip_parse_errors, lang_params, jobs=jobs,
+                                               cache=cache, profiler=profiler,
+                                               keep_duplicate_edges=keep_duplicate_edges)
+        if cache:
+            cache.evict()
+        graph_query = GraphQuery(file_groups, all_nodes, edges, no_trimming=no_trimming,
+                                 hide_legend=hide_legend, no_grouping=no_grouping)
+        logging.info("Built the graph in %.2f seconds." % (time.time() - start_time))
+        serve(serve_address, graph_query.handle_request)
+        return
+
+    output_files = output_file if isinstance(output_file, list) else [output_file]
+    assert output_files, "Pass at least one output file."
+    if len(output_files) > 1:
+        assert all(isinstance(f, str) and f.rsplit('.', 1)[-1] in IMAGE_EXTENSIONS
+                   for f in output_files), \
+            "Only image outputs %r can be combined. Got %r." % (set(IMAGE_EXTENSIONS), output_files)
+    output_file = output_files[0]
+
+    if shard:
+        assert not subset_params, "--shard cannot be combined with --target-function."
+    if output_file == '-':
+        assert not isinstance(subset_params, list) or len(subset_params) <= 1, \
+            "Writing one output per target function requires an output file path."
+        assert not shard, "Writing one output per shard requires an output file path."
+        output_file = sys.stdout
 
     output_ext = None
     if isinstance(output_file, str):
@@ -518,8 +1921,11 @@ def CodeToSchemas(raw_source_paths, output_file, language=None, hide_legend=True
         output_ext = output_file.rsplit('.', 1)[1] or ''
         assert output_ext in VALID_EXTENSIONS, "Output filename must end in one of: %r." % \
                                                set(VALID_EXTENSIONS)
+        if output_ext in DATABASE_EXTENSIONS:
+            assert not collapse and not shard, \
+                "--collapse and --shard can't be combined with a .sqlite output."
 
-    final_img_filename = None
+    final_img_filenames = []
     if output_ext and output_ext in IMAGE_EXTENSIONS:
         if not is_installed('dot') and not is_installed('dot.exe'):
             raise AssertionError(
@@ -527,46 +1933,39 @@ def CodeToSchemas(raw_source_paths, output_file, language=None, hide_legend=True
                 "`dot.exe` was found. Either install graphviz"
                 "or, if you just want an intermediate text file, set your --output "
                 "file to use a supported text extension: %r" % set(TEXT_EXTENSIONS))
-        final_img_filename = output_file
-        output_file, extension = output_file.rsplit('.', 1)
-        output_file += '.gv'
+        if split_layout and not all(map(is_installed, ('gvpack', 'neato'))):
+            raise AssertionError("--split-layout needs the graphviz `gvpack` and `neato` "
+                                 "commands, which were not found.")
+        final_img_filenames = output_files
+        output_file = output_file.rsplit('.', 1)[0] + '.gv'
+
+    if watch:
+        _watch(raw_source_paths, sources, language, output_file, output_ext, final_img_filenames,
+               exclude_namespaces, exclude_functions,
+               include_only_namespaces, include_only_functions,
+               hide_legend, no_grouping, no_trimming, skip_parse_errors,
+               lang_params, subset_params, jobs, cache, watch_interval,
+               keep_duplicate_edges=keep_duplicate_edges, source_finder=source_finder,
+               split_layout=split_layout, collapse=collapse, shard=shard)
+        return
 
     file_groups, all_nodes, edges = map_it(sources, language, no_trimming,
                                            exclude_namespaces, exclude_functions,
                                            include_only_namespaces, include_only_functions,
-                                           skip_parse_errors, lang_params)
-
-    if subset_params:
-        logging.info("Filtering into subset...")
-        file_groups, all_nodes, edges = _filter_for_subset(subset_params, all_nodes, edges, file_groups)
-
-    file_groups.sort()
-    all_nodes.sort()
-    edges.sort()
-
-    logging.info("Generating output file...")
-
-    if isinstance(output_file, str):
-        with open(output_file, 'w') as fh:
-            as_json = output_ext == 'json'
-            write_file(fh, nodes=all_nodes, edges=edges,
-                       groups=file_groups, hide_legend=hide_legend,
-                       no_grouping=no_grouping, as_json=as_json)
-    else:
-        write_file(output_file, nodes=all_nodes, edges=edges,
-                   groups=file_groups, hide_legend=hide_legend,
-                   no_grouping=no_grouping)
-
-    logging.info("Wrote output file %r with %d nodes and %d edges.",
-                 output_file, len(all_nodes), len(edges))
-    if not output_ext == 'json':
-        logging.info("For better machine readability, you can also try outputting in a json format.")
+                                           skip_parse_errors, lang_params, jobs=jobs,
+                                           cache=cache, profiler=profiler,
+                                           keep_duplicate_edges=keep_duplicate_edges)
+
+    if cache:
+        with profiler.stage('cache_eviction'):
+            cache.evict()
+
+    _write_outputs(output_file, output_ext, final_img_filenames, file_groups, all_nodes, edges,
+                   hide_legend, no_grouping, subset_params, profiler=profiler,
+                   split_layout=split_layout, jobs=jobs, collapse=collapse, shard=shard,
+                   database_run=database.run_key(raw_source_paths))
     logging.info(" finished processing in %.2f seconds." % (time.time() - start_time))
 
-    # translate to an image if that was requested
-    if final_img_filename:
-        _generate_final_img(output_file, extension, final_img_filename, len(edges))
-
 
 def main(sys_argv=None):
 
@@ -574,11 +1973,28 @@ def main(sys_argv=None):
         description=DESCRIPTION,
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument(
-        'sources', metavar='sources', nargs='+',
+        'sources', metavar='sources', nargs='*',
         help='source code file/directory paths.')
     parser.add_argument(
-        '--output', '-o', default='out.png',
-        help=f'output file path. Supported types are {VALID_EXTENSIONS}.')
+        '--file-list',
+        help='also process the files listed in this file, one per line or NUL delimited '
+             '(e.g. from `git ls-files -z`). Use - to read the list from stdin.')
+    parser.add_argument(
+        '--exclude-paths',
+        help='skip files and directories matching these .gitignore-style globs. '
+             'Comma delimited.')
+    parser.add_argument(
+        '--no-gitignore', action='store_true',
+        help='do not skip files matched by .gitignore files in the source directories.')
+    parser.add_argument(
+        '--output', '-o', action='append',
+        help=f'output file path. Supported types are {VALID_EXTENSIONS}. '
+             'Use - to stream a dot file to stdout. Repeat to render several image '
+             'formats from one run, e.g. -o out.svg -o out.png. .cgb writes a compact, '
+             'memory-mappable binary graph that binary.GraphReader loads lazily. '
+             '.sqlite creates or updates an indexed database of files, groups, '
+             'functions, calls, variables and edges, rewriting only changed files. '
+             'Defaults to out.png.')
     parser.add_argument(
         '--language', choices=['py'],
         help='process this language and ignore all other files.'
@@ -587,7 +2003,13 @@ def main(sys_argv=None):
         '--target-function',
         help='output a subset of the graph centered on this function. '
              'Valid formats include `func`, `class.func`, and `file::class.func`. '
-             'Requires --upstream-depth and/or --downstream-depth. ')
+             'Requires --upstream-depth and/or --downstream-depth. '
+             'Comma delimited to write one output per function.')
+    parser.add_argument(
+        '--targets-file',
+        help='read more target functions from this file, one per line as '
+             '`target [upstream_depth [downstream_depth]]`. Missing depths default to '
+             '--upstream-depth and --downstream-depth.')
     parser.add_argument(
         '--upstream-depth', type=int, default=0,
         help='include n nodes upstream of --target-function.')
@@ -615,11 +2037,65 @@ def main(sys_argv=None):
     parser.add_argument(
         '--hide-legend', action='store_true',
         help='by default,  generates a small legend. This flag hides it.')
+    parser.add_argument(
+        '--keep-duplicate-edges', action='store_true',
+        help='draw one edge per call instead of one weighted edge per pair of functions.')
+    parser.add_argument(
+        '--collapse', choices=COLLAPSE_LEVELS,
+        help='merge functions into one node per file or class, with edges weighted by the '
+             'number of calls. auto picks the finest level that stays within '
+             f'{COLLAPSE_MAX_NODES} nodes and {COLLAPSE_MAX_EDGES} edges.')
+    parser.add_argument(
+        '--shard', action='store_true',
+        help='write one output per top-level directory or package, named like '
+             'out.<package>.svg, plus an out.index.html (or .json) linking them. Calls '
+             'between shards point to stub nodes. Shards are written in parallel, '
+             '--jobs at a time if given. With --collapse, the whole graph is collapsed first '
+             'and the stubs stand for collapsed nodes.')
+    parser.add_argument(
+        '--split-layout', action='store_true',
+        help='lay out each connected component (or each file, when one component holds most '
+             'of the graph) with its own dot process and pack the pieces into one image. '
+             'Runs up to --jobs dot processes at once. Needs gvpack and neato.')
     parser.add_argument(
         '--skip-parse-errors', action='store_true',
         help='skip files that the language parser fails on.')
     parser.add_argument(
-        '--source-type', choices=['script', 'module'], default='script',   
+        '--jobs', '-j', type=int, default=1,
+        help='parse source files with this many processes.')
+    parser.add_argument(
+        '--cache-dir',
+        help='reuse per-file parse results stored in this directory between runs. '
+             'It must be owned by you and not writable by anyone else, because '
+             'entries are loaded with pickle.')
+    parser.add_argument(
+        '--cache-size', type=int, default=DEFAULT_CACHE_SIZE_MB,
+        help='evict the oldest entries once --cache-dir grows beyond this many megabytes.')
+    parser.add_argument(
+        '--watch', action='store_true',
+        help='keep running and rewrite the output whenever a source file changes.')
+    parser.add_argument(
+        '--watch-interval', type=float, default=1.0,
+        help='seconds between checks for changed files in --watch mode.')
+    parser.add_argument(
+        '--serve', metavar='ADDRESS',
+        help='build the graph once and answer /graph requests over HTTP on ADDRESS, either '
+             '[host:]port (localhost by default) or unix:/path/to.sock. Query parameters '
+             'mirror the subset and filter arguments, plus format=dot|json|ndjson and '
+             'collapse=file|class|auto.')
+    parser.add_argument(
+        '--source-type', choices=['script', 'module'], default='script')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='print wall time and cpu time for each stage to stderr. With --jobs, '
+             'the cpu time of each parsing process is listed separately.')
+    parser.add_argument(
+        '--profile-json',
+        help='write the --profile report to this json file.')
+    parser.add_argument(
+        '--profile-memory', action='store_true',
+        help='also trace the peak python heap of each stage with tracemalloc. '
+             'This slows the run down noticeably.')
     parser.add_argument(
         '--quiet', '-q', action='store_true',
         help='suppress most logging')
@@ -639,27 +2115,63 @@ def main(sys_argv=None):
     if args.quiet:
         level = logging.WARNING
 
+    if not args.sources and not args.file_list:
+        raise AssertionError("Pass at least one source path or --file-list.")
+
+    exclude_paths = list(filter(None, (args.exclude_paths or "").split(',')))
     exclude_namespaces = list(filter(None, (args.exclude_namespaces or "").split(',')))
     exclude_functions = list(filter(None, (args.exclude_functions or "").split(',')))
     include_only_namespaces = list(filter(None, (args.include_only_namespaces or "").split(',')))
     include_only_functions = list(filter(None, (args.include_only_functions or "").split(',')))
 
-    subset_params = SubsetParams.generate(args.target_function, args.upstream_depth,
-                                          args.downstream_depth)
-
-    CodeToSchemas(
-        raw_source_paths=args.sources,
-        output_file=args.output,
-        language=args.language,
-        hide_legend=args.hide_legend,
-        exclude_namespaces=exclude_namespaces,
-        exclude_functions=exclude_functions,
-        include_only_namespaces=include_only_namespaces,
-        include_only_functions=include_only_functions,
-        no_grouping=args.no_grouping,
-        no_trimming=args.no_trimming,
-        skip_parse_errors=args.skip_parse_errors,
-        lang_params=lang_params,
-        subset_params=subset_params,
-        level=level,
-    )
+    lang_params = LanguageParams(args.source_type)
+
+    target_functions = list(filter(None, (args.target_function or "").split(',')))
+    subset_params = SubsetParams.generate_many(target_functions, args.upstream_depth,
+                                               args.downstream_depth,
+                                               targets_file=args.targets_file)
+
+    profiler = None
+    if args.profile or args.profile_json or args.profile_memory:
+        profiler = Profiler(trace_memory=args.profile_memory)
+
+    try:
+        CodeToSchemas(
+            raw_source_paths=args.sources,
+            output_file=args.output or ['out.png'],
+            language=args.language,
+            hide_legend=args.hide_legend,
+            exclude_namespaces=exclude_namespaces,
+            exclude_functions=exclude_functions,
+            include_only_namespaces=include_only_namespaces,
+            include_only_functions=include_only_functions,
+            no_grouping=args.no_grouping,
+            no_trimming=args.no_trimming,
+            keep_duplicate_edges=args.keep_duplicate_edges,
+            serve_address=args.serve,
+            exclude_paths=exclude_paths,
+            file_list=args.file_list,
+            use_gitignore=not args.no_gitignore,
+            split_layout=args.split_layout,
+            collapse=args.collapse,
+            shard=args.shard,
+            skip_parse_errors=args.skip_parse_errors,
+            lang_params=lang_params,
+            subset_params=subset_params,
+            jobs=args.jobs,
+            cache_dir=args.cache_dir,
+            cache_size_mb=args.cache_size,
+            watch=args.watch,
+            watch_interval=args.watch_interval,
+            profiler=profiler,
+            level=level,
+        )
+
+        if profiler:
+            sys.stderr.write(profiler.to_table() + '\n')
+            if args.profile_json:
+                with open(args.profile_json, 'w') as f:
+                    f.write(profiler.to_json())
+    finally:
+        if profiler:
+            profiler.close()
@@ -0,0 +1,73 @@
+import collections
+import concurrent.futures
+import subprocess
+
+MIN_PIECE_NODES = 50
+DOMINANT_COMPONENT_FRACTION = 0.5
+LAYOUT_COMMAND = ['dot', '-Tdot']
+PACK_COMMAND = ['gvpack', '-g']
+RENDER_COMMAND = ['neato', '-s', '-n2']
+
+
+def connected_components(nodes, edges):
+    parents = {node: node for node in nodes}
+
+    def find(node):
+        while parents[node] is not node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    for edge in edges:
+        root0, root1 = find(edge.node0), find(edge.node1)
+        if root0 is not root1:
+            parents[root1] = root0
+
+    components = collections.OrderedDict()
+    for node in nodes:
+        components.setdefault(find(node), []).append(node)
+    return list(components.values())
+
+
+def _merge_small_pieces(pieces, min_nodes):
+    merged = []
+    current = []
+    for piece in sorted(pieces, key=len, reverse=True):
+        if len(piece) >= min_nodes:
+            merged.append(piece)
+            continue
+        current += piece
+        if len(current) >= min_nodes:
+            merged.append(current)
+            current = []
+    if current:
+        merged.append(current)
+    return merged
+
+
+def split_graph(nodes, edges, group_of, min_nodes=MIN_PIECE_NODES):
+    components = sorted(connected_components(nodes, edges), key=len, reverse=True)
+    if components and len(components[0]) > DOMINANT_COMPONENT_FRACTION * len(nodes):
+        nodes_by_group = collections.OrderedDict()
+        for node in components.pop(0):
+            nodes_by_group.setdefault(group_of(node), []).append(node)
+        components = list(nodes_by_group.values()) + components
+    return _merge_small_pieces(components, min_nodes)
+
+
+def _run(command, source):
+    return subprocess.run(command, input=source, stdout=subprocess.PIPE, check=True).stdout
+
+
+def layout_pieces(piece_sources, jobs=1):
+    with concurrent.futures.ThreadPoolExecutor(max(jobs, 1)) as executor:
+        return list(executor.map(lambda source: _run(LAYOUT_COMMAND, source), piece_sources))
+
+
+def pack(laid_out_pieces, extra_source=b''):
+    packed = _run(PACK_COMMAND, b''.join(laid_out_pieces))
+    if not extra_source:
+        return packed
+    # edges between pieces have no position yet and are routed when rendering
+    end = packed.rindex(b'}')
+    return packed[:end] + extra_source + packed[end:]
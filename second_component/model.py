@@ -1,665 +1,485 @@
-import argparse
-import collections
-import json
-import logging
+import abc
+import math
 import os
-import subprocess
 import sys
-import time
 
-from .python import Python
-from .model import (TRUNK_COLOR, LEAF_COLOR, NODE_COLOR, GROUP_TYPE, OWNER_CONST,
-                    Edge, Group, Node, Variable, is_installed, flatten)
 
-VERSION = '2.5.1'
+TRUNK_COLOR = '#966F33'
+LEAF_COLOR = '#6db33f'
+EDGE_COLORS = ["#000000", "#E69F00", "#56B4E9", "#009E73",
+               "#F0E442", "#0072B2", "#D55E00", "#CC79A7"]
+NODE_COLOR = "#cccccc"
+MAX_EDGE_PENWIDTH = 8
 
-IMAGE_EXTENSIONS = ('png', 'svg')
-TEXT_EXTENSIONS = ('dot', 'gv', 'json')
-VALID_EXTENSIONS = IMAGE_EXTENSIONS + TEXT_EXTENSIONS
 
+class Namespace(dict):
+    def __init__(self, *args, **kwargs):
+        d = {k: k for k in args}
+        d.update(dict(kwargs.items()))
+        super().__init__(d)
 
-LEGEND = """subgraph legend{
-    rank = min;
-    label = "legend";
-    Legend [shape=none, margin=0, label = <
-        <table cellspacing="0" cellpadding="0" border="1"><tr><td>Legend</td></tr><tr><td>
-        <table cellspacing="0">
-        <tr><td>Regular function</td><td width="50px" bgcolor='%s'></td></tr>
-        <tr><td>Trunk function (nothing calls this)</td><td bgcolor='%s'></td></tr>
-        <tr><td>Leaf function (this calls nothing else)</td><td bgcolor='%s'></td></tr>
-        <tr><td>Function call</td><td><font color='black'>&#8594;</font></td></tr>
-        </table></td></tr></table>
-        >];
-}""" % (NODE_COLOR, TRUNK_COLOR, LEAF_COLOR)
+    def __getattr__(self, item):
+        return self[item]
 
 
-LANGUAGES = {
-    'py': Python
-}
+OWNER_CONST = Namespace("UNKNOWN_VAR", "UNKNOWN_MODULE")
+GROUP_TYPE = Namespace("FILE", "CLASS", "NAMESPACE")
 
 
+def is_installed(executable_cmd):
+    for path in os.environ["PATH"].split(os.pathsep):
+        path = path.strip('"')
+        exe_file = os.path.join(path, executable_cmd)
+        if os.path.isfile(exe_file) and os.access(exe_file, os.X_OK):
+            return True
+    return False
 
-class SubsetParams():
 
-    def __init__(self, target_function, upstream_depth, downstream_depth):
-        self.target_function = target_function
-        self.upstream_depth = upstream_depth
-        self.downstream_depth = downstream_depth
+def djoin(*tup):
+    if len(tup) == 1 and isinstance(tup[0], list):
+        return '.'.join(tup[0])
+    return '.'.join(tup)
 
-    @staticmethod
-    def generate(target_function, upstream_depth, downstream_depth):
-
-        if upstream_depth and not target_function:
-            raise AssertionError("--upstream-depth requires --target-function")
-
-        if downstream_depth and not target_function:
-            raise AssertionError("--downstream-depth requires --target-function")
-
-        if not target_function:
-            return None
-
-        if not (upstream_depth or downstream_depth):
-            raise AssertionError("--target-function requires --upstream-depth or --downstream-depth")
-
-        if upstream_depth < 0:
-            raise AssertionError("--upstream-depth must be >= 0. Exclude argument for complete depth.")
-
-        if downstream_depth < 0:
-            raise AssertionError("--downstream-depth must be >= 0. Exclude argument for complete depth.")
 
-        return SubsetParams(target_function, upstream_depth, downstream_depth)
+def flatten(list_of_lists):
+    return [el for sublist in list_of_lists for el in sublist]
 
 
+def dot_escape(value):
+    return str(value).replace('"', '\\"')
 
-def _find_target_node(subset_params, all_nodes):
 
-    target_nodes = []
-    for node in all_nodes:
-        if node.token == subset_params.target_function or \
-           node.token_with_ownership() == subset_params.target_function or \
-           node.name() == subset_params.target_function:
-            target_nodes.append(node)
-    if not target_nodes:
-        raise AssertionError("Could not find node %r to build a subset." % subset_params.target_function)
-    if len(target_nodes) > 1:
-        raise AssertionError("Found multiple nodes for %r: %r. Try either a `class.func` or "
-                             "`filename::class.func`." % (subset_params.target_function, target_nodes))
-    return target_nodes[0]
+def dot_attributes(attributes):
+    return ''.join(f'{k}="{dot_escape(v)}" ' for k, v in attributes.items())
 
 
-def _filter_nodes_for_subset(subset_params, all_nodes, edges):
-
-    target_node = _find_target_node(subset_params, all_nodes)
-    downstream_dict = collections.defaultdict(set)
-    upstream_dict = collections.defaultdict(set)
-    for edge in edges:
-        upstream_dict[edge.node1].add(edge.node0)
-        downstream_dict[edge.node0].add(edge.node1)
-
-    include_nodes = {target_node}
-    step_nodes = {target_node}
-    next_step_nodes = set()
-
-    for _ in range(subset_params.downstream_depth):
-        for node in step_nodes:
-            next_step_nodes.update(downstream_dict[node])
-        include_nodes.update(next_step_nodes)
-        step_nodes = next_step_nodes
-        next_step_nodes = set()
-
-    step_nodes = {target_node}
-    next_step_nodes = set()
-
-    for _ in range(subset_params.upstream_depth):
-        for node in step_nodes:
-            next_step_nodes.update(upstream_dict[node])
-        include_nodes.update(next_step_nodes)
-        step_nodes = next_step_nodes
-        next_step_nodes = set()
+def _resolve_str_variable(variable, file_groups):
+    for file_group in file_groups:
+        for node in file_group.all_nodes():
+            if any(ot == variable.points_to for ot in node.import_tokens):
+                return node
+        for group in file_group.all_groups():
+            if any(ot == variable.points_to for ot in group.import_tokens):
+                return group
+    return OWNER_CONST.UNKNOWN_MODULE
 
-    return include_nodes
 
+class BaseLanguage(abc.ABC):
 
-def _filter_edges_for_subset(new_nodes, edges):
+    @staticmethod
+    @abc.abstractmethod
+    def assert_dependencies():
+        pass
 
-    new_edges = []
-    for edge in edges:
-        if edge.node0 in new_nodes and edge.node1 in new_nodes:
-            new_edges.append(edge)
-    return new_edges
+    @staticmethod
+    @abc.abstractmethod
+    def get_tree(filename, lang_params, raw=None):
+        pass
 
+    @staticmethod
+    @abc.abstractmethod
+    def separate_namespaces(tree):
+        pass
 
-def _filter_groups_for_subset(new_nodes, file_groups):
+    @staticmethod
+    @abc.abstractmethod
+    def make_nodes(tree, parent):
+        pass
 
-    for file_group in file_groups:
-        for node in file_group.all_nodes():
-            if node not in new_nodes:
-                node.remove_from_parent()
+    @staticmethod
+    @abc.abstractmethod
+    def make_root_node(lines, parent):
+        pass
 
-    new_file_groups = [g for g in file_groups if g.all_nodes()]
+    @staticmethod
+    @abc.abstractmethod
+    def make_class_group(tree, parent):
+        pass
+
+
+class Variable():
+    __slots__ = ('token', 'points_to', 'line_number')
+
+    def __init__(self, token, points_to, line_number=None):
+        assert token
+        assert points_to
+        self.token = sys.intern(token)
+        if isinstance(points_to, str):
+            points_to = sys.intern(points_to)
+        self.points_to = points_to
+        self.line_number = line_number
+
+    def __repr__(self):
+        return f"<Variable token={self.token} points_to={repr(self.points_to)}"
+
+    def to_string(self):
+        if self.points_to and isinstance(self.points_to, (Group, Node)):
+            return f'{self.token}->{self.points_to.token}'
+        return f'{self.token}->{self.points_to}'
+
+
+class Call():
+    __slots__ = ('token', 'owner_token', 'line_number', 'definite_constructor')
+
+    def __init__(self, token, line_number=None, owner_token=None, definite_constructor=False):
+        self.token = sys.intern(token)
+        # owner chains like self.client.session repeat across a codebase so share one string
+        self.owner_token = sys.intern(owner_token) if owner_token else owner_token
+        self.line_number = line_number
+        self.definite_constructor = definite_constructor
+
+    def __repr__(self):
+        return f"<Call owner_token={self.owner_token} token={self.token}>"
+
+    def to_string(self):
+        if self.owner_token:
+            return f"{self.owner_token}.{self.token}()"
+        return f"{self.token}()"
+
+    def is_attr(self):
+        return self.owner_token is not None
+
+    def matches_variable(self, variable):
+
+        if self.is_attr():
+            if self.owner_token == variable.token:
+                for node in getattr(variable.points_to, 'nodes', []):
+                    if self.token == node.token:
+                        return node
+                for inherit_nodes in getattr(variable.points_to, 'inherits', []):
+                    for node in inherit_nodes:
+                        if self.token == node.token:
+                            return node
+                if variable.points_to in OWNER_CONST:
+                    return variable.points_to
+
+            # This section is specifically for resolving namespace variables
+            if isinstance(variable.points_to, Group) \
+               and variable.points_to.group_type == GROUP_TYPE.NAMESPACE:
+                parts = self.owner_token.split('.')
+                if len(parts) != 2:
+                    return None
+                if parts[0] != variable.token:
+                    return None
+                for node in variable.points_to.all_nodes():
+                    if parts[1] == node.namespace_ownership() \
+                       and self.token == node.token:
+                        return node
 
-    for file_group in new_file_groups:
-        for group in file_group.all_groups():
-            if not group.all_nodes():
-                group.remove_from_parent()
-
-    return new_file_groups
-
-
-def _filter_for_subset(subset_params, all_nodes, edges, file_groups):
-
-    new_nodes = _filter_nodes_for_subset(subset_params, all_nodes, edges)
-    new_edges = _filter_edges_for_subset(new_nodes, edges)
-    new_file_groups = _filter_groups_for_subset(new_nodes, file_groups)
-    return new_file_groups, list(new_nodes), new_edges
-
-
-def generate_json(nodes, edges):
-
-    nodes = [n.to_dict() for n in nodes]
-    nodes = {n['uid']: n for n in nodes}
-    edges = [e.to_dict() for e in edges]
-
-    return json.dumps({"graph": {
-        "directed": True,
-        "nodes": nodes,
-        "edges": edges,
-    }})
-
-
-def write_file(outfile, nodes, edges, groups, hide_legend=False,
-               no_grouping=False, as_json=False):
-
-    if as_json:
-        content = generate_json(nodes, edges)
-        outfile.write(content)
-        return
-
-    splines = "polyline" if len(edges) >= 500 else "ortho"
-
-    content = "digraph G {\n"
-    content += "concentrate=true;\n"
-    content += f'splines="{splines}";\n'
-    content += 'rankdir="LR";\n'
-    if not hide_legend:
-        content += LEGEND
-    for node in nodes:
-        content += node.to_dot() + ';\n'
-    for edge in edges:
-        content += edge.to_dot() + ';\n'
-    if not no_grouping:
-        for group in groups:
-            content += group.to_dot()
-    content += '}\n'
-    outfile.write(content)
-
-
-def determine_language(individual_files):
-    for source, _ in individual_files:
-        suffix = source.rsplit('.', 1)[-1]
-        if suffix in LANGUAGES:
-            logging.info("Implicitly detected language as %r.", suffix)
-            return suffix
-    raise AssertionError(f"Language could not be detected from input {individual_files}. ",
-                         "Try explicitly passing the language flag.")
-
-
-def get_sources_and_language(raw_source_paths, language):
-    individual_files = []
-    for source in sorted(raw_source_paths):
-        if os.path.isfile(source):
-            individual_files.append((source, True))
-            continue
-        for root, _, files in os.walk(source):
-            for f in files:
-                individual_files.append((os.path.join(root, f), False))
-
-    if not individual_files:
-        raise AssertionError("No source files found from %r" % raw_source_paths)
-    logging.info("Found %d files from sources argument.", len(individual_files))
-
-    if not language:
-        language = determine_language(individual_files)
-
-    sources = set()
-    for source, explicity_added in individual_files:
-        if explicity_added or source.endswith('.' + language):
-            sources.add(source)
+            return None
+        if self.token == variable.token:
+            if isinstance(variable.points_to, Node):
+                return variable.points_to
+            if isinstance(variable.points_to, Group) \
+               and variable.points_to.group_type == GROUP_TYPE.CLASS \
+               and variable.points_to.get_constructor():
+                return variable.points_to.get_constructor()
+        return None
+
+
+class Node():
+    __slots__ = ('token', 'line_number', 'calls', 'variables', 'import_tokens', 'parent',
+                 'is_constructor', 'uid', 'is_leaf', 'is_trunk')
+
+    def __init__(self, token, calls, variables, parent, import_tokens=None,
+                 line_number=None, is_constructor=False):
+        self.token = sys.intern(token)
+        self.line_number = line_number
+        self.calls = calls
+        self.variables = variables
+        self.import_tokens = import_tokens or []
+        self.parent = parent
+        self.is_constructor = is_constructor
+
+        self.uid = "node_" + os.urandom(4).hex()
+
+        # Assume it is a leaf and a trunk. These are modified later
+        self.is_leaf = True  # it calls nothing else
+        self.is_trunk = True  # nothing calls it
+
+    def __repr__(self):
+        return f"<Node token={self.token} parent={self.parent}>"
+
+    def __lt__(self, other):
+            return self.name() < other.name()
+
+    def name(self):
+        return f"{self.first_group().filename()}::{self.token_with_ownership()}"
+
+    def first_group(self):
+        parent = self.parent
+        while not isinstance(parent, Group):
+            parent = parent.parent
+        return parent
+
+    def file_group(self):
+        parent = self.parent
+        while parent.parent:
+            parent = parent.parent
+        return parent
+
+    def is_attr(self):
+        return (self.parent
+                and isinstance(self.parent, Group)
+                and self.parent.group_type in (GROUP_TYPE.CLASS, GROUP_TYPE.NAMESPACE))
+
+    def token_with_ownership(self):
+        if self.is_attr():
+            return djoin(self.parent.token, self.token)
+        return self.token
+
+    def namespace_ownership(self):
+        parent = self.parent
+        ret = []
+        while parent and parent.group_type == GROUP_TYPE.CLASS:
+            ret = [parent.token] + ret
+            parent = parent.parent
+        return djoin(ret)
+
+    def label(self):
+        if self.line_number is not None:
+            return f"{self.line_number}: {self.token}()"
+        return f"{self.token}()"
+
+    def remove_from_parent(self):
+        self.first_group().remove_node(self)
+
+    def get_variables(self, line_number=None):
+        if line_number is None:
+            ret = list(self.variables)
         else:
-            logging.info("Skipping %r which is not a %s file. "
-                         "If this is incorrect, include it explicitly.",
-                         source, language)
-
-    if not sources:
-        raise AssertionError("Could not find any source files given {raw_source_paths} "
-                             "and language {language}.")
-
-    sources = sorted(list(sources))
-    logging.info("Processing %d source file(s)." % (len(sources)))
-    for source in sources:
-        logging.info("  " + source)
-
-    return sources, language
-
-
-def make_file_group(tree, filename, extension):
-    language = LANGUAGES[extension]
-
-    subgroup_trees, node_trees, body_trees = language.separate_namespaces(tree)
-    group_type = GROUP_TYPE.FILE
-    token = os.path.split(filename)[-1].rsplit('.' + extension, 1)[0]
-    line_number = 0
-    display_name = 'File'
-    import_tokens = language.file_import_tokens(filename)
-
-    file_group = Group(token, group_type, display_name, import_tokens,
-                       line_number, parent=None)
-    for node_tree in node_trees:
-        for new_node in language.make_nodes(node_tree, parent=file_group):
-            file_group.add_node(new_node)
-
-    file_group.add_node(language.make_root_node(body_trees, parent=file_group), is_root=True)
-
-    for subgroup_tree in subgroup_trees:
-        file_group.add_subgroup(language.make_class_group(subgroup_tree, parent=file_group))
-    return file_group
-
-
-def _find_link_for_call(call, node_a, all_nodes):
-    all_vars = node_a.get_variables(call.line_number)
-
-    for var in all_vars:
-        var_match = call.matches_variable(var)
-        if var_match:
-            if var_match == OWNER_CONST.UNKNOWN_MODULE:
-                return None, None
-            assert isinstance(var_match, Node)
-            return var_match, None
-
-    possible_nodes = []
-    if call.is_attr():
-        for node in all_nodes:
-            if call.token == node.token and node.parent != node_a.file_group():
-                possible_nodes.append(node)
-    else:
-        for node in all_nodes:
-            if call.token == node.token \
-               and isinstance(node.parent, Group)  \
-               and node.parent.group_type == GROUP_TYPE.FILE:
-                possible_nodes.append(node)
-            elif call.token == node.parent.token and node.is_constructor:
-                possible_nodes.append(node)
-
-    if len(possible_nodes) == 1:
-        return possible_nodes[0], None
-    if len(possible_nodes) > 1:
-        return None, call
-    return None, None
-
-
-def _find_links(node_a, all_nodes):
-
-    links = []
-    for call in node_a.calls:
-        lfc = _find_link_for_call(call, node_a, all_nodes)
-        assert not isinstance(lfc, Group)
-        links.append(lfc)
-    return list(filter(None, links))
-
-
-def map_it(sources, extension, no_trimming, exclude_namespaces, exclude_functions,
-           include_only_namespaces, include_only_functions,
-           skip_parse_errors, lang_params):
-    language = LANGUAGES[extension]
-
-
-    language.assert_dependencies()
-
-
-    file_ast_trees = []
-    for source in sources:
-        try:
-            file_ast_trees.append((source, language.get_tree(source, lang_params)))
-        except Exception as ex:
-            if skip_parse_errors:
-                logging.warning("Could not parse %r. (%r) Skipping...", source, ex)
+            # TODO variables should be sorted by scope before line_number
+            ret = list([v for v in self.variables if v.line_number <= line_number])
+        if any(v.line_number for v in ret):
+            ret.sort(key=lambda v: v.line_number, reverse=True)
+
+        parent = self.parent
+        while parent:
+            ret += parent.get_variables()
+            parent = parent.parent
+        return ret
+
+    def resolve_variables(self, file_groups):
+        for variable in self.variables:
+            if isinstance(variable.points_to, str):
+                variable.points_to = _resolve_str_variable(variable, file_groups)
+            elif isinstance(variable.points_to, Call):
+                # else, this is a call variable
+                call = variable.points_to
+                # Only process Class(); Not a.Class()
+                if call.is_attr() and not call.definite_constructor:
+                    continue
+                # Else, assume the call is a constructor.
+                # iterate through to find the right group
+                for file_group in file_groups:
+                    for group in file_group.all_groups():
+                        if group.token == call.token:
+                            variable.points_to = group
             else:
-                raise ex
-
-    file_groups = []
-    for source, file_ast_tree in file_ast_trees:
-        file_group = make_file_group(file_ast_tree, source, extension)
-        file_groups.append(file_group)
-
-    if exclude_namespaces or include_only_namespaces:
-        file_groups = _limit_namespaces(file_groups, exclude_namespaces, include_only_namespaces)
-    if exclude_functions or include_only_functions:
-        file_groups = _limit_functions(file_groups, exclude_functions, include_only_functions)
-
-    all_subgroups = flatten(g.all_groups() for g in file_groups)
-    all_nodes = flatten(g.all_nodes() for g in file_groups)
-
-    nodes_by_subgroup_token = collections.defaultdict(list)
-    for subgroup in all_subgroups:
-        if subgroup.token in nodes_by_subgroup_token:
-            logging.warning("Duplicate group name %r. Naming collision possible.",
-                            subgroup.token)
-        nodes_by_subgroup_token[subgroup.token] += subgroup.nodes
-
-    for group in file_groups:
-        for subgroup in group.all_groups():
-            subgroup.inherits = [nodes_by_subgroup_token.get(g) for g in subgroup.inherits]
-            subgroup.inherits = list(filter(None, subgroup.inherits))
-            for inherit_nodes in subgroup.inherits:
-                for node in subgroup.nodes:
-                    node.variables += [Variable(n.token, n, n.line_number) for n in inherit_nodes]
-
-    for node in all_nodes:
-        node.resolve_variables(file_groups)
-
-    logging.info("Found groups %r." % [g.label() for g in all_subgroups])
-    logging.info("Found nodes %r." % sorted(n.token_with_ownership() for n in all_nodes))
-    logging.info("Found calls %r." % sorted(list(set(c.to_string() for c in
-                                                     flatten(n.calls for n in all_nodes)))))
-    logging.info("Found variables %r." % sorted(list(set(v.to_string() for v in
-                                                         flatten(n.variables for n in all_nodes)))))
-
-    bad_calls = []
-    edges = []
-    for node_a in list(all_nodes):
-        links = _find_links(node_a, all_nodes)
-        for node_b, bad_call in links:
-            if bad_call:
-                bad_calls.append(bad_call)
-            if not node_b:
-                continue
-            edges.append(Edge(node_a, node_b))
-
-    bad_calls_strings = set()
-    for bad_call in bad_calls:
-        bad_calls_strings.add(bad_call.to_string())
-    bad_calls_strings = list(sorted(list(bad_calls_strings)))
-    if bad_calls_strings:
-        logging.info("Skipped processing these calls because the algorithm "
-                     "linked them to multiple function definitions: %r." % bad_calls_strings)
-
-    if no_trimming:
-        return file_groups, all_nodes, edges
-
-    nodes_with_edges = set()
-    for edge in edges:
-        nodes_with_edges.add(edge.node0)
-        nodes_with_edges.add(edge.node1)
-
-    for node in all_nodes:
-        if node not in nodes_with_edges:
-            node.remove_from_parent()
-
-    for file_group in file_groups:
-        for group in file_group.all_groups():
-            if not group.all_nodes():
-                group.remove_from_parent()
-
-    file_groups = [g for g in file_groups if g.all_nodes()]
-    all_nodes = list(nodes_with_edges)
-
-    if not all_nodes:
-        logging.warning("No functions found! Most likely, your file(s) do not have "
-                        "functions that call each other. Note that to generate a flowchart, "
-                        "you need to have both the function calls and the function "
-                        "definitions. Or, you might be excluding too many "
-                        "with --exclude-* / --include-* / --target-function arguments. ")
-        logging.warning("Program will generate an empty output file.")
-
-    return file_groups, all_nodes, edges
-
-
-def _limit_namespaces(file_groups, exclude_namespaces, include_only_namespaces):
-
-    removed_namespaces = set()
-
-    for group in list(file_groups):
-        if group.token in exclude_namespaces:
-            for node in group.all_nodes():
-                node.remove_from_parent()
-            removed_namespaces.add(group.token)
-        if include_only_namespaces and group.token not in include_only_namespaces:
-            for node in group.nodes:
-                node.remove_from_parent()
-            removed_namespaces.add(group.token)
-
-        for subgroup in group.all_groups():
-            print(subgroup, subgroup.all_parents())
-            if subgroup.token in exclude_namespaces:
-                for node in subgroup.all_nodes():
-                    node.remove_from_parent()
-                removed_namespaces.add(subgroup.token)
-            if include_only_namespaces and \
-               subgroup.token not in include_only_namespaces and \
-               all(p.token not in include_only_namespaces for p in subgroup.all_parents()):
-                for node in subgroup.nodes:
-                    node.remove_from_parent()
-                removed_namespaces.add(group.token)
-
-    for namespace in exclude_namespaces:
-        if namespace not in removed_namespaces:
-            logging.warning(f"Could not exclude namespace '{namespace}' "
-                             "because it was not found.")
-    return file_groups
-
-
-def _limit_functions(file_groups, exclude_functions, include_only_functions):
-
-    removed_functions = set()
-
-    for group in list(file_groups):
-        for node in group.all_nodes():
-            if node.token in exclude_functions or \
-               (include_only_functions and node.token not in include_only_functions):
-                node.remove_from_parent()
-                removed_functions.add(node.token)
-
-    for function_name in exclude_functions:
-        if function_name not in removed_functions:
-            logging.warning(f"Could not exclude function '{function_name}' "
-                             "because it was not found.")
-    return file_groups
-
-
-def _generate_graphviz(output_file, extension, final_img_filename):
-
-    start_time = time.time()
-    logging.info("Running graphviz to make the image...")
-    command = ["dot", "-T" + extension, output_file]
-    with open(final_img_filename, 'w') as f:
-        try:
-            subprocess.run(command, stdout=f, check=True)
-            logging.info("Graphviz finished in %.2f seconds." % (time.time() - start_time))
-        except subprocess.CalledProcessError:
-            logging.warning("***Graphviz returned non-zero exit code! "
-                            "Try running %r for more detail ***", ' '.join(command + ['-v', '-O']))
-
-
-def _generate_final_img(output_file, extension, final_img_filename, num_edges):
-
-    _generate_graphviz(output_file, extension, final_img_filename)
-    logging.info("Completed your flowchart! To see it, open %r.",
-                 final_img_filename)
-
-
-def CodeToSchemas(raw_source_paths, output_file, language=None, hide_legend=True,
-              exclude_namespaces=None, exclude_functions=None,
-              include_only_namespaces=None, include_only_functions=None,
-              no_grouping=False, no_trimming=False, skip_parse_errors=False,
-              lang_params=None, subset_params=None, level=logging.INFO):
-
-    start_time = time.time()
-
-    if not isinstance(raw_source_paths, list):
-        raw_source_paths = [raw_source_paths]
-    lang_params = lang_params or LanguageParams()
-
-    exclude_namespaces = exclude_namespaces or []
-    assert isinstance(exclude_namespaces, list)
-    exclude_functions = exclude_functions or []
-    assert isinstance(exclude_functions, list)
-    include_only_namespaces = include_only_namespaces or []
-    assert isinstance(include_only_namespaces, list)
-    include_only_functions = include_only_functions or []
-    assert isinstance(include_only_functions, list)
-
-    logging.basicConfig(format="CodeToSchemas: %(message)s", level=level)
-
-    sources, language = get_sources_and_language(raw_source_paths, language)
-
-    output_ext = None
-    if isinstance(output_file, str):
-        assert '.' in output_file, "Output filename must end in one of: %r." % set(VALID_EXTENSIONS)
-        output_ext = output_file.rsplit('.', 1)[1] or ''
-        assert output_ext in VALID_EXTENSIONS, "Output filename must end in one of: %r." % \
-                                               set(VALID_EXTENSIONS)
-
-    final_img_filename = None
-    if output_ext and output_ext in IMAGE_EXTENSIONS:
-        if not is_installed('dot') and not is_installed('dot.exe'):
-            raise AssertionError(
-                "Can't generate a flowchart image because neither `dot` nor "
-                "`dot.exe` was found. Either install graphviz"
-                "or, if you just want an intermediate text file, set your --output "
-                "file to use a supported text extension: %r" % set(TEXT_EXTENSIONS))
-        final_img_filename = output_file
-        output_file, extension = output_file.rsplit('.', 1)
-        output_file += '.gv'
-
-    file_groups, all_nodes, edges = map_it(sources, language, no_trimming,
-                                           exclude_namespaces, exclude_functions,
-                                           include_only_namespaces, include_only_functions,
-                                           skip_parse_errors, lang_params)
-
-    if subset_params:
-        logging.info("Filtering into subset...")
-        file_groups, all_nodes, edges = _filter_for_subset(subset_params, all_nodes, edges, file_groups)
-
-    file_groups.sort()
-    all_nodes.sort()
-    edges.sort()
-
-    logging.info("Generating output file...")
-
-    if isinstance(output_file, str):
-        with open(output_file, 'w') as fh:
-            as_json = output_ext == 'json'
-            write_file(fh, nodes=all_nodes, edges=edges,
-                       groups=file_groups, hide_legend=hide_legend,
-                       no_grouping=no_grouping, as_json=as_json)
-    else:
-        write_file(output_file, nodes=all_nodes, edges=edges,
-                   groups=file_groups, hide_legend=hide_legend,
-                   no_grouping=no_grouping)
-
-    logging.info("Wrote output file %r with %d nodes and %d edges.",
-                 output_file, len(all_nodes), len(edges))
-    if not output_ext == 'json':
-        logging.info("For better machine readability, you can also try outputting in a json format.")
-    logging.info(" finished processing in %.2f seconds." % (time.time() - start_time))
-
-    # translate to an image if that was requested
-    if final_img_filename:
-        _generate_final_img(output_file, extension, final_img_filename, len(edges))
-
-
-def main(sys_argv=None):
-
-    parser = argparse.ArgumentParser(
-        description=DESCRIPTION,
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument(
-        'sources', metavar='sources', nargs='+',
-        help='source code file/directory paths.')
-    parser.add_argument(
-        '--output', '-o', default='out.png',
-        help=f'output file path. Supported types are {VALID_EXTENSIONS}.')
-    parser.add_argument(
-        '--language', choices=['py'],
-        help='process this language and ignore all other files.'
-             'If omitted, use the suffix of the first source file.')
-    parser.add_argument(
-        '--target-function',
-        help='output a subset of the graph centered on this function. '
-             'Valid formats include `func`, `class.func`, and `file::class.func`. '
-             'Requires --upstream-depth and/or --downstream-depth. ')
-    parser.add_argument(
-        '--upstream-depth', type=int, default=0,
-        help='include n nodes upstream of --target-function.')
-    parser.add_argument(
-        '--downstream-depth', type=int, default=0,
-        help='include n nodes downstream of --target-function.')
-    parser.add_argument(
-        '--exclude-functions',
-        help='exclude functions from the output. Comma delimited.')
-    parser.add_argument(
-        '--exclude-namespaces',
-        help='exclude namespaces (Classes, modules, etc) from the output. Comma delimited.')
-    parser.add_argument(
-        '--include-only-functions',
-        help='include only functions in the output. Comma delimited.')
-    parser.add_argument(
-        '--include-only-namespaces',
-        help='include only namespaces (Classes, modules, etc) in the output. Comma delimited.')
-    parser.add_argument(
-        '--no-grouping', action='store_true',
-        help='instead of grouping functions into namespaces, let functions float.')
-    parser.add_argument(
-        '--no-trimming', action='store_true',
-        help='show all functions/namespaces whether or not they connect to anything.')
-    parser.add_argument(
-        '--hide-legend', action='store_true',
-        help='by default,  generates a small legend. This flag hides it.')
-    parser.add_argument(
-        '--skip-parse-errors', action='store_true',
-        help='skip files that the language parser fails on.')
-    parser.add_argument(
-        '--source-type', choices=['script', 'module'], default='script',   
-    parser.add_argument(
-        '--quiet', '-q', action='store_true',
-        help='suppress most logging')
-    parser.add_argument(
-        '--verbose', '-v', action='store_true',
-        help='add more logging')
-    parser.add_argument(
-        '--version', action='version', version='%(prog)s ' + VERSION)
-
-    sys_argv = sys_argv or sys.argv[1:]
-    args = parser.parse_args(sys_argv)
-    level = logging.INFO
-    if args.verbose and args.quiet:
-        raise AssertionError("Passed both --verbose and --quiet flags")
-    if args.verbose:
-        level = logging.DEBUG
-    if args.quiet:
-        level = logging.WARNING
-
-    exclude_namespaces = list(filter(None, (args.exclude_namespaces or "").split(',')))
-    exclude_functions = list(filter(None, (args.exclude_functions or "").split(',')))
-    include_only_namespaces = list(filter(None, (args.include_only_namespaces or "").split(',')))
-    include_only_functions = list(filter(None, (args.include_only_functions or "").split(',')))
-
-    subset_params = SubsetParams.generate(args.target_function, args.upstream_depth,
-                                          args.downstream_depth)
-
-    CodeToSchemas(
-        raw_source_paths=args.sources,
-        output_file=args.output,
-        language=args.language,
-        hide_legend=args.hide_legend,
-        exclude_namespaces=exclude_namespaces,
-        exclude_functions=exclude_functions,
-        include_only_namespaces=include_only_namespaces,
-        include_only_functions=include_only_functions,
-        no_grouping=args.no_grouping,
-        no_trimming=args.no_trimming,
-        skip_parse_errors=args.skip_parse_errors,
-        lang_params=lang_params,
-        subset_params=subset_params,
-        level=level,
-    )
+                assert isinstance(variable.points_to, (Node, Group))
+
+    def to_dot(self):
+        attributes = {
+            'label': self.label(),
+            'name': self.name(),
+            'shape': "rect",
+            'style': 'rounded,filled',
+            'fillcolor': NODE_COLOR,
+        }
+        if self.is_trunk:
+            attributes['fillcolor'] = TRUNK_COLOR
+        elif self.is_leaf:
+            attributes['fillcolor'] = LEAF_COLOR
+
+        return self.uid + ' [' + dot_attributes(attributes) + ']'
+
+    def to_dict(self):
+        return {
+            'uid': self.uid,
+            'label': self.label(),
+            'name': self.name(),
+        }
+
+
+def _wrap_as_variables(sequence):
+    return [Variable(el.token, el, el.line_number) for el in sequence]
+
+
+class Edge():
+    __slots__ = ('node0', 'node1')
+
+    def __init__(self, node0, node1):
+        self.node0 = node0
+        self.node1 = node1
+
+        # When we draw the edge, we know the calling function is definitely not a leaf...
+        # and the called function is definitely not a trunk
+        node0.is_leaf = False
+        node1.is_trunk = False
+
+    def __repr__(self):
+        return f"<Edge {self.node0} -> {self.node1}"
+
+    def __lt__(self, other):
+        if self.node0 == other.node0:
+            return self.node1 < other.node1
+        return self.node0 < other.node0
+
+    def to_dot(self):
+        ret = self.node0.uid + ' -> ' + self.node1.uid
+        source_color = int(self.node0.uid.split("_")[-1], 16) % len(EDGE_COLORS)
+        ret += f' [color="{EDGE_COLORS[source_color]}" penwidth="2"]'
+        return ret
+
+    def to_dict(self):
+        return {
+            'source': self.node0.uid,
+            'target': self.node1.uid,
+            'directed': True,
+        }
+
+
+class WeightedEdge(Edge):
+    __slots__ = ('line_numbers',)
+
+    def __init__(self, node0, node1):
+        super().__init__(node0, node1)
+        self.line_numbers = []
+
+    def __repr__(self):
+        return f"<WeightedEdge {self.node0} -> {self.node1} x{self.count()}>"
+
+    def add_call(self, line_number):
+        self.line_numbers.append(line_number)
+
+    def count(self):
+        return max(len(self.line_numbers), 1)
+
+    def to_dot(self):
+        count = self.count()
+        if count == 1:
+            return super().to_dot()
+        ret = self.node0.uid + ' -> ' + self.node1.uid
+        source_color = int(self.node0.uid.split("_")[-1], 16) % len(EDGE_COLORS)
+        penwidth = round(min(2 + math.log2(count), MAX_EDGE_PENWIDTH), 1)
+        ret += f' [color="{EDGE_COLORS[source_color]}" penwidth="{penwidth:g}" weight="{count}"]'
+        return ret
+
+    def to_dict(self):
+        ret = super().to_dict()
+        ret['count'] = self.count()
+        ret['lines'] = sorted(n for n in self.line_numbers if n is not None)
+        return ret
+
+
+class Group():
+    __slots__ = ('token', 'line_number', 'nodes', 'root_node', 'subgroups', 'parent',
+                 'group_type', 'display_type', 'import_tokens', 'inherits', 'uid', 'source',
+                 'skipped_functions')
+
+    def __init__(self, token, group_type, display_type, import_tokens=None,
+                 line_number=None, parent=None, inherits=None):
+        self.token = sys.intern(token)
+        self.line_number = line_number
+        # dicts keep insertion order and give constant time membership and removal
+        self.nodes = {}
+        self.root_node = None
+        self.subgroups = {}
+        self.parent = parent
+        self.group_type = group_type
+        self.display_type = display_type
+        self.import_tokens = import_tokens or []
+        self.inherits = inherits or []
+        self.source = None
+        self.skipped_functions = ()
+        assert group_type in GROUP_TYPE
+
+        self.uid = "cluster_" + os.urandom(4).hex()  # group doesn't work by syntax rules
+
+    def __repr__(self):
+        return f"<Group token={self.token} type={self.display_type}>"
+
+    def __lt__(self, other):
+        return self.label() < other.label()
+
+    def label(self):
+        return f"{self.display_type}: {self.token}"
+
+    def filename(self):
+        if self.group_type == GROUP_TYPE.FILE:
+            return self.token
+        return self.parent.filename()
+
+    def add_subgroup(self, sg):
+        self.subgroups[sg] = None
+
+    def remove_subgroup(self, sg):
+        self.subgroups.pop(sg, None)
+
+    def add_node(self, node, is_root=False):
+        self.nodes[node] = None
+        if is_root:
+            self.root_node = node
+
+    def remove_node(self, node):
+        self.nodes.pop(node, None)
+
+    def all_nodes(self):
+        ret = list(self.nodes)
+        for subgroup in self.subgroups:
+            ret += subgroup.all_nodes()
+        return ret
+
+    def get_constructor(self):
+        assert self.group_type == GROUP_TYPE.CLASS
+        constructors = [n for n in self.nodes if n.is_constructor]
+        if constructors:
+            return constructors[0]
+
+    def all_groups(self):
+        ret = [self]
+        for subgroup in self.subgroups:
+            ret += subgroup.all_groups()
+        return ret
+
+    def get_variables(self, line_number=None):
+
+        if self.root_node:
+            variables = (self.root_node.variables
+                         + _wrap_as_variables(list(self.subgroups))
+                         + _wrap_as_variables(n for n in self.nodes if n != self.root_node))
+            if any(v.line_number for v in variables):
+                return sorted(variables, key=lambda v: v.line_number, reverse=True)
+            return variables
+        else:
+            return []
+
+    def remove_from_parent(self):
+        if self.parent:
+            self.parent.remove_subgroup(self)
+
+    def all_parents(self):
+        if self.parent:
+            return [self.parent] + self.parent.all_parents()
+        return []
+
+    def to_dot(self):
+
+        ret = 'subgraph ' + self.uid + ' {\n'
+        if self.nodes:
+            ret += '    '
+            ret += ' '.join(node.uid for node in self.nodes)
+            ret += ';\n'
+        attributes = {
+            'label': self.label(),
+            'name': self.token,
+            'style': 'filled',
+        }
+        for k, v in attributes.items():
+            ret += f'    {k}="{dot_escape(v)}";\n'
+        ret += '    graph[style=dotted];\n'
+        for subgroup in self.subgroups:
+            ret += '    ' + ('\n'.join('    ' + ln for ln in
+                                       subgroup.to_dot().split('\n'))).strip() + '\n'
+        ret += '};\n'
+        return ret
@@ -0,0 +1,149 @@
+import collections
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _max_rss_bytes():
+    if not resource:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on linux but in bytes on macOS
+    if sys.platform == 'darwin':
+        return max_rss
+    return max_rss * 1024
+
+
+class Profiler():
+
+    def __init__(self, enabled=True, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.started_tracing = False
+        self.stages = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+        self.workers = collections.OrderedDict()
+        self.open_stages = []
+        self.start_time = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.trace_memory = False
+
+    def _traced_peak(self):
+        if not self.trace_memory:
+            return None
+        return tracemalloc.get_traced_memory()[1]
+
+    def _record(self, name, wall, cpu, peak_memory):
+        stage = self.stages.setdefault(name, {
+            'calls': 0,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'peak_memory_bytes': None,
+        })
+        stage['calls'] += 1
+        stage['wall_seconds'] += wall
+        stage['cpu_seconds'] += cpu
+        if peak_memory is not None:
+            stage['peak_memory_bytes'] = max(stage['peak_memory_bytes'] or 0, peak_memory)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        if self.trace_memory:
+            if self.open_stages:
+                self.open_stages[-1][1] = max(self.open_stages[-1][1], self._traced_peak())
+            tracemalloc.reset_peak()
+        self.open_stages.append([name, 0])
+        start_wall = time.perf_counter()
+        start_cpu = _cpu_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = _cpu_time() - start_cpu
+            peak_memory = self.open_stages.pop()[1]
+            if self.trace_memory:
+                peak_memory = max(peak_memory, self._traced_peak())
+            else:
+                peak_memory = None
+            if self.open_stages and peak_memory is not None:
+                self.open_stages[-1][1] = max(self.open_stages[-1][1], peak_memory)
+            self._record(name, wall, cpu, peak_memory)
+
+    def add(self, name, wall, cpu):
+        if self.enabled:
+            self._record(name, wall, cpu, None)
+
+    def add_worker(self, worker, name, cpu):
+        if self.enabled:
+            worker_stages = self.workers.setdefault(worker, collections.OrderedDict())
+            worker_stages[name] = worker_stages.get(name, 0.0) + cpu
+
+    def count(self, name, value):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        return {
+            'total_wall_seconds': time.perf_counter() - self.start_time,
+            'max_rss_bytes': _max_rss_bytes(),
+            'stages': [dict(name=name, **stage) for name, stage in self.stages.items()],
+            'worker_cpu_seconds': [dict(worker=worker, **worker_stages)
+                                   for worker, worker_stages in self.workers.items()],
+            'counters': dict(self.counters),
+        }
+
+    def to_json(self):
+        return json.dumps(self.report(), indent=2)
+
+    def to_table(self):
+        report = self.report()
+        lines = ["%-28s %6s %10s %10s %14s" % ('stage', 'calls', 'wall (s)', 'cpu (s)',
+                                                'peak mem (MB)')]
+        for stage in report['stages']:
+            peak_memory = stage['peak_memory_bytes']
+            peak_memory = '-' if peak_memory is None else '%.1f' % (peak_memory / 1024 / 1024)
+            lines.append("%-28s %6d %10.3f %10.3f %14s" % (
+                stage['name'], stage['calls'], stage['wall_seconds'],
+                stage['cpu_seconds'], peak_memory))
+        lines.append("%-28s %6s %10.3f" % ('total', '', report['total_wall_seconds']))
+        if report['worker_cpu_seconds']:
+            # workers run concurrently, so their times are not part of the stage times above
+            lines.append("worker cpu (s), overlapping the stages above:")
+            for worker_stages in report['worker_cpu_seconds']:
+                lines.append("  %-26s " % worker_stages['worker'] + ', '.join(
+                    '%s=%.3f' % kv for kv in worker_stages.items() if kv[0] != 'worker'))
+        if report['max_rss_bytes']:
+            lines.append("max rss: %.1f MB" % (report['max_rss_bytes'] / 1024 / 1024))
+        if report['counters']:
+            lines.append("counters: " + ', '.join('%s=%d' % kv for kv in report['counters'].items()))
+        return '\n'.join(lines)
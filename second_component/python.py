@@ -1,6 +1,8 @@
 import ast
+import collections
 import logging
 import os
+import sys
 
 from .model import (OWNER_CONST, GROUP_TYPE, Group, Node, Call, Variable,
                     BaseLanguage, djoin)
@@ -30,18 +32,6 @@ def get_call_from_func_element(func):
         return None
 
 
-def make_calls(lines):
-    calls = []
-    for tree in lines:
-        for element in ast.walk(tree):
-            if type(element) != ast.Call:
-                continue
-            call = get_call_from_func_element(element.func)
-            if call:
-                calls.append(call)
-    return calls
-
-
 def process_assign(element):
     if type(element.value) != ast.Call:
         return []
@@ -72,19 +62,56 @@ def process_import(element):
     return ret
 
 
-def make_local_variables(lines, parent):
-    variables = []
-    for tree in lines:
-        for element in ast.walk(tree):
-            if type(element) == ast.Assign:
-                variables += process_assign(element)
-            if type(element) in (ast.Import, ast.ImportFrom):
-                variables += process_import(element)
-    if parent.group_type == GROUP_TYPE.CLASS:
-        variables.append(Variable('self', parent, lines[0].lineno))
+class Scope():
 
-    variables = list(filter(None, variables))
-    return variables
+    def __init__(self, tree):
+        self.tree = tree
+        self.calls = []
+        self.variables = []
+        self.node_scopes = []
+        self.subgroup_scopes = []
+        self.skipped_functions = set()
+
+
+def visit_body(scope, lines):
+    for tree in lines:
+        todo = collections.deque([tree])
+        while todo:
+            element = todo.popleft()
+            todo.extend(ast.iter_child_nodes(element))
+            element_type = type(element)
+            if element_type == ast.Call:
+                call = get_call_from_func_element(element.func)
+                if call:
+                    scope.calls.append(call)
+            elif element_type == ast.Assign:
+                scope.variables += process_assign(element)
+            elif element_type in (ast.Import, ast.ImportFrom):
+                scope.variables += process_import(element)
+
+
+def visit_namespace(scope, lines, in_class=False, limit_params=None, namespace_tokens=()):
+    for el in lines:
+        if type(el) in (ast.FunctionDef, ast.AsyncFunctionDef):
+            if limit_params and not limit_params.keeps_node(el.name, namespace_tokens):
+                scope.skipped_functions.add(el.name)
+                continue
+            node_scope = Scope(el)
+            visit_body(node_scope, el.body)
+            scope.node_scopes.append(node_scope)
+        elif type(el) == ast.ClassDef:
+            subgroup_scope = Scope(el)
+            subgroup_scope.skipped_functions = scope.skipped_functions
+            class_tokens = (el.name,) + namespace_tokens
+            if not in_class and \
+               (not limit_params or limit_params.keeps_namespace(class_tokens)):
+                visit_namespace(subgroup_scope, el.body, in_class=True,
+                                limit_params=limit_params, namespace_tokens=class_tokens)
+            scope.subgroup_scopes.append(subgroup_scope)
+        elif getattr(el, 'body', None):
+            visit_namespace(scope, el.body, in_class, limit_params, namespace_tokens)
+        elif not in_class:
+            visit_body(scope, [el])
 
 
 def get_inherits(tree):
@@ -97,7 +124,9 @@ class Python(BaseLanguage):
         pass
 
     @staticmethod
-    def get_tree(filename, _):
+    def get_tree(filename, _, raw=None):
+        if raw is not None:
+            return ast.parse(raw)
         try:
             with open(filename) as f:
                 raw = f.read()
@@ -107,71 +136,60 @@ class Python(BaseLanguage):
         return ast.parse(raw)
 
     @staticmethod
-    def separate_namespaces(tree):
-        groups = []
-        nodes = []
-        body = []
-        for el in tree.body:
-            if type(el) in (ast.FunctionDef, ast.AsyncFunctionDef):
-                nodes.append(el)
-            elif type(el) == ast.ClassDef:
-                groups.append(el)
-            elif getattr(el, 'body', None):
-                tup = Python.separate_namespaces(el)
-                groups += tup[0]
-                nodes += tup[1]
-                body += tup[2]
-            else:
-                body.append(el)
-        return groups, nodes, body
+    def separate_namespaces(tree, limit_params=None, namespace_tokens=()):
+        scope = Scope(tree)
+        visit_namespace(scope, tree.body, limit_params=limit_params,
+                        namespace_tokens=namespace_tokens)
+        return scope.subgroup_scopes, scope.node_scopes, scope
 
     @staticmethod
-    def make_nodes(tree, parent):
+    def make_nodes(scope, parent):
+        tree = scope.tree
         token = tree.name
         line_number = tree.lineno
-        calls = make_calls(tree.body)
-        variables = make_local_variables(tree.body, parent)
+        calls = scope.calls
+        variables = scope.variables
         is_constructor = False
-        if parent.group_type == GROUP_TYPE.CLASS and token in ['__init__', '__new__']:
-            is_constructor = True
+        if parent.group_type == GROUP_TYPE.CLASS:
+            variables.append(Variable('self', parent, tree.body[0].lineno))
+            if token in ['__init__', '__new__']:
+                is_constructor = True
 
         import_tokens = []
         if parent.group_type == GROUP_TYPE.FILE:
-            import_tokens = [djoin(parent.token, token)]
+            import_tokens = [sys.intern(djoin(parent.token, token))]
 
         return [Node(token, calls, variables, parent, import_tokens=import_tokens,
                      line_number=line_number, is_constructor=is_constructor)]
 
     @staticmethod
-    def make_root_node(lines, parent):
+    def make_root_node(scope, parent):
         token = "(global)"
         line_number = 0
-        calls = make_calls(lines)
-        variables = make_local_variables(lines, parent)
-        return Node(token, calls, variables, line_number=line_number, parent=parent)
+        return Node(token, scope.calls, scope.variables, line_number=line_number, parent=parent)
 
     @staticmethod
-    def make_class_group(tree, parent):
+    def make_class_group(scope, parent):
+        tree = scope.tree
         assert type(tree) == ast.ClassDef
-        subgroup_trees, node_trees, body_trees = Python.separate_namespaces(tree)
 
         group_type = GROUP_TYPE.CLASS
         token = tree.name
         display_name = 'Class'
         line_number = tree.lineno
 
-        import_tokens = [djoin(parent.token, token)]
+        import_tokens = [sys.intern(djoin(parent.token, token))]
         inherits = get_inherits(tree)
 
         class_group = Group(token, group_type, display_name, import_tokens=import_tokens,
                             inherits=inherits, line_number=line_number, parent=parent)
 
-        for node_tree in node_trees:
-            class_group.add_node(Python.make_nodes(node_tree, parent=class_group)[0])
+        for node_scope in scope.node_scopes:
+            class_group.add_node(Python.make_nodes(node_scope, parent=class_group)[0])
 
-        for subgroup_tree in subgroup_trees:
+        for subgroup_scope in scope.subgroup_scopes:
             logging.warning("CodeToSchemas does not support nested classes. Skipping %r in %r.",
-                            subgroup_tree.name, parent.token)
+                            subgroup_scope.tree.name, parent.token)
         return class_group
 
     @staticmethod
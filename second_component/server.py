@@ -0,0 +1,86 @@
+import http.server
+import logging
+import os
+import socketserver
+import stat
+import urllib.parse
+
+DEFAULT_HOST = '127.0.0.1'
+UNIX_PREFIX = 'unix:'
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = 'CodeToSchemas'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            status, content_type, body = self.server.graph_handler(url.path, query)
+        except Exception as ex:
+            logging.exception("Failed to answer %r.", self.path)
+            status, content_type, body = 500, 'text/plain', "Internal error: %r\n" % ex
+
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type + '; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("%s", format % args)
+
+
+def parse_address(address):
+    if address.startswith(UNIX_PREFIX):
+        path = address[len(UNIX_PREFIX):]
+        assert path, "A unix socket address needs a path, e.g. unix:/tmp/CodeToSchemas.sock."
+        return path
+    host, _, port = str(address).rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise AssertionError("Serve address must be [host:]port or unix:/path/to.sock. "
+                             "Got %r." % address)
+    return (host or DEFAULT_HOST, port)
+
+
+def make_server(address, graph_handler):
+    server_address = parse_address(address)
+    if isinstance(server_address, str):
+        try:
+            mode = os.stat(server_address).st_mode
+        except FileNotFoundError:
+            mode = None
+        if mode is not None:
+            if not stat.S_ISSOCK(mode):
+                raise AssertionError("%r exists and is not a socket. Refusing to replace it."
+                                     % server_address)
+            os.remove(server_address)
+        server = _UnixHTTPServer(server_address, _RequestHandler)
+    else:
+        server = http.server.ThreadingHTTPServer(server_address, _RequestHandler)
+        server.daemon_threads = True
+    server.graph_handler = graph_handler
+    return server
+
+
+def serve(address, graph_handler):
+    server = make_server(address, graph_handler)
+    logging.info("Serving graph requests on %s. Press Ctrl+C to stop.", address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopped serving.")
+    finally:
+        server.server_close()
+        if isinstance(server.server_address, str):
+            try:
+                os.remove(server.server_address)
+            except OSError:
+                pass
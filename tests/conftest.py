@@ -0,0 +1,41 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from second_component.engine import LanguageParams, map_it  # noqa: E402
+
+
+@pytest.fixture
+def make_tree(tmp_path):
+    def make(files, root=None):
+        root = root or tmp_path / 'src'
+        for rel_path, content in files.items():
+            path = root / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(textwrap.dedent(content))
+        return root
+    return make
+
+
+@pytest.fixture
+def build_graph():
+    def build(root, no_trimming=True, exclude_namespaces=(), exclude_functions=(),
+              include_only_namespaces=(), include_only_functions=(), **kwargs):
+        sources = sorted(str(p) for p in root.rglob('*.py'))
+        return map_it(sources, 'py', no_trimming, list(exclude_namespaces),
+                      list(exclude_functions), list(include_only_namespaces),
+                      list(include_only_functions), False, LanguageParams(), **kwargs)
+    return build
+
+
+def edge_names(edges):
+    return sorted((edge.node0.name(), edge.node1.name()) for edge in edges)
+
+
+@pytest.fixture
+def names():
+    return edge_names
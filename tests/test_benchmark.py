@@ -0,0 +1,93 @@
+import ast
+import json
+
+from second_component import benchmark
+from second_component.benchmark import (DEFAULT_BASELINE, CodebaseParams, compare_to_baseline,
+                                        generate_codebase, run_benchmarks)
+from second_component.engine import ImportIndex, LanguageParams, get_sources_and_language, map_it
+from second_component.model import OWNER_CONST
+
+
+def test_generated_codebase_parses(tmp_path):
+    params = CodebaseParams(num_files=12, seed=1)
+    generate_codebase(str(tmp_path), params)
+    sources = sorted(tmp_path.rglob('*.py'))
+    assert len(sources) == 13
+    assert (tmp_path / 'pkg_0' / '__init__.py') in sources
+    for source in sources:
+        ast.parse(source.read_text())
+
+
+def test_repeats_filter_the_full_graph(tmp_path, monkeypatch):
+    params = CodebaseParams(num_files=10)
+    generate_codebase(str(tmp_path), params)
+    group_sizes = []
+    filter_for_subset = benchmark._filter_for_subset
+
+    def recording_filter(subset_params, all_nodes, edges, file_groups):
+        group_sizes.append(sum(len(g.all_nodes()) for g in file_groups))
+        return filter_for_subset(subset_params, all_nodes, edges, file_groups)
+
+    monkeypatch.setattr(benchmark, '_filter_for_subset', recording_filter)
+    results = run_benchmarks(str(tmp_path), params, repeat=3, memory=False)
+    assert len(group_sizes) == 3
+    assert len(set(group_sizes)) == 1
+    filtered = results['benchmarks']['filter_for_subset']
+    assert 0 < filtered['nodes'] < group_sizes[0]
+    assert filtered['target'].startswith('func_')
+    assert results['benchmarks']['map_it']['files'] == 11
+
+
+def test_compare_to_baseline():
+    baseline = {'codebase': {}, 'benchmarks': {
+        'map_it': {'min_seconds': 1.0, 'peak_memory_bytes': 100},
+        'write_file': {'min_seconds': 1.0}}}
+    results = {'codebase': {}, 'benchmarks': {
+        'map_it': {'min_seconds': 1.05, 'peak_memory_bytes': 150},
+        'write_file': {'min_seconds': 2.0},
+        'generate_json': {'min_seconds': 1.0}}}
+    assert compare_to_baseline(results, baseline) == [
+        ('map_it', 'peak_memory_bytes', 100, 150),
+        ('write_file', 'min_seconds', 1.0, 2.0)]
+    assert compare_to_baseline(results, baseline, threshold=1.5) == []
+
+
+def test_package_imports_resolve_through_the_import_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, 'FILES_PER_PACKAGE', 4)
+    generate_codebase(str(tmp_path), CodebaseParams(num_files=12, seed=2))
+    assert len(list(tmp_path.glob('pkg_*/__init__.py'))) == 3
+    sources, _ = get_sources_and_language([str(tmp_path)], 'py')
+
+    import_index_hits = []
+    resolve_variables = ImportIndex.resolve_variables
+
+    def recording_resolve(self, node):
+        imports = [v for v in node.variables if isinstance(v.points_to, str)]
+        resolve_variables(self, node)
+        import_index_hits.extend(v.points_to != OWNER_CONST.UNKNOWN_MODULE for v in imports)
+
+    monkeypatch.setattr(ImportIndex, 'resolve_variables', recording_resolve)
+    _, all_nodes, edges = map_it(sources, 'py', False, [], [], [], [], False, LanguageParams())
+    assert import_index_hits.count(True) > import_index_hits.count(False) > 0
+    runners = [e.node1.token for e in edges if e.node0.token == 'run_package_1']
+    assert sorted(runners) == ['func_4_0', 'func_5_0', 'func_6_0', 'func_7_0']
+
+
+def test_subsets_are_skipped_without_functions(tmp_path):
+    params = CodebaseParams(num_files=3, functions_per_file=0)
+    generate_codebase(str(tmp_path), params)
+    results = run_benchmarks(str(tmp_path), params, repeat=1, memory=False)
+    assert 'filter_for_subset' not in results['benchmarks']
+
+
+def test_default_baseline_covers_the_default_codebase(tmp_path, caplog):
+    with open(DEFAULT_BASELINE) as f:
+        baseline = json.load(f)
+    assert baseline['codebase'] == CodebaseParams().to_dict()
+    assert set(baseline['benchmarks']) >= {'map_it', 'map_it_memory', 'filter_for_subset'}
+
+    output = str(tmp_path / 'results.json')
+    assert benchmark.main(['--files', '3', '--repeat', '1', '--no-memory', '-o', output]) == 0
+    assert 'only covers the default codebase' in caplog.text
+    assert benchmark.main(['--files', '3', '--repeat', '1', '--no-memory', '-o', output,
+                           '--baseline', output, '--threshold', '100']) == 0
@@ -0,0 +1,164 @@
+import os
+
+import pytest
+
+from second_component import binary
+from second_component.binary import GraphReader, LabeledNode, write_graph
+from second_component.engine import StubNode, _write_output
+from second_component.model import Node
+
+FILES = {
+    'a.py': '''
+        import b
+
+        class Runner():
+            def __init__(self):
+                pass
+
+            def run(self):
+                b.helper()
+                b.helper()
+
+        def main():
+            Runner().run()
+    ''',
+    'b.py': '''
+        def helper():
+            pass
+    ''',
+}
+
+
+@pytest.fixture
+def graph(make_tree, build_graph):
+    return build_graph(make_tree(FILES))
+
+
+def _write(path, groups, nodes, edges):
+    with open(path, 'wb') as f:
+        write_graph(f, groups, nodes, edges)
+    return str(path)
+
+
+def _groups(group):
+    return (group.uid, group.token, group.group_type, group.display_type, group.line_number,
+            group.parent.uid if group.parent else None,
+            [node.uid for node in group.nodes], [_groups(g) for g in group.subgroups])
+
+
+def _edge(edge):
+    return (edge.node0.uid, edge.node1.uid, edge.count(), edge.line_numbers)
+
+
+def _node(node):
+    return (node.uid, node.token, node.name(), node.label(), node.line_number,
+            node.is_constructor, node.is_leaf, node.is_trunk)
+
+
+def test_round_trip(tmp_path, graph):
+    file_groups, all_nodes, edges = graph
+    path = _write(tmp_path / 'out.cgb', file_groups, all_nodes, edges)
+
+    with GraphReader(path) as reader:
+        assert (reader.num_nodes, reader.num_edges) == (len(all_nodes), len(edges))
+        assert [_groups(g) for g in reader.file_groups()] == [_groups(g) for g in file_groups]
+        nodes = list(reader.nodes())
+        assert sorted(map(_node, nodes)) == sorted(map(_node, all_nodes))
+        assert all(type(node) is Node for node in nodes)
+        assert sorted(map(_edge, reader.edges())) == sorted(map(_edge, edges))
+        assert max(edge.count() for edge in reader.edges()) == 2
+        a = next(g for g in reader.file_groups() if g.token == 'a')
+        runner, = a.subgroups
+        assert runner.root_node is None
+        assert a.root_node.token == '(global)'
+
+
+def test_trimmed_nodes_are_left_out(tmp_path, graph):
+    file_groups, all_nodes, edges = graph
+    kept = [node for node in all_nodes if node.token != 'main']
+    kept_edges = [e for e in edges if e.node0 in kept and e.node1 in kept]
+    path = _write(tmp_path / 'out.cgb', file_groups, kept, kept_edges)
+
+    with GraphReader(path) as reader:
+        assert sorted(n.name() for n in reader.nodes()) == sorted(n.name() for n in kept)
+
+
+def test_labeled_nodes(tmp_path, graph):
+    file_groups, all_nodes, _ = graph
+    helper = next(node for node in all_nodes if node.token == 'helper')
+    a, _ = file_groups
+    stub = StubNode(helper, 'b', 'b.svg')
+    path = _write(tmp_path / 'out.cgb', [a], list(a.all_nodes()) + [stub], [])
+
+    with GraphReader(path) as reader:
+        nodes = {node.uid: node for node in reader.nodes()}
+        assert type(nodes[stub.uid]) is LabeledNode
+        assert (nodes[stub.uid].name(), nodes[stub.uid].label()) == ('b::helper', 'b: b::helper')
+        assert nodes[stub.uid].parent is None
+        assert all(type(node) is Node for uid, node in nodes.items() if uid != stub.uid)
+
+    path = _write(tmp_path / 'out.cgb', [a], list(a.all_nodes()) + [helper], [])
+    with GraphReader(path) as reader:
+        detached = next(node for node in reader.nodes() if node.uid == helper.uid)
+        assert type(detached) is LabeledNode
+        assert (detached.name(), detached.parent) == ('b::helper', None)
+
+
+def test_weights_without_line_numbers(tmp_path, graph):
+    file_groups, all_nodes, edges = graph
+    with_lines = _write(tmp_path / 'lines.cgb', file_groups, all_nodes, edges)
+    path = str(tmp_path / 'out.cgb')
+    with open(path, 'wb') as f:
+        write_graph(f, file_groups, all_nodes, edges, line_numbers=False)
+    assert os.path.getsize(path) < os.path.getsize(with_lines)
+
+    with GraphReader(path) as reader:
+        assert sorted((e.node0.uid, e.node1.uid, e.count()) for e in reader.edges()) == \
+            sorted((e.node0.uid, e.node1.uid, e.count()) for e in edges)
+        assert all(edge.to_dict()['lines'] == [] for edge in reader.edges())
+
+
+def test_unweighted_edges(tmp_path, make_tree, build_graph):
+    file_groups, all_nodes, edges = build_graph(make_tree(FILES), keep_duplicate_edges=True)
+    path = _write(tmp_path / 'out.cgb', file_groups, all_nodes, edges)
+    with GraphReader(path) as reader:
+        assert sorted(map(_edge, reader.edges())) == \
+            sorted((e.node0.uid, e.node1.uid, 1, []) for e in edges)
+
+
+def test_write_output(tmp_path, graph):
+    file_groups, all_nodes, edges = graph
+    path = str(tmp_path / 'out.cgb')
+    _write_output(path, 'cgb', file_groups, all_nodes, edges, True, False, None)
+    with GraphReader(path) as reader:
+        assert reader.num_edges == len(edges)
+
+
+def test_bad_files(tmp_path):
+    path = tmp_path / 'bad.cgb'
+    path.write_bytes(b'not a graph at all, just some text')
+    with pytest.raises(AssertionError, match='is not a binary graph file'):
+        GraphReader(str(path))
+
+    path.write_bytes(b'')
+    with pytest.raises(AssertionError, match='is not a binary graph file'):
+        GraphReader(str(path))
+
+    path.write_bytes(binary.HEADER.pack(binary.MAGIC, binary.FORMAT_VERSION + 1, 0, 0, 0, 0, 0, 0))
+    with pytest.raises(AssertionError, match='Expected version %d' % binary.FORMAT_VERSION):
+        GraphReader(str(path))
+
+
+def test_header(tmp_path, graph):
+    file_groups, all_nodes, edges = graph
+    path = _write(tmp_path / 'out.cgb', file_groups, all_nodes, edges)
+    with open(path, 'rb') as f:
+        header = binary.HEADER.unpack(f.read(binary.HEADER.size))
+    assert header[:2] == (binary.MAGIC, binary.FORMAT_VERSION)
+    assert header[4:] == (len(list(_all_groups(file_groups))), len(all_nodes), len(edges),
+                          sum(len(edge.line_numbers) for edge in edges))
+
+
+def _all_groups(file_groups):
+    for file_group in file_groups:
+        yield from file_group.all_groups()
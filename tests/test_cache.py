@@ -0,0 +1,124 @@
+import builtins
+import os
+import stat
+
+import pytest
+
+from second_component import python
+from second_component.cache import KEY_FILE, FileGroupCache
+from second_component.engine import VERSION, LanguageParams, _make_file_group_for_source
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FileGroupCache(str(tmp_path / 'cache'), VERSION)
+
+
+def make_group(source, cache=None, skip_parse_errors=False):
+    return _make_file_group_for_source(str(source), 'py', LanguageParams(), skip_parse_errors,
+                                       cache=cache)[0]
+
+
+def test_cache_hit_skips_parsing(tmp_path, cache, monkeypatch):
+    source = tmp_path / 'a.py'
+    source.write_text('def f():\n    g()\n')
+    first = make_group(source, cache)
+
+    def fail(*args):
+        raise AssertionError("parsed a cached file")
+    monkeypatch.setattr(python.Python, 'get_tree', staticmethod(fail))
+    cached = make_group(source, cache)
+    assert [n.uid for n in cached.all_nodes()] == [n.uid for n in first.all_nodes()]
+
+
+def test_changed_content_misses(tmp_path, cache):
+    source = tmp_path / 'a.py'
+    source.write_text('def f():\n    pass\n')
+    make_group(source, cache)
+    source.write_text('def f():\n    pass\n\ndef g():\n    pass\n')
+    assert sorted(n.token for n in make_group(source, cache).all_nodes()) == \
+        ['(global)', 'f', 'g']
+
+
+def test_unreadable_file_is_skipped(tmp_path, cache):
+    missing = tmp_path / 'missing.py'
+    assert make_group(missing, cache, skip_parse_errors=True) is None
+    with pytest.raises(OSError):
+        make_group(missing, cache)
+
+
+def test_source_is_read_once(tmp_path, cache, monkeypatch):
+    source = tmp_path / 'a.py'
+    source.write_text('def f():\n    pass\n')
+    opened = []
+    real_open = builtins.open
+
+    def counting_open(path, *args, **kwargs):
+        if str(path) == str(source):
+            opened.append(path)
+        return real_open(path, *args, **kwargs)
+    monkeypatch.setattr(builtins, 'open', counting_open)
+    make_group(source, cache)
+    assert len(opened) == 1
+
+
+def test_eviction_keeps_the_cache_under_its_limit(tmp_path):
+    cache = FileGroupCache(str(tmp_path / 'cache'), VERSION, max_size_mb=0.001)
+    for i in range(10):
+        cache.put(cache.key('f%d.py' % i, b'x'), list(range(200)))
+    assert cache.evict() > 0
+    assert cache.get(cache.key('f9.py', b'x')) is not None
+
+
+def test_entries_are_signed(tmp_path, cache, caplog):
+    key = cache.key('a.py', b'x')
+    cache.put(key, ['group'])
+    path = os.path.join(cache.cache_dir, key + '.pickle')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-1] + bytes([data[-1] ^ 1]))
+    assert cache.get(key) is None
+    assert 'not written by this cache' in caplog.text
+
+    other = FileGroupCache(str(tmp_path / 'other'), VERSION)
+    other.put(key, ['group'])
+    os.replace(os.path.join(other.cache_dir, key + '.pickle'), path)
+    assert cache.get(key) is None
+    assert FileGroupCache(cache.cache_dir, VERSION).get(key) is None
+
+
+def test_key_file_is_private(cache):
+    mode = stat.S_IMODE(os.stat(os.path.join(cache.cache_dir, KEY_FILE)).st_mode)
+    assert mode == 0o600
+    assert FileGroupCache(cache.cache_dir, VERSION).secret == cache.secret
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='needs POSIX ownership')
+def test_shared_cache_dirs_are_refused(tmp_path, cache):
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(AssertionError, match='not writable by group or others'):
+        FileGroupCache(str(shared), VERSION)
+
+    key_path = os.path.join(cache.cache_dir, KEY_FILE)
+    os.chmod(key_path, 0o644)
+    with pytest.raises(AssertionError, match='not accessible to group or others'):
+        FileGroupCache(cache.cache_dir, VERSION)
+    os.chmod(key_path, 0o600)
+
+    key = cache.key('a.py', b'x')
+    cache.put(key, ['group'])
+    os.chmod(os.path.join(cache.cache_dir, key + '.pickle'), 0o666)
+    assert cache.get(key) is None
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid') or os.getuid() != 0,
+                    reason='needs root to hand files to another user')
+def test_foreign_cache_dirs_are_refused(tmp_path):
+    foreign = tmp_path / 'foreign'
+    foreign.mkdir()
+    os.chown(str(foreign), 12345, -1)
+    with pytest.raises(AssertionError, match='owned by the current user'):
+        FileGroupCache(str(foreign), VERSION)
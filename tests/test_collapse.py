@@ -0,0 +1,68 @@
+import pytest
+
+from second_component import engine
+from second_component.engine import GroupNode, WeightedEdge, _collapse_graph
+
+FILES = {
+    'a.py': '''
+        import b
+
+        def main():
+            Store()
+            b.load()
+            b.load()
+            helper()
+
+        def helper():
+            pass
+
+        class Store():
+            def __init__(self):
+                self.save()
+
+            def save(self):
+                b.load()
+    ''',
+    'b.py': '''
+        def load():
+            pass
+    ''',
+}
+
+
+@pytest.fixture
+def graph(make_tree, build_graph):
+    return build_graph(make_tree(FILES), no_trimming=False)
+
+
+def _edges(edges):
+    return sorted((e.node0.name(), e.node1.name(), e.count()) for e in edges)
+
+
+def test_collapse_to_files(graph):
+    groups, nodes, edges = _collapse_graph(*graph, 'file')
+    assert groups == []
+    assert sorted((n.name(), n.num_functions) for n in nodes) == [('a', 4), ('b', 1)]
+    assert _edges(edges) == [('a', 'b', 3)]
+    assert all(isinstance(edge, WeightedEdge) for edge in edges)
+
+
+def test_collapse_to_classes(graph):
+    file_groups, _, _ = graph
+    groups, nodes, edges = _collapse_graph(*graph, 'class')
+    assert [(g.token, g.uid) for g in groups] == [(g.token, g.uid) for g in file_groups]
+    assert [[n.name() for n in g.nodes] for g in groups] == [['a', 'a::Store'], ['b']]
+    assert _edges(edges) == [('a', 'a::Store', 1), ('a', 'b', 2), ('a::Store', 'b', 1)]
+    store = next(n for n in nodes if n.name() == 'a::Store')
+    assert isinstance(store, GroupNode)
+    assert store.label() == 'Class: Store (2 functions)'
+    assert store.to_dict()['functions'] == 2
+    assert store.uid.startswith('node_')
+
+
+def test_auto_collapse(graph, monkeypatch):
+    assert _collapse_graph(*graph, 'auto') == graph
+    monkeypatch.setattr(engine, 'COLLAPSE_MAX_NODES', 3)
+    assert [n.name() for n in _collapse_graph(*graph, 'auto')[1]] == ['a', 'a::Store', 'b']
+    monkeypatch.setattr(engine, 'COLLAPSE_MAX_NODES', 2)
+    assert [n.name() for n in _collapse_graph(*graph, 'auto')[1]] == ['a', 'b']
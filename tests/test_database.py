@@ -0,0 +1,116 @@
+import sqlite3
+
+import pytest
+
+from second_component import database
+from second_component.database import run_key, write_database
+
+FILES = {
+    'a.py': '''
+        import b
+
+        def main():
+            b.helper()
+    ''',
+    'b.py': '''
+        def helper():
+            pass
+    ''',
+    'c.py': '''
+        def other():
+            pass
+
+        def caller():
+            other()
+    ''',
+}
+
+
+def _rows(path, query):
+    connection = sqlite3.connect(path)
+    try:
+        return sorted(connection.execute(query))
+    finally:
+        connection.close()
+
+
+def _file_names(path):
+    return sorted(p.rsplit('/', 1)[-1] for p, in _rows(path, 'SELECT path FROM files'))
+
+
+def _edges(path):
+    return _rows(path, 'SELECT s.name, t.name FROM edges '
+                       'JOIN nodes s ON s.id = source_id JOIN nodes t ON t.id = target_id')
+
+
+def test_write_and_update(tmp_path, make_tree, build_graph):
+    root = make_tree(FILES)
+    path = str(tmp_path / 'out.sqlite')
+    run = run_key([str(root)])
+
+    stats = write_database(path, *build_graph(root), run=run)
+    assert (stats['changed_files'], stats['unchanged_files']) == (3, 0)
+    assert _file_names(path) == ['a.py', 'b.py', 'c.py']
+    assert _edges(path) == [('a::main', 'b::helper'), ('c::caller', 'c::other')]
+
+    stats = write_database(path, *build_graph(root), run=run)
+    assert (stats['changed_files'], stats['unchanged_files'], stats['removed_files']) == (0, 3, 0)
+
+    (root / 'b.py').write_text('def helper():\n    pass\n\ndef extra():\n    pass\n')
+    stats = write_database(path, *build_graph(root), run=run)
+    assert (stats['changed_files'], stats['unchanged_files']) == (1, 2)
+    assert _edges(path) == [('a::main', 'b::helper'), ('c::caller', 'c::other')]
+
+
+def test_deleted_files_are_removed(tmp_path, make_tree, build_graph):
+    root = make_tree(FILES)
+    path = str(tmp_path / 'out.sqlite')
+    write_database(path, *build_graph(root))
+
+    (root / 'c.py').unlink()
+    stats = write_database(path, *build_graph(root))
+    assert stats['removed_files'] == 1
+    assert _file_names(path) == ['a.py', 'b.py']
+    assert _edges(path) == [('a::main', 'b::helper')]
+
+
+def test_files_left_out_of_a_run_are_removed(tmp_path, make_tree, build_graph):
+    root = make_tree(FILES)
+    path = str(tmp_path / 'out.sqlite')
+    run = run_key([str(root)])
+    write_database(path, *build_graph(root), run=run)
+
+    stats = write_database(path, *build_graph(root, exclude_namespaces=['c']), run=run)
+    assert stats['removed_files'] == 1
+    assert _file_names(path) == ['a.py', 'b.py']
+    assert _edges(path) == [('a::main', 'b::helper')]
+
+
+def test_other_runs_are_kept(tmp_path, make_tree, build_graph):
+    root = make_tree(FILES)
+    other_root = make_tree({'d.py': 'def solo():\n    solo()\n'}, root=tmp_path / 'other')
+    path = str(tmp_path / 'out.sqlite')
+    write_database(path, *build_graph(root), run=run_key([str(root)]))
+
+    stats = write_database(path, *build_graph(other_root), run=run_key([str(other_root)]))
+    assert stats['removed_files'] == 0
+    assert _file_names(path) == ['a.py', 'b.py', 'c.py', 'd.py']
+
+
+def test_edge_line_numbers():
+    class Edge():
+        line_numbers = {4, None, 2}
+    assert database._edge_line_numbers(Edge()) == '[2, 4]'
+
+
+def test_schema_versions(tmp_path, make_tree, build_graph):
+    root = make_tree(FILES)
+    path = str(tmp_path / 'out.sqlite')
+    write_database(path, *build_graph(root))
+    assert _rows(path, 'PRAGMA user_version') == [(database.SCHEMA_VERSION,)]
+
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA user_version = 99')
+    connection.close()
+    with pytest.raises(AssertionError, match='schema version 99'):
+        write_database(path, *build_graph(root))
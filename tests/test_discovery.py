@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from second_component.discovery import IgnoreRules, SourceFinder, read_file_list
+from second_component.engine import get_sources_and_language
+
+FILES = {
+    'app.py': '',
+    'notes.txt': '',
+    'pkg/mod.py': '',
+    'pkg/generated_pb2.py': '',
+    'pkg/keep_pb2.py': '',
+    'build/out.py': '',
+    'docs/conf.py': '',
+    'node_modules/dep/index.py': '',
+    '.git/hooks/hook.py': '',
+    'venv/pyvenv.cfg': '',
+    'venv/lib/site.py': '',
+    '.gitignore': '''
+        build/
+        *_pb2.py
+        !keep_pb2.py
+    ''',
+}
+
+
+@pytest.fixture
+def root(make_tree):
+    return make_tree(FILES)
+
+
+def _found(root, source_finder):
+    return sorted(os.path.relpath(path, root) for path, _ in source_finder.find([str(root)]))
+
+
+def test_gitignore_and_pruned_dirs(root):
+    assert _found(root, SourceFinder()) == [
+        '.gitignore', 'app.py', 'docs/conf.py', 'notes.txt', 'pkg/keep_pb2.py', 'pkg/mod.py']
+
+
+def test_without_gitignore(root):
+    assert _found(root, SourceFinder(use_gitignore=False)) == [
+        '.gitignore', 'app.py', 'build/out.py', 'docs/conf.py', 'notes.txt',
+        'pkg/generated_pb2.py', 'pkg/keep_pb2.py', 'pkg/mod.py']
+
+
+def test_exclude_paths(root):
+    assert _found(root, SourceFinder(exclude_paths=['docs', '*.txt', '.gitignore'])) == [
+        'app.py', 'pkg/keep_pb2.py', 'pkg/mod.py']
+
+
+def test_nested_gitignore_is_relative_to_its_directory(root):
+    (root / 'pkg' / '.gitignore').write_text('/mod.py\n')
+    (root / 'docs' / 'mod.py').write_text('')
+    assert 'pkg/mod.py' not in _found(root, SourceFinder())
+    assert 'docs/mod.py' in _found(root, SourceFinder())
+
+
+def test_explicit_files_skip_the_language_filter(root):
+    sources, language = get_sources_and_language([str(root), str(root / 'notes.txt')], None)
+    assert language == 'py'
+    assert sorted(os.path.relpath(s, root) for s in sources) == [
+        'app.py', 'docs/conf.py', 'notes.txt', 'pkg/keep_pb2.py', 'pkg/mod.py']
+
+
+def test_file_list(tmp_path):
+    file_list = tmp_path / 'files'
+    file_list.write_bytes(b'a.py\0pkg/b.py\0.git/c.py\0docs/d.py\0')
+    assert read_file_list(str(file_list)) == ['a.py', 'pkg/b.py', '.git/c.py', 'docs/d.py']
+    finder = SourceFinder(exclude_paths=['docs'], file_list=str(file_list))
+    assert finder.find([]) == [('a.py', False), (os.path.join('pkg', 'b.py'), False)]
+
+    file_list.write_bytes(b'a.py\r\npkg/b.py\n\n')
+    assert read_file_list(str(file_list)) == ['a.py', 'pkg/b.py']
+
+
+@pytest.mark.parametrize('pattern, path, is_dir, ignored', [
+    ('*.py', 'a/b.py', False, True),
+    ('/b.py', 'a/b.py', False, False),
+    ('a/*.py', 'a/b.py', False, True),
+    ('a/**/c.py', 'a/x/y/c.py', False, True),
+    ('build/', 'build', False, False),
+    ('build/', 'build', True, True),
+    ('[!a]*.py', 'b.py', False, True),
+    ('[!a]*.py', 'a.py', False, False),
+    ('\\#name', '#name', False, True),
+])
+def test_ignore_patterns(pattern, path, is_dir, ignored):
+    assert IgnoreRules().extended(None, [pattern]).ignored(path, is_dir) is ignored
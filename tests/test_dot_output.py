@@ -0,0 +1,70 @@
+import io
+
+import pytest
+
+from second_component.engine import LEGEND, generate_dot, write_chunks, write_file
+
+FILES = {
+    'a.py': '''
+        class Worker():
+            def run(self):
+                step()
+
+        def step():
+            pass
+
+        def main():
+            Worker().run()
+    ''',
+}
+
+
+@pytest.fixture
+def graph(make_tree, build_graph):
+    return build_graph(make_tree(FILES), no_trimming=False)
+
+
+class CountingWriter(io.StringIO):
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+def test_write_chunks_buffers_writes():
+    outfile = CountingWriter()
+    write_chunks(outfile, ['x' * 10] * 100, buffer_size=250)
+    assert outfile.getvalue() == 'x' * 1000
+    assert outfile.writes == 4
+
+
+def test_dot_document(graph):
+    file_groups, all_nodes, edges = graph
+    dot = ''.join(generate_dot(all_nodes, edges, file_groups))
+    assert dot.startswith('digraph G {\n') and dot.endswith('}\n')
+    assert LEGEND in dot
+    assert 'splines="ortho"' in dot
+    for node in all_nodes:
+        assert node.to_dot() + ';\n' in dot
+    for edge in edges:
+        assert edge.to_dot() + ';\n' in dot
+    assert 'subgraph cluster_' in dot
+
+
+def test_legend_and_grouping_flags(graph):
+    file_groups, all_nodes, edges = graph
+    dot = ''.join(generate_dot(all_nodes, edges, file_groups, hide_legend=True,
+                               no_grouping=True))
+    assert LEGEND not in dot
+    assert 'subgraph' not in dot
+
+
+def test_write_file_streams_the_same_document(graph):
+    file_groups, all_nodes, edges = graph
+    outfile = io.StringIO()
+    write_file(outfile, all_nodes, edges, file_groups)
+    assert outfile.getvalue() == ''.join(generate_dot(all_nodes, edges, file_groups))
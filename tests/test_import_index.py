@@ -0,0 +1,72 @@
+import pytest
+
+from second_component.engine import ImportIndex
+from second_component.model import OWNER_CONST
+
+FILES = {
+    'util.py': '''
+        def load():
+            pass
+
+        class Store():
+            def __init__(self):
+                pass
+
+            def save(self):
+                pass
+    ''',
+    'app.py': '''
+        import util
+        from util import load, Store
+        from missing import thing
+
+        def main():
+            util.load()
+            load()
+            store = Store()
+            store.save()
+            thing()
+    ''',
+}
+
+
+@pytest.fixture
+def graph(make_tree, build_graph):
+    return build_graph(make_tree(FILES))
+
+
+def _variables(file_groups, node_name):
+    node = next(n for fg in file_groups for n in fg.all_nodes() if n.name() == node_name)
+    return {v.token: v.points_to for v in node.variables}
+
+
+def test_import_index_tokens(graph):
+    file_groups, _, _ = graph
+    index = ImportIndex(file_groups)
+    util = file_groups[1]
+    assert index.by_import_token['util'] is util
+    assert index.by_import_token['util.load'].name() == 'util::load'
+    assert index.by_import_token['util.Store'].token == 'Store'
+    assert index.groups_by_token['Store'] is index.by_import_token['util.Store']
+
+
+def test_variables_resolve_through_the_index(graph, names):
+    file_groups, _, edges = graph
+    variables = _variables(file_groups, 'app::(global)')
+    assert variables['util'] is file_groups[1]
+    assert variables['load'].name() == 'util::load'
+    assert variables['thing'] == OWNER_CONST.UNKNOWN_MODULE
+    assert _variables(file_groups, 'app::main')['store'].token == 'Store'
+    assert names(edges) == [
+        ('app::main', 'util::Store.__init__'),
+        ('app::main', 'util::Store.save'),
+        ('app::main', 'util::load'),
+    ]
+
+
+def test_first_definition_wins(make_tree, build_graph):
+    files = dict(FILES)
+    files['zzz/util.py'] = 'def load():\n    pass\n'
+    file_groups, _, _ = build_graph(make_tree(files))
+    index = ImportIndex(file_groups)
+    assert index.by_import_token['util.load'].first_group() is file_groups[1]
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from second_component.discovery import SourceFinder
+from second_component.engine import IncrementalMap, _poll_sources
+
+
+def canon(file_groups, all_nodes, edges):
+    groups = sorted(g.label() + repr(sorted(sg.label() for sg in g.all_groups()))
+                    for g in file_groups)
+    nodes = sorted((n.name(), n.is_leaf, n.is_trunk) for n in all_nodes)
+    return groups, nodes, sorted((e.node0.name(), e.node1.name()) for e in edges)
+
+
+@pytest.fixture
+def project(make_tree):
+    return make_tree({
+        'pkg/models.py': '''
+            class Base():
+                def save(self):
+                    validate()
+
+            def validate():
+                pass
+        ''',
+        'pkg/views.py': '''
+            from pkg.models import Base
+
+            class Page(Base):
+                def render(self):
+                    self.save()
+
+            def index():
+                Page().render()
+        ''',
+    })
+
+
+def write(path, content):
+    path.write_text(content)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def incremental_graph(incremental, project):
+    incremental.update(_poll_sources([str(project)], 'py', SourceFinder()))
+    result = canon(*incremental.graph(False))
+    incremental.restore()
+    return result
+
+
+@pytest.fixture
+def check(project, build_graph):
+    incremental = IncrementalMap('py', [], [], [], [], True, None)
+
+    def check():
+        result = incremental_graph(incremental, project)
+        assert result == canon(*build_graph(project, no_trimming=False))
+        return result
+    return check
+
+
+def test_initial_graph_matches_map_it(check):
+    assert check()[2]
+
+
+def test_append_function(project, check):
+    check()
+    write(project / 'pkg/models.py', (project / 'pkg/models.py').read_text() +
+          '\ndef audit():\n    validate()\n')
+    assert ('models::audit', 'models::validate') in check()[2]
+
+
+def test_rename_class_relinks_dependents(project, check):
+    check()
+    path = project / 'pkg/models.py'
+    write(path, path.read_text().replace('class Base', 'class Root'))
+    assert ('views::Page.render', 'models::Base.save') not in check()[2]
+    write(path, path.read_text().replace('class Root', 'class Base'))
+    assert ('views::Page.render', 'models::Base.save') in check()[2]
+
+
+def test_delete_and_create_files(project, check):
+    check()
+    os.remove(project / 'pkg/views.py')
+    check()
+    write(project / 'pkg/jobs.py', 'from pkg.models import validate\n\n'
+                                   'def run():\n    validate()\n')
+    assert ('jobs::run', 'models::validate') in check()[2]
+
+
+def test_syntax_error_keeps_the_last_good_graph(project):
+    incremental = IncrementalMap('py', [], [], [], [], False, None)
+    before = incremental_graph(incremental, project)
+    path = project / 'pkg/views.py'
+    good = path.read_text()
+    write(path, good + '\ndef broken(:\n')
+    assert incremental_graph(incremental, project) == before
+    write(path, good)
+    assert incremental_graph(incremental, project) == before
@@ -0,0 +1,74 @@
+import pytest
+
+FILES = {
+    'base.py': '''
+        class Base():
+            def ping(self):
+                pass
+
+            def pong(self):
+                pass
+    ''',
+    'mid.py': '''
+        from base import Base
+
+        class Middle(Base):
+            def pong(self):
+                pass
+    ''',
+    'leaf.py': '''
+        from mid import Middle
+
+        class Leaf(Middle):
+            def run(self):
+                self.ping()
+                self.pong()
+
+        class Other(Middle):
+            def run(self):
+                self.ping()
+    ''',
+}
+
+
+@pytest.fixture
+def graph(make_tree, build_graph):
+    return build_graph(make_tree(FILES))
+
+
+def _group(file_groups, token):
+    return next(g for fg in file_groups for g in fg.all_groups() if g.token == token)
+
+
+def test_calls_reach_indirect_bases(graph, names):
+    _, _, edges = graph
+    assert names(edges) == [
+        ('leaf::Leaf.run', 'base::Base.ping'),
+        ('leaf::Leaf.run', 'mid::Middle.pong'),
+        ('leaf::Other.run', 'base::Base.ping'),
+    ]
+
+
+def test_inheritance_chains(graph):
+    file_groups, _, _ = graph
+    leaf, other = _group(file_groups, 'Leaf'), _group(file_groups, 'Other')
+    middle, base = _group(file_groups, 'Middle'), _group(file_groups, 'Base')
+    assert [[n.token for n in nodes] for nodes in leaf.inherits] == [['pong'], ['ping', 'pong']]
+    assert leaf.inherits is other.inherits
+    assert leaf.inherits[1] is middle.inherits[0]
+    assert list(middle.inherits[0]) == list(base.nodes)
+    assert base.inherits == []
+
+
+def test_inheritance_cycles_terminate(make_tree, build_graph, names):
+    root = make_tree({'cycle.py': '''
+        class A(B):
+            def a(self):
+                self.b()
+
+        class B(A):
+            def b(self):
+                self.a()
+    '''})
+    _, _, edges = build_graph(root)
+    assert names(edges) == [('cycle::A.a', 'cycle::B.b'), ('cycle::B.b', 'cycle::A.a')]
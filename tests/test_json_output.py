@@ -0,0 +1,53 @@
+import io
+import json
+
+import pytest
+
+from second_component.engine import generate_json, write_file
+
+FILES = {
+    'a.py': '''
+        def helper():
+            pass
+
+        def main():
+            helper()
+            helper()
+    ''',
+}
+
+
+@pytest.fixture
+def graph(make_tree, build_graph):
+    return build_graph(make_tree(FILES), no_trimming=False)
+
+
+def test_json_document(graph):
+    _, all_nodes, edges = graph
+    document = json.loads(generate_json(all_nodes, edges))['graph']
+    assert document['directed'] is True
+    assert set(document['nodes']) == {n.uid for n in all_nodes}
+    assert document['nodes'][all_nodes[0].uid] == all_nodes[0].to_dict()
+    assert document['edges'] == [e.to_dict() for e in edges]
+
+
+def test_empty_json_document():
+    assert json.loads(generate_json([], [])) == \
+        {'graph': {'directed': True, 'nodes': {}, 'edges': []}}
+
+
+def test_streamed_json_matches_generate_json(graph):
+    file_groups, all_nodes, edges = graph
+    outfile = io.StringIO()
+    write_file(outfile, all_nodes, edges, file_groups, as_json=True)
+    assert outfile.getvalue() == generate_json(all_nodes, edges)
+
+
+def test_ndjson_has_one_record_per_line(graph):
+    file_groups, all_nodes, edges = graph
+    outfile = io.StringIO()
+    write_file(outfile, all_nodes, edges, file_groups, as_ndjson=True)
+    records = [json.loads(line) for line in outfile.getvalue().splitlines()]
+    assert [r['type'] for r in records] == ['node'] * len(all_nodes) + ['edge'] * len(edges)
+    assert {r['uid'] for r in records if r['type'] == 'node'} == {n.uid for n in all_nodes}
+    assert records[-1]['source'] == edges[-1].node0.uid
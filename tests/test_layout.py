@@ -0,0 +1,97 @@
+import pytest
+
+from second_component import engine, layout
+from second_component.engine import _collapse_graph, _split_layout
+from second_component.layout import connected_components, split_graph
+
+FILES = {
+    'a.py': '''
+        def run_a():
+            A()
+
+        class A():
+            def __init__(self):
+                self.go()
+
+            def go(self):
+                pass
+    ''',
+    'b.py': '''
+        def run_b():
+            B()
+
+        class B():
+            def __init__(self):
+                self.go()
+
+            def go(self):
+                pass
+    ''',
+}
+
+
+class FakeNode():
+    def __init__(self, name, group):
+        self.name = name
+        self.group = group
+
+
+class FakeEdge():
+    def __init__(self, node0, node1):
+        self.node0 = node0
+        self.node1 = node1
+
+
+def _names(pieces):
+    return [[node.name for node in piece] for piece in pieces]
+
+
+def test_connected_components():
+    a, b, c, d = [FakeNode(name, None) for name in 'abcd']
+    assert _names(connected_components([a, b, c, d], [FakeEdge(c, a), FakeEdge(d, b)])) == \
+        [['a', 'c'], ['b', 'd']]
+
+
+def test_split_graph():
+    nodes = [FakeNode('n%d' % i, 'g%d' % (i % 2)) for i in range(6)]
+    nodes.append(FakeNode('alone', 'g2'))
+    edges = [FakeEdge(nodes[i], nodes[i + 1]) for i in range(5)]
+    assert _names(split_graph(nodes, edges, lambda node: node.group, min_nodes=1)) == \
+        [['n0', 'n2', 'n4'], ['n1', 'n3', 'n5'], ['alone']]
+    assert _names(split_graph(nodes, edges, lambda node: node.group, min_nodes=4)) == \
+        [['n0', 'n2', 'n4', 'n1', 'n3', 'n5'], ['alone']]
+
+
+@pytest.fixture
+def pieces(make_tree, build_graph, monkeypatch):
+    sources = []
+
+    def layout_pieces(piece_sources, jobs=1):
+        sources.extend(source.decode('utf-8') for source in piece_sources)
+        return piece_sources
+
+    monkeypatch.setattr(engine.layout, 'split_graph',
+                        lambda nodes, edges, group_of: split_graph(nodes, edges, group_of, 1))
+    monkeypatch.setattr(engine.layout, 'layout_pieces', layout_pieces)
+    monkeypatch.setattr(engine.layout, 'pack', lambda pieces, extra_source: b''.join(pieces))
+    graph = build_graph(make_tree(FILES), no_trimming=False)
+    return graph, sources
+
+
+def test_split_layout_draws_file_clusters(pieces):
+    (file_groups, all_nodes, edges), sources = pieces
+    assert _split_layout(file_groups, all_nodes, edges, True, False, 1)
+    assert len(sources) == 2
+    for source, file_group in zip(sources, file_groups):
+        assert source.count('subgraph cluster_') == 2
+        assert 'name="%s"' % file_group.token in source
+
+
+def test_split_layout_draws_collapsed_clusters(pieces):
+    (file_groups, all_nodes, edges), sources = pieces
+    collapsed = _collapse_graph(file_groups, all_nodes, edges, 'class')
+    assert _split_layout(*collapsed, True, False, 1)
+    assert len(sources) == 2
+    for source, cluster in zip(sources, collapsed[0]):
+        assert source.count('subgraph ' + cluster.uid) == 1
+        assert source.count('subgraph cluster_') == 1
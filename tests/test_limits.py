@@ -0,0 +1,79 @@
+import logging
+
+import pytest
+
+from second_component.cache import FileGroupCache
+from second_component.engine import GraphQuery
+
+FILES = {
+    'app.py': '''
+        import util
+
+        def main():
+            util.load()
+            Store().save()
+            report()
+
+        def report():
+            pass
+
+        class Store():
+            def save(self):
+                report()
+    ''',
+    'util.py': '''
+        def load():
+            pass
+    ''',
+}
+
+LIMITS = [
+    {'exclude_namespaces': ['util']},
+    {'exclude_namespaces': ['Store']},
+    {'exclude_functions': ['report']},
+    {'include_only_namespaces': ['Store']},
+    {'include_only_functions': ['main', 'load']},
+    {'exclude_namespaces': ['util'], 'include_only_functions': ['main', 'save', 'report']},
+]
+
+
+@pytest.fixture
+def root(make_tree):
+    return make_tree(FILES)
+
+
+def _node_names(graph):
+    return sorted(node.name() for node in graph[1])
+
+
+@pytest.mark.parametrize('limits', LIMITS)
+def test_parse_time_limits_match_post_parse_limits(root, build_graph, names, limits):
+    limited = build_graph(root, no_trimming=False, **limits)
+    query = GraphQuery(*build_graph(root, no_trimming=False))
+    expected = query._limit(*[limits.get(name, []) for name in (
+        'exclude_namespaces', 'exclude_functions', 'include_only_namespaces',
+        'include_only_functions')])
+    assert _node_names(limited) == sorted(node.name() for node in expected[1])
+    assert names(limited[2]) == names(expected[2])
+
+
+def test_excluded_file_and_function(root, build_graph, names):
+    graph = build_graph(root, exclude_namespaces=['util'], exclude_functions=['save'])
+    assert _node_names(graph) == ['app::(global)', 'app::main', 'app::report']
+    assert names(graph[2]) == [('app::main', 'app::report')]
+
+
+def test_missing_limits_warn(root, build_graph, caplog):
+    with caplog.at_level(logging.WARNING):
+        build_graph(root, exclude_namespaces=['Store', 'nowhere'],
+                    exclude_functions=['report', 'missing'])
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == ["Could not exclude namespace 'nowhere' because it was not found.",
+                        "Could not exclude function 'missing' because it was not found."]
+
+
+def test_cache_is_keyed_by_limits(root, build_graph, tmp_path):
+    cache = FileGroupCache(str(tmp_path / 'cache'), 'test')
+    assert _node_names(build_graph(root, exclude_functions=['report'], cache=cache)) == \
+        ['app::(global)', 'app::Store.save', 'app::main', 'util::(global)', 'util::load']
+    assert 'app::report' in _node_names(build_graph(root, cache=cache))
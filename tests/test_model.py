@@ -0,0 +1,107 @@
+import ast
+import pickle
+import textwrap
+
+import pytest
+
+from second_component.engine import (WeightedEdge, _restore_membership, _retain_nodes,
+                                     _save_membership, make_file_group)
+from second_component.model import GROUP_TYPE, Call, Edge, Group, Node, Variable
+
+SOURCE = '''
+class Client():
+    def get(self):
+        self.request()
+'''
+
+
+def _file_group():
+    return make_file_group(ast.parse(textwrap.dedent(SOURCE)), 'client.py', 'py')
+
+
+def test_model_objects_have_no_instance_dict():
+    group = Group('mod', GROUP_TYPE.FILE, 'File')
+    node = Node('func', [Call('helper')], [], group)
+    other = Node('helper', [], [], group)
+    objects = [group, node, Call('helper', owner_token='self'), Variable('x', 'os.path'),
+               Edge(node, other), WeightedEdge(node, other)]
+    for obj in objects:
+        assert not hasattr(obj, '__dict__')
+        with pytest.raises(AttributeError):
+            obj.unknown_attribute = 1
+
+
+def test_calls_share_owner_strings():
+    owners = ['.'.join(['self', 'session', 'pool']) for _ in range(2)]
+    assert owners[0] is not owners[1]
+    calls = [Call('request', owner_token=owner) for owner in owners]
+    assert calls[0].owner_token is calls[1].owner_token
+    variables = [Variable('os', '.'.join(['os', 'path'])) for _ in range(2)]
+    assert variables[0].points_to is variables[1].points_to
+
+
+def test_file_group_pickles():
+    file_group = _file_group()
+    file_group.source = 'client.py'
+    copy = pickle.loads(pickle.dumps(file_group, protocol=pickle.HIGHEST_PROTOCOL))
+    assert copy.source == 'client.py'
+    assert [g.uid for g in copy.all_groups()] == [g.uid for g in file_group.all_groups()]
+    assert [n.uid for n in copy.all_nodes()] == [n.uid for n in file_group.all_nodes()]
+    client, = copy.subgroups
+    node, = client.nodes
+    assert node.parent is client
+    assert [c.to_string() for c in node.calls] == ['self.request()']
+
+
+def _tree():
+    file_group = Group('mod', GROUP_TYPE.FILE, 'File')
+    klass = Group('Klass', GROUP_TYPE.CLASS, 'Class', parent=file_group)
+    file_group.add_subgroup(klass)
+    funcs = [Node('f%d' % i, [], [], file_group) for i in range(3)]
+    for func in funcs:
+        file_group.add_node(func, is_root=func.token == 'f0')
+    method = Node('method', [], [], klass)
+    klass.add_node(method)
+    return file_group, klass, funcs, method
+
+
+def test_group_membership():
+    file_group, klass, funcs, method = _tree()
+    file_group.add_node(funcs[1])
+    assert list(file_group.nodes) == funcs
+    funcs[1].remove_from_parent()
+    funcs[1].remove_from_parent()
+    assert list(file_group.nodes) == [funcs[0], funcs[2]]
+    assert funcs[1] not in file_group.nodes
+    file_group.add_node(funcs[1])
+    assert list(file_group.nodes) == [funcs[0], funcs[2], funcs[1]]
+    assert file_group.root_node is funcs[0]
+    klass.remove_from_parent()
+    assert list(file_group.subgroups) == []
+    assert file_group.all_nodes() == [funcs[0], funcs[2], funcs[1]]
+
+
+def test_retain_nodes():
+    file_group, klass, funcs, method = _tree()
+    other_group, other_klass, _, _ = _tree()
+    kept = _retain_nodes([file_group, other_group], {funcs[1], method}, prune_groups=False)
+    assert kept == [file_group]
+    assert list(file_group.nodes) == [funcs[1]]
+    assert list(other_group.subgroups) == [other_klass]
+
+    assert _retain_nodes([file_group], {funcs[1]}) == [file_group]
+    assert file_group.all_groups() == [file_group]
+    assert file_group.all_nodes() == [funcs[1]]
+
+
+def test_restored_membership_is_not_shared():
+    file_group, klass, funcs, method = _tree()
+    saved_membership = _save_membership([file_group])
+    for _ in range(2):
+        _retain_nodes([file_group], {funcs[0]})
+        _restore_membership(saved_membership)
+        funcs[2].remove_from_parent()
+        klass.remove_from_parent()
+        _restore_membership(saved_membership)
+        assert file_group.all_nodes() == funcs + [method]
+        assert file_group.all_groups() == [file_group, klass]
@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+from second_component.engine import CodeToSchemas
+
+FILES = {
+    'pkg/a.py': '''
+        from pkg.b import helper
+
+        class Base():
+            def run(self):
+                helper()
+
+        def main():
+            Base().run()
+    ''',
+    'pkg/b.py': '''
+        def helper():
+            other()
+
+        def other():
+            pass
+    ''',
+    'pkg/c.py': '''
+        from pkg.a import main
+        from pkg.b import helper
+
+        def entry():
+            main()
+            helper()
+    ''',
+}
+
+
+@pytest.mark.parametrize('jobs', [2, 3])
+def test_jobs_build_the_same_graph(make_tree, build_graph, names, jobs):
+    root = make_tree(FILES)
+    serial_groups, serial_nodes, serial_edges = build_graph(root)
+    groups, nodes, edges = build_graph(root, jobs=jobs)
+
+    assert names(edges) == names(serial_edges)
+    assert sorted(n.uid for n in nodes) == sorted(n.uid for n in serial_nodes)
+    assert [g.token for g in groups] == [g.token for g in serial_groups]
+
+
+def test_jobs_share_token_strings(make_tree, build_graph):
+    root = make_tree(FILES)
+    _, nodes, _ = build_graph(root, jobs=2)
+    helpers = [call.token for node in nodes for call in node.calls if call.token == 'helper']
+    assert len(helpers) == 2
+    assert helpers[0] is helpers[1]
+
+
+@pytest.mark.parametrize('extension', ['gv', 'json'])
+def test_jobs_write_the_same_bytes(make_tree, tmp_path, caplog, extension):
+    files = dict(FILES)
+    for i in range(8):
+        files['pkg/extra_%d.py' % i] = '''
+            from pkg.b import helper
+
+            class Worker%d():
+                def run(self):
+                    helper()
+                    self.stop()
+
+                def stop(self):
+                    pass
+        ''' % i
+    root = make_tree(files)
+
+    outputs = []
+    for jobs in (1, 4):
+        output_file = str(tmp_path / ('out_%d.%s' % (jobs, extension)))
+        with caplog.at_level(logging.INFO):
+            CodeToSchemas([str(root)], output_file, hide_legend=False, jobs=jobs)
+        with open(output_file, 'rb') as f:
+            outputs.append(f.read())
+    assert 'with 4 processes' in caplog.text
+    assert outputs[0]
+    assert outputs[0] == outputs[1]
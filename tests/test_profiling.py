@@ -0,0 +1,87 @@
+import json
+import tracemalloc
+
+from second_component.profiling import Profiler
+
+
+def test_stages_without_memory_tracing():
+    with Profiler() as profiler:
+        assert not tracemalloc.is_tracing()
+        with profiler.stage('outer'):
+            with profiler.stage('inner'):
+                pass
+        profiler.add('parsing', 1.5, 1.0)
+        profiler.count('files', 2)
+        profiler.count('files', 3)
+        report = profiler.report()
+    assert [s['name'] for s in report['stages']] == ['inner', 'outer', 'parsing']
+    assert all(s['peak_memory_bytes'] is None for s in report['stages'])
+    assert report['stages'][2]['wall_seconds'] == 1.5
+    assert report['counters'] == {'files': 5}
+    assert json.loads(profiler.to_json())['counters'] == {'files': 5}
+    assert 'counters: files=5' in profiler.to_table()
+
+
+def test_memory_tracing_is_stopped_on_close():
+    with Profiler(trace_memory=True) as profiler:
+        assert tracemalloc.is_tracing()
+        with profiler.stage('outer'):
+            with profiler.stage('inner'):
+                data = [object() for _ in range(10000)]
+            del data
+    assert not tracemalloc.is_tracing()
+    inner, outer = profiler.report()['stages']
+    assert inner['peak_memory_bytes'] > 0
+    assert outer['peak_memory_bytes'] >= inner['peak_memory_bytes']
+
+
+def test_close_leaves_foreign_tracing_running():
+    tracemalloc.start()
+    try:
+        Profiler(trace_memory=True).close()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler(enabled=False, trace_memory=True)
+    with profiler.stage('parsing'):
+        pass
+    profiler.add('parsing', 1, 1)
+    profiler.count('files', 1)
+    assert not tracemalloc.is_tracing()
+    assert profiler.report()['stages'] == []
+    assert profiler.report()['counters'] == {}
+
+
+def test_worker_times_are_listed_apart():
+    with Profiler() as profiler:
+        profiler.add_worker('pid 1', 'parsing', 2.0)
+        profiler.add_worker('pid 1', 'parsing', 0.5)
+        profiler.add_worker('pid 2', 'parsing', 1.0)
+        report = profiler.report()
+    assert report['stages'] == []
+    assert report['worker_cpu_seconds'] == [{'worker': 'pid 1', 'parsing': 2.5},
+                                            {'worker': 'pid 2', 'parsing': 1.0}]
+    table = profiler.to_table()
+    assert 'worker cpu (s), overlapping the stages above:' in table
+    assert 'parsing=2.500' in table
+
+
+def test_parallel_parsing_reports_pool_wall_time(make_tree, build_graph):
+    root = make_tree({'a.py': 'def f():\n    g()\n', 'b.py': 'def g():\n    pass\n'})
+    with Profiler() as profiler:
+        build_graph(root, jobs=2, profiler=profiler)
+    report = profiler.report()
+    names = [s['name'] for s in report['stages']]
+    assert 'parsing_and_group_building' in names
+    assert 'parsing' not in names and 'group_building' not in names
+    workers = report['worker_cpu_seconds']
+    assert workers and all(w['worker'].startswith('pid ') for w in workers)
+    assert all(set(w) == {'worker', 'parsing', 'group_building'} for w in workers)
+
+    with Profiler() as profiler:
+        build_graph(root, profiler=profiler)
+    assert 'parsing' in [s['name'] for s in profiler.report()['stages']]
+    assert profiler.report()['worker_cpu_seconds'] == []
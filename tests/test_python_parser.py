@@ -0,0 +1,85 @@
+import ast
+import textwrap
+
+from second_component.engine import make_file_group
+from second_component.model import Call, GROUP_TYPE
+
+SOURCE = '''
+import os
+from collections import OrderedDict as OD
+
+setup()
+
+def fetch(client):
+    response = client.session.get()
+    parse(response)
+
+    def inner():
+        os.path.join()
+
+class Store():
+    def __init__(self):
+        self.items = OD()
+
+    def add(self, item):
+        self.items.append(item)
+
+if os.environ:
+    def maybe():
+        setup()
+'''
+
+
+def file_group(source=SOURCE, filename='mod.py'):
+    return make_file_group(ast.parse(textwrap.dedent(source)), filename, 'py')
+
+
+def node(group, token):
+    return next(n for n in group.all_nodes() if n.token == token)
+
+
+def calls(node):
+    return sorted((c.owner_token or '', c.token) for c in node.calls)
+
+
+def test_function_calls_and_owners():
+    fetch = node(file_group(), 'fetch')
+    assert calls(fetch) == [('', 'parse'), ('client', 'get'), ('os', 'join')]
+
+
+def test_assign_and_import_variables():
+    group = file_group()
+    variables = {v.token: v.points_to for v in node(group, 'fetch').variables}
+    assert isinstance(variables['response'], Call)
+    root = {v.token: v.points_to for v in node(group, '(global)').variables}
+    assert root == {'os': 'os', 'OD': 'collections.OrderedDict'}
+
+
+def test_root_node_only_sees_module_level_code():
+    root = node(file_group(), '(global)')
+    assert calls(root) == [('', 'setup')]
+
+
+def test_namespaces():
+    group = file_group()
+    assert [(g.token, g.group_type) for g in group.all_groups()] == \
+        [('mod', GROUP_TYPE.FILE), ('Store', GROUP_TYPE.CLASS)]
+    assert sorted(n.token for n in group.nodes) == ['(global)', 'fetch', 'maybe']
+    store, = group.subgroups
+    assert [n.token for n in store.nodes] == ['__init__', 'add']
+    assert node(group, '__init__').is_constructor
+    assert any(v.token == 'self' and v.points_to is store for v in node(group, 'add').variables)
+
+
+def test_nested_classes_are_skipped(caplog):
+    group = file_group('''
+        class Outer():
+            class Inner():
+                def f(self):
+                    pass
+
+            def g(self):
+                pass
+    ''')
+    assert [n.token for g in group.subgroups for n in g.nodes] == ['g']
+    assert 'Inner' in caplog.text
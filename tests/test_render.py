@@ -0,0 +1,99 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from second_component import engine
+from second_component.engine import (NEW_FILE_MODE, _replace_if_changed, _run_graphviz,
+                                     _trim_unconnected, _write_output, _write_temp_file)
+
+FILES = {
+    'a.py': '''
+        def helper():
+            pass
+
+        def main():
+            helper()
+
+        def unused():
+            pass
+    ''',
+}
+
+UPPERCASE = (sys.executable, '-c', 'import sys; sys.stdout.write(sys.stdin.read().upper())')
+FAIL = (sys.executable, '-c', 'import sys; sys.exit(1)')
+
+
+@pytest.fixture
+def graph(make_tree, build_graph):
+    return build_graph(make_tree(FILES), no_trimming=False)
+
+
+def _listing(directory):
+    return sorted(p.name for p in directory.iterdir())
+
+
+def test_write_temp_file(tmp_path):
+    path = str(tmp_path / 'out.json')
+    tmp_path_a = _write_temp_file(path, lambda f: f.write('a'), mode='w')
+    tmp_path_b = _write_temp_file(path, lambda f: f.write(b'b'))
+    assert tmp_path_a != tmp_path_b
+    assert os.path.dirname(tmp_path_a) == str(tmp_path)
+    assert stat.S_IMODE(os.stat(tmp_path_a).st_mode) == NEW_FILE_MODE
+
+    def fail(f):
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        _write_temp_file(path, fail)
+    assert len(_listing(tmp_path)) == 2
+    with pytest.raises(FileNotFoundError):
+        _write_temp_file(str(tmp_path / 'missing' / 'out.json'), lambda f: None)
+
+
+def test_replace_if_changed(tmp_path):
+    path = tmp_path / 'out.gv'
+    assert _replace_if_changed(_write_temp_file(str(path), lambda f: f.write(b'one')), str(path))
+    os.utime(path, (1, 1))
+    assert not _replace_if_changed(_write_temp_file(str(path), lambda f: f.write(b'one')),
+                                   str(path))
+    assert os.path.getmtime(path) == 1
+    assert _replace_if_changed(_write_temp_file(str(path), lambda f: f.write(b'two')), str(path))
+    assert path.read_bytes() == b'two'
+    assert _listing(tmp_path) == ['out.gv']
+
+
+def test_run_graphviz(tmp_path, caplog):
+    image = tmp_path / 'out.svg'
+    assert _run_graphviz('out.gv', b'digraph', str(image), command=UPPERCASE)
+    assert image.read_bytes() == b'DIGRAPH'
+    assert not _run_graphviz('out.gv', b'graph', str(image), command=FAIL)
+    assert 'non-zero exit code' in caplog.text
+    assert image.read_bytes() == b'DIGRAPH'
+    assert _listing(tmp_path) == ['out.svg']
+
+
+def test_unchanged_output_skips_graphviz(graph, tmp_path, monkeypatch):
+    renders = []
+
+    def generate_graphviz(output_file, final_img_filenames, *args, **kwargs):
+        renders.append(final_img_filenames)
+        for filename in final_img_filenames:
+            open(filename, 'wb').close()
+
+    monkeypatch.setattr(engine, '_generate_graphviz', generate_graphviz)
+    output_file = str(tmp_path / 'out.gv')
+    image = str(tmp_path / 'out.png')
+    file_groups, all_nodes, edges = graph
+    for _ in range(2):
+        _write_output(output_file, 'gv', list(file_groups), list(all_nodes), list(edges),
+                      False, False, None, final_img_filenames=[image])
+    assert renders == [[image]]
+    assert _listing(tmp_path) == ['out.gv', 'out.png', 'src']
+
+
+def test_trimming_keeps_the_node_order(make_tree, build_graph):
+    file_groups, all_nodes, edges = build_graph(make_tree(FILES))
+    assert [n.token for n in all_nodes] == ['helper', 'main', 'unused', '(global)']
+    _, trimmed = _trim_unconnected(file_groups, all_nodes, edges)
+    assert [n.token for n in trimmed] == ['helper', 'main']
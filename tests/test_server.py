@@ -0,0 +1,104 @@
+import json
+import socket
+import threading
+import urllib.request
+
+import pytest
+
+from second_component.engine import GraphQuery
+from second_component.server import make_server, parse_address
+
+FILES = {
+    'app.py': '''
+        import util
+
+        def main():
+            util.load()
+            report()
+
+        def report():
+            pass
+    ''',
+    'util.py': '''
+        def load():
+            pass
+    ''',
+}
+
+
+@pytest.fixture
+def query(make_tree, build_graph):
+    return GraphQuery(*build_graph(make_tree(FILES), no_trimming=False))
+
+
+def _node_names(body):
+    return sorted(n['name'] for n in json.loads(body)['graph']['nodes'].values())
+
+
+def test_parse_address():
+    assert parse_address('8080') == ('127.0.0.1', 8080)
+    assert parse_address('0.0.0.0:80') == ('0.0.0.0', 80)
+    assert parse_address('unix:/tmp/graph.sock') == '/tmp/graph.sock'
+    with pytest.raises(AssertionError):
+        parse_address('localhost:http')
+    with pytest.raises(AssertionError):
+        parse_address('unix:')
+
+
+def test_status_and_unknown_paths(query):
+    status, content_type, body = query.handle_request('/status', {})
+    assert (status, content_type) == (200, 'application/json')
+    assert json.loads(body)['nodes'] == 3
+    assert query.handle_request('/nope', {})[0] == 404
+    assert query.handle_request('/graph', {'format': ['png']})[0] == 400
+    assert query.handle_request('/graph', {'target_function': ['missing'],
+                                           'downstream_depth': ['1']})[0] == 400
+
+
+def test_graph_queries_leave_the_graph_intact(query):
+    groups_before = [g.all_nodes() for g in query.file_groups]
+    status, _, body = query.handle_request('/graph', {'format': ['json']})
+    assert status == 200
+    assert _node_names(body) == ['app::main', 'app::report', 'util::load']
+
+    _, _, body = query.handle_request('/graph', {'format': ['json'],
+                                                 'exclude_namespaces': ['util']})
+    assert _node_names(body) == ['app::main', 'app::report']
+
+    _, _, body = query.handle_request('/graph', {'format': ['json'], 'target_function': ['load'],
+                                                 'upstream_depth': ['1']})
+    assert _node_names(body) == ['app::main', 'util::load']
+
+    status, content_type, body = query.handle_request('/graph', {})
+    assert content_type == 'text/vnd.graphviz'
+    assert body.startswith('digraph G {')
+    assert [g.all_nodes() for g in query.file_groups] == groups_before
+
+
+def test_make_server_answers_over_tcp(query):
+    server = make_server('127.0.0.1:0', query.handle_request)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:%d/graph?format=json' % server.server_address[1]
+        with urllib.request.urlopen(url) as response:
+            assert response.status == 200
+            assert _node_names(response.read()) == ['app::main', 'app::report', 'util::load']
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_make_server_replaces_only_stale_sockets(tmp_path):
+    regular_file = tmp_path / 'graph.sock'
+    regular_file.write_text('keep me')
+    with pytest.raises(AssertionError, match='not a socket'):
+        make_server('unix:%s' % regular_file, None)
+    assert regular_file.read_text() == 'keep me'
+
+    stale_path = str(tmp_path / 'stale.sock')
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(stale_path)
+    stale.close()
+    server = make_server('unix:%s' % stale_path, None)
+    server.server_close()
@@ -0,0 +1,99 @@
+import concurrent.futures
+import json
+import re
+
+import pytest
+
+from second_component import engine
+from second_component.engine import StubNode, _shard_file_groups, _write_shards
+
+FILES = {
+    'pkg/a.py': '''
+        from pkg.b import helper
+
+        def main():
+            helper()
+    ''',
+    'pkg/b.py': '''
+        def helper():
+            pass
+    ''',
+    'tool.py': '''
+        from pkg.b import helper
+
+        def run():
+            helper()
+    ''',
+}
+
+
+def test_shard_file_groups(make_tree, build_graph):
+    file_groups, _, _ = build_graph(make_tree(FILES))
+    shards = _shard_file_groups(file_groups)
+    assert list(shards) == ['pkg', 'tool']
+    assert sorted(g.token for g in shards['pkg']) == ['a', 'b']
+    assert _shard_file_groups([]) == {}
+
+
+def test_write_shards(tmp_path, make_tree, build_graph):
+    file_groups, all_nodes, edges = build_graph(make_tree(FILES))
+    output_file = str(tmp_path / 'out.json')
+    _write_shards(output_file, 'json', [], file_groups, all_nodes, edges, True, False)
+
+    with open(tmp_path / 'out.index.json') as f:
+        index = json.load(f)['shards']
+    assert [shard['name'] for shard in index] == ['pkg', 'tool']
+    assert index[1]['calls_into'] == {'pkg': 1}
+    with open(tmp_path / 'out.tool.json') as f:
+        shard = json.load(f)['graph']
+    stubs = [node for node in shard['nodes'].values() if 'shard' in node]
+    assert [(stub['name'], stub['shard']) for stub in stubs] == [('b::helper', 'pkg')]
+
+
+def test_write_shards_without_files(tmp_path):
+    _write_shards(str(tmp_path / 'out.json'), 'json', [], [], [], [], True, False)
+    with open(tmp_path / 'out.index.json') as f:
+        assert json.load(f) == {'shards': []}
+    _write_shards(str(tmp_path / 'out.gv'), 'gv', [], [], [], [], True, False)
+    assert (tmp_path / 'out.index.html').exists()
+
+
+def test_stub_node_escapes_quotes(make_tree, build_graph):
+    file_groups, all_nodes, _ = build_graph(make_tree(FILES))
+    node = next(n for n in all_nodes if n.token == 'helper')
+    stub = StubNode(node, 'a"b', 'a"b.svg')
+    dot = stub.to_dot()
+    assert 'label="a\\"b: b::helper"' in dot
+    assert 'URL="a\\"b.svg"' in dot
+
+
+@pytest.mark.parametrize('collapse', ['class', 'file'])
+def test_stubs_are_made_after_collapsing(tmp_path, make_tree, build_graph, collapse):
+    file_groups, all_nodes, edges = build_graph(make_tree(FILES))
+    _write_shards(str(tmp_path / 'out.gv'), 'gv', [], file_groups, all_nodes, edges, True, False,
+                  collapse=collapse)
+
+    tool = (tmp_path / 'out.tool.gv').read_text()
+    pkg = (tmp_path / 'out.pkg.gv').read_text()
+    b_uid = re.search(r'(node_\w+) \[label="File: b \(', pkg).group(1)
+    assert re.search(r'%s \[label="pkg: b" .*style="rounded,dashed"' % b_uid, tool)
+    assert 'label="File: b' not in tool
+    clusters = re.findall(r'label="File: (\w+)";', tool)
+    assert clusters == (['tool'] if collapse == 'class' else [])
+
+
+@pytest.mark.parametrize('jobs, max_workers', [(1, None), (3, 3)])
+def test_shards_are_written_by_a_thread_pool(tmp_path, make_tree, build_graph, monkeypatch,
+                                            jobs, max_workers):
+    pools = []
+    thread_pool_executor = concurrent.futures.ThreadPoolExecutor
+
+    def recording_pool(workers=None, *args, **kwargs):
+        pools.append(workers)
+        return thread_pool_executor(workers, *args, **kwargs)
+
+    monkeypatch.setattr(engine.concurrent.futures, 'ThreadPoolExecutor', recording_pool)
+    file_groups, all_nodes, edges = build_graph(make_tree(FILES))
+    _write_shards(str(tmp_path / 'out.json'), 'json', [], file_groups, all_nodes, edges,
+                  True, False, jobs=jobs)
+    assert pools == [max_workers]
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from second_component.engine import (AdjacencyIndex, SubsetParams, _filter_for_subset,
+                                     _write_outputs)
+
+FILES = {
+    'chain.py': '''
+        def a():
+            b()
+
+        def b():
+            c()
+
+        def c():
+            d()
+
+        def d():
+            pass
+
+        class Worker():
+            def c(self):
+                a()
+    ''',
+}
+
+
+@pytest.fixture
+def graph(make_tree, build_graph):
+    return build_graph(make_tree(FILES))
+
+
+def _names(nodes):
+    return sorted(node.name() for node in nodes)
+
+
+def test_subset_depths(graph):
+    _, all_nodes, edges = graph
+    index = AdjacencyIndex(all_nodes, edges)
+    nodes, subset_edges = index.subset(SubsetParams('b', 1, 1))
+    assert _names(nodes) == ['chain::a', 'chain::b', 'chain::c']
+    assert sorted((e.node0.token, e.node1.token) for e in subset_edges) == \
+        [('a', 'b'), ('b', 'c')]
+    nodes, _ = index.subset(SubsetParams('b', 2, 0))
+    assert _names(nodes) == ['chain::Worker.c', 'chain::a', 'chain::b']
+    nodes, _ = index.subset(SubsetParams('b', 0, 5))
+    assert _names(nodes) == ['chain::b', 'chain::c', 'chain::d']
+    nodes, _ = index.subset(SubsetParams('Worker.c', 2, 0))
+    assert _names(nodes) == ['chain::Worker.c']
+
+
+def test_find_target_node(graph):
+    _, all_nodes, edges = graph
+    index = AdjacencyIndex(all_nodes, edges)
+    assert index.find_target_node('chain::c').token == 'c'
+    assert index.find_target_node('Worker.c').parent.token == 'Worker'
+    with pytest.raises(AssertionError, match='multiple nodes'):
+        index.find_target_node('c')
+    with pytest.raises(AssertionError, match='Could not find'):
+        index.find_target_node('missing')
+
+
+def test_subset_matches_filter_for_subset(graph):
+    file_groups, all_nodes, edges = graph
+    index = AdjacencyIndex(all_nodes, edges)
+    nodes, subset_edges = index.subset(SubsetParams('d', 2, 0))
+    _, filtered_nodes, filtered_edges = _filter_for_subset(SubsetParams('d', 2, 0), all_nodes,
+                                                           edges, file_groups)
+    assert set(filtered_nodes) == nodes
+    assert filtered_edges == subset_edges
+
+
+def test_generate_many(tmp_path):
+    targets_file = tmp_path / 'targets.txt'
+    targets_file.write_text('# comment\nb\n\nc 2  # trailing\nd 0 3\n')
+    targets = SubsetParams.generate_many(['a'], 1, 1, targets_file=str(targets_file))
+    assert [(t.target_function, t.upstream_depth, t.downstream_depth) for t in targets] == \
+        [('a', 1, 1), ('b', 1, 1), ('c', 2, 1), ('d', 0, 3)]
+    assert SubsetParams.generate_many([], 0, 0) is None
+    targets_file.write_text('a b c d\n')
+    with pytest.raises(AssertionError, match='targets.txt:1'):
+        SubsetParams.generate_many([], 1, 1, targets_file=str(targets_file))
+    targets_file.write_text('a x\n')
+    with pytest.raises(AssertionError, match='integers'):
+        SubsetParams.generate_many([], 1, 1, targets_file=str(targets_file))
+
+
+def test_write_many_subsets(graph, tmp_path):
+    file_groups, all_nodes, edges = graph
+    groups_before = [list(g.all_nodes()) for g in file_groups]
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    output_file = str(output_dir / 'out.json')
+    targets = SubsetParams.generate_many(['a', 'chain::d', 'missing'], 0, 1)
+    _write_outputs(output_file, 'json', [], file_groups, all_nodes, edges, True, False, targets)
+    assert sorted(p.name for p in output_dir.iterdir()) == ['out.a.json', 'out.chain_d.json']
+    document = json.loads((output_dir / 'out.a.json').read_text())['graph']
+    assert sorted(n['name'] for n in document['nodes'].values()) == ['chain::a', 'chain::b']
+    assert [list(g.all_nodes()) for g in file_groups] == groups_before
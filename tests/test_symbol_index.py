@@ -0,0 +1,228 @@
+import collections
+import os
+
+import pytest
+
+from second_component import engine
+from second_component.benchmark import CodebaseParams, generate_codebase
+from second_component.engine import (LanguageParams, SymbolIndex, get_sources_and_language,
+                                     make_file_group, map_it)
+from second_component.model import GROUP_TYPE, OWNER_CONST, Call, Group, Variable, flatten
+from second_component.python import Python
+
+
+def test_resolves_function_in_other_file(make_tree, build_graph, names):
+    root = make_tree({
+        'a.py': '''
+            from b import helper
+
+            def caller():
+                helper()
+        ''',
+        'b.py': '''
+            def helper():
+                pass
+        ''',
+    })
+    _, _, edges = build_graph(root)
+    assert ('a::caller', 'b::helper') in names(edges)
+
+
+def test_ambiguous_call_is_not_linked(make_tree, build_graph, names):
+    root = make_tree({
+        'a.py': '''
+            def caller():
+                helper()
+        ''',
+        'b.py': '''
+            def helper():
+                pass
+        ''',
+        'c.py': '''
+            def helper():
+                pass
+        ''',
+    })
+    _, all_nodes, edges = build_graph(root)
+    assert not [e for e in names(edges) if e[0] == 'a::caller']
+
+    caller = next(n for n in all_nodes if n.token == 'caller')
+    possible = SymbolIndex(all_nodes).possible_nodes(Call('helper'), caller)
+    assert sorted(n.name() for n in possible) == ['b::helper', 'c::helper']
+
+
+def test_constructor_call_links_to_init(make_tree, build_graph, names):
+    root = make_tree({
+        'a.py': '''
+            class Widget():
+                def __init__(self):
+                    pass
+
+            def build():
+                Widget()
+        ''',
+    })
+    _, _, edges = build_graph(root)
+    assert ('a::build', 'a::Widget.__init__') in names(edges)
+
+
+def test_unique_attribute_call(make_tree, build_graph, names):
+    root = make_tree({
+        'a.py': '''
+            class Client():
+                def fetch(self):
+                    pass
+
+            def run(client):
+                client.fetch()
+        ''',
+    })
+    _, _, edges = build_graph(root)
+    assert ('a::run', 'a::Client.fetch') in names(edges)
+
+
+REFERENCE_FILES = {
+    'shapes/__init__.py': '''
+        from shapes.base import Shape, area_of
+    ''',
+    'shapes/base.py': '''
+        class Shape():
+            def __init__(self):
+                self.reset()
+
+            def reset(self):
+                pass
+
+            def area(self):
+                return 0
+
+            def describe(self):
+                return self.area()
+
+        def area_of(shape):
+            return shape.area()
+    ''',
+    'shapes/square.py': '''
+        from shapes.base import Shape
+
+        class Rectangle(Shape):
+            def area(self):
+                return self.describe()
+
+        class Square(Rectangle):
+            def grow(self):
+                self.reset()
+                self.reset()
+                self.area()
+    ''',
+    'app.py': '''
+        import shapes
+        from shapes.square import Square
+        from shapes.base import area_of as measure
+
+        class Timer():
+            def reset(self):
+                pass
+
+        def area():
+            pass
+
+        def describe():
+            pass
+
+        def main():
+            square = Square()
+            square.grow()
+            measure(square)
+            shapes.area_of(square)
+            area()
+            unknown.area()
+            unknown.describe()
+    ''',
+}
+
+
+def _reference_link(call, node_a, all_nodes):
+    # the linear scan that SymbolIndex, ImportIndex and VariableIndex replace
+    for var in node_a.get_variables(call.line_number):
+        var_match = call.matches_variable(var)
+        if var_match:
+            if var_match == OWNER_CONST.UNKNOWN_MODULE:
+                return None
+            return var_match
+
+    if call.is_attr():
+        possible_nodes = [node for node in all_nodes
+                          if call.token == node.token and node.parent != node_a.file_group()]
+    else:
+        possible_nodes = [node for node in all_nodes
+                          if (call.token == node.token and isinstance(node.parent, Group)
+                              and node.parent.group_type == GROUP_TYPE.FILE)
+                          or (call.token == node.parent.token and node.is_constructor)]
+    if len(possible_nodes) == 1:
+        return possible_nodes[0]
+    return None
+
+
+def _reference_graph(sources):
+    file_groups = [make_file_group(Python.get_tree(source, LanguageParams()), source, 'py')
+                   for source in sources]
+    all_subgroups = flatten(g.all_groups() for g in file_groups)
+    all_nodes = flatten(g.all_nodes() for g in file_groups)
+
+    nodes_by_subgroup_token = collections.defaultdict(list)
+    for subgroup in all_subgroups:
+        nodes_by_subgroup_token[subgroup.token] += subgroup.nodes
+    base_uids = {}
+    for subgroup in all_subgroups:
+        subgroup.inherits = list(filter(None, [nodes_by_subgroup_token.get(t)
+                                               for t in subgroup.inherits]))
+        for inherit_nodes in subgroup.inherits:
+            for node in subgroup.nodes:
+                node.variables += [Variable(n.token, n, n.line_number) for n in inherit_nodes]
+        for node in subgroup.nodes:
+            base_uids[node.uid] = {n.uid for n in flatten(subgroup.inherits)}
+
+    for node in all_nodes:
+        node.resolve_variables(file_groups)
+
+    edges = []
+    for node_a in all_nodes:
+        for call in node_a.calls:
+            node_b = _reference_link(call, node_a, all_nodes)
+            if node_b:
+                edges.append((node_a.uid, node_b.uid))
+    return edges, base_uids
+
+
+def _generated_codebase(tmp_path):
+    return generate_codebase(str(tmp_path / 'generated'),
+                             CodebaseParams(num_files=30, inheritance_depth=3, seed=1))
+
+
+@pytest.mark.parametrize('corpus', ['files', 'generated', 'repo'])
+def test_edges_match_the_linear_scan(make_tree, tmp_path, corpus):
+    if corpus == 'files':
+        root = str(make_tree(REFERENCE_FILES))
+    elif corpus == 'generated':
+        root = _generated_codebase(tmp_path)
+    else:
+        root = os.path.dirname(engine.__file__)
+    sources, _ = get_sources_and_language([root], 'py')
+
+    _, all_nodes, edges = map_it(sources, 'py', True, [], [], [], [], False, LanguageParams(),
+                                 keep_duplicate_edges=True)
+    reference_edges, base_uids = _reference_graph(sources)
+    assert reference_edges
+    if corpus == 'files':
+        assert len(edges) == len(reference_edges) + 2
+
+    edges = collections.Counter((e.node0.uid, e.node1.uid) for e in edges)
+    reference_edges = collections.Counter(reference_edges)
+    assert not reference_edges - edges
+
+    # calls may now also resolve to methods of indirect bases
+    chain_uids = {node.uid: {n.uid for n in flatten(node.parent.inherits)}
+                  for node in all_nodes if node.parent.group_type == GROUP_TYPE.CLASS}
+    for node0, node1 in edges - reference_edges:
+        assert node1 in chain_uids[node0] - base_uids[node0]
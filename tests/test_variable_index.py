@@ -0,0 +1,59 @@
+import ast
+import textwrap
+
+from second_component.engine import VariableIndex, _variable_tokens, make_file_group
+
+SOURCE = '''
+import os
+from util import load as fetch
+
+client = make_client()
+
+def run(path):
+    fetch()
+    client.get()
+    fetch = make_fetch()
+    fetch()
+    client = Client()
+    client.get()
+    client.session.get()
+    os.path.join(path)
+
+class Worker():
+    def work(self):
+        fetch()
+        self.run()
+'''
+
+
+def _file_group():
+    return make_file_group(ast.parse(textwrap.dedent(SOURCE)), 'mod.py', 'py')
+
+
+def _variables(node, call):
+    variable_index = VariableIndex()
+    node_scope = variable_index.node_scope(node)
+    return list(variable_index.get_variables(node, node_scope, call))
+
+
+def test_matches_the_full_variable_scan():
+    file_group = _file_group()
+    nodes = file_group.all_nodes()
+    assert len(nodes) == 3
+    for node in nodes:
+        for call in node.calls:
+            tokens = _variable_tokens(call)
+            expected = [v for v in node.get_variables(call.line_number) if v.token in tokens]
+            assert _variables(node, call) == expected, call
+
+
+def test_nearest_preceding_binding_comes_first():
+    run = next(n for n in _file_group().all_nodes() if n.token == 'run')
+    fetch_calls = [c for c in run.calls if c.token == 'fetch']
+    first, second = [[v.line_number for v in _variables(run, call)] for call in fetch_calls]
+    assert first == [3]
+    assert second == [10, 3]
+
+    client_calls = [c for c in run.calls if c.owner_token == 'client']
+    assert [[v.line_number for v in _variables(run, call)] for call in client_calls] == \
+        [[5], [12, 5], [12, 5]]
@@ -0,0 +1,50 @@
+import pytest
+
+from second_component.engine import WeightedEdge
+from second_component.model import GROUP_TYPE, Edge, Group, Node
+
+FILES = {
+    'a.py': '''
+        def helper():
+            pass
+
+        def main():
+            helper()
+            helper()
+            helper()
+    ''',
+}
+
+
+@pytest.fixture
+def root(make_tree):
+    return make_tree(FILES)
+
+
+def test_repeated_calls_become_one_weighted_edge(root, build_graph, names):
+    _, _, edges = build_graph(root)
+    assert names(edges) == [('a::main', 'a::helper')]
+    edge, = edges
+    assert isinstance(edge, WeightedEdge)
+    assert edge.count() == 3
+    assert edge.to_dict()['lines'] == [6, 7, 8]
+    assert 'weight="3"' in edge.to_dot()
+
+
+def test_keep_duplicate_edges(root, build_graph, names):
+    _, _, edges = build_graph(root, keep_duplicate_edges=True)
+    assert names(edges) == [('a::main', 'a::helper')] * 3
+    assert all(type(edge) is Edge for edge in edges)
+
+
+def test_weighted_edge_line_numbers():
+    group = Group('a', GROUP_TYPE.FILE, 'File')
+    edge = WeightedEdge(Node('main', [], [], group), Node('helper', [], [], group))
+    assert edge.count() == 1
+    assert edge.to_dot() == Edge.to_dot(edge)
+    for line_number in (4, None, 0, 2):
+        edge.add_call(line_number)
+    assert edge.count() == 4
+    assert edge.to_dict()['lines'] == [0, 2, 4]
+    assert repr(edge).startswith('<WeightedEdge ')
+    assert repr(edge).endswith(' x4>')